@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+類似パターン検索のベンチマーク（5,000銘柄 × 10年分の日足、合成データ）
+インデックスの作成から最初の検索まで（コールド）と、足が追加された銘柄の差し替えも計測する
+DBからの読み込みを含む計測はbench_suite.pyのload_pattern_indexを参照
+Usage: docker compose exec web python benchmarks/bench_pattern_search.py
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_forecast_project.settings")
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from stocks.pattern_search import (  # noqa: E402
+    DEFAULT_WINDOW,
+    build_pattern_index,
+    distance_profiles,
+    update_pattern_index,
+)
+
+N_STOCKS = 5000
+BARS = 252 * 10
+WINDOWS = [30, 60]
+REPEAT = 5
+# 1回の検索の上限（ms）
+BUDGET_MS = 1000.0
+# インデックスの作成＋最初の検索の上限（ms、プロセスの起動直後の検索）
+COLD_BUDGET_MS = 5000.0
+# 足が追加された銘柄の差し替えの上限（ms）
+UPDATE_BUDGET_MS = 500.0
+# 差し替える銘柄数（1回の更新で足が追加される銘柄数）
+UPDATED_STOCKS = 10
+
+
+def main():
+    rng = np.random.default_rng(0)
+    closes = [
+        3000 * np.cumprod(1 + rng.normal(0, 0.015, BARS)) for _ in range(N_STOCKS)
+    ]
+    dates = [np.arange(BARS).astype("datetime64[D]")] * N_STOCKS
+    symbols = [f"BENCH{i}" for i in range(N_STOCKS)]
+
+    print(f"🚀 Pattern search benchmark ({N_STOCKS:,} stocks × {BARS:,} bars)")
+    start = time.perf_counter()
+    index = build_pattern_index(symbols, symbols, dates, closes)
+    build_ms = (time.perf_counter() - start) * 1000
+    distance_profiles(index, closes[0][-DEFAULT_WINDOW:]).min(axis=1)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    # 足が1本ずつ追加された銘柄だけを差し替える
+    grown = [np.append(c, c[-1] * 1.01) for c in closes[:UPDATED_STOCKS]]
+    grown_dates = [np.arange(BARS + 1).astype("datetime64[D]")] * UPDATED_STOCKS
+    updated = symbols[:UPDATED_STOCKS]
+    start = time.perf_counter()
+    update_pattern_index(index, updated, updated, grown_dates, grown)
+    update_ms = (time.perf_counter() - start) * 1000
+
+    failed = cold_ms >= COLD_BUDGET_MS or update_ms >= UPDATE_BUDGET_MS
+    print(f"   index build: {build_ms:.0f} ms")
+    print(
+        f"   cold (build + first search): {cold_ms:.0f} ms "
+        f"{'✅' if cold_ms < COLD_BUDGET_MS else '❌'}"
+    )
+    print(
+        f"   update {UPDATED_STOCKS} stocks: {update_ms:.0f} ms "
+        f"{'✅' if update_ms < UPDATE_BUDGET_MS else '❌'}"
+    )
+    print("=" * 56)
+    print(f"{'window':>8} | {'first (ms)':>10} | {'median (ms)':>12} | {'budget':>8}")
+    print("-" * 56)
+
+    for window in WINDOWS:
+        timings = []
+        for i in range(REPEAT):
+            query = closes[i][-window:]
+            start = time.perf_counter()
+            distances = distance_profiles(index, query)
+            distances.min(axis=1)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # 初回はウィンドウ長ごとの移動標準偏差の計算を含む
+        median = float(np.median(timings[1:]))
+        ok = median < BUDGET_MS
+        failed |= not ok
+        print(
+            f"{window:>8} | {timings[0]:>10.0f} | {median:>12.0f} | "
+            f"{'✅' if ok else '❌':>7}"
+        )
+
+    print("-" * 56)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+予測区間シミュレーションのベンチマーク（1銘柄あたり10,000パス × 20日）
+Usage: docker compose exec web python benchmarks/bench_simulation.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stocks.simulation import (  # noqa: E402
+    SIMULATION_METHODS,
+    log_returns,
+    simulate_bands,
+)
+
+N_PATHS = 10000
+DAYS = 20
+CALIBRATION_BARS = 250
+REPEAT = 20
+# 1銘柄あたりの上限（ms）
+BUDGET_MS = 100.0
+
+
+def main():
+    rng = np.random.default_rng(0)
+    closes = 3000 * np.cumprod(1 + rng.normal(0, 0.015, CALIBRATION_BARS + 1))
+    returns = log_returns(closes)
+
+    print(f"🚀 Simulation benchmark ({N_PATHS:,} paths × {DAYS} days)")
+    print("=" * 56)
+    print(f"{'method':<12} | {'median (ms)':>12} | {'max (ms)':>10} | {'budget':>8}")
+    print("-" * 56)
+
+    failed = False
+    for method in SIMULATION_METHODS:
+        timings = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            simulate_bands(closes[-1], returns, DAYS, n_paths=N_PATHS, method=method)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        median = float(np.median(timings))
+        ok = median < BUDGET_MS
+        failed |= not ok
+        print(
+            f"{method:<12} | {median:>12.2f} | {max(timings):>10.2f} | "
+            f"{'✅' if ok else '❌':>7}"
+        )
+
+    print("-" * 56)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+#!/usr/bin/env python
+"""
+主要な処理のベンチマーク（銘柄数 × 年数の規模ごとに合成データを投入して計測）
+実行時間（中央値）・ピークメモリ・SQLクエリ数をJSONに保存し、基準の結果と比較できる
+データはテスト用データベース（test_<DB名>）に投入するため、本番のデータには影響しない
+起動時のimport時間（-X importtimeのパッケージ別の内訳）も別プロセスで計測する
+
+Usage:
+  docker compose exec web python benchmarks/bench_suite.py --output results.json
+  docker compose exec web python benchmarks/bench_suite.py --scales all --keepdb
+  docker compose exec web python benchmarks/bench_suite.py --compare baseline.json
+  docker compose exec web python benchmarks/bench_suite.py --imports-only
+  python benchmarks/bench_suite.py --results results.json --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_forecast_project.settings")
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext,
+    setup_test_environment,
+)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from stocks.charts import get_chart_data  # noqa: E402
+from stocks.comparison import compare_stocks  # noqa: E402
+from stocks.feature_store import FEATURE_COLUMNS  # noqa: E402
+from stocks.models import Stock, StockPrice  # noqa: E402
+from stocks.pattern_search import _index_cache, load_pattern_index  # noqa: E402
+from stocks.trading_calendar import trading_days  # noqa: E402
+from stocks.utils import (  # noqa: E402
+    create_features,
+    simple_prediction,
+    train_and_predict,
+    update_stock_prices,
+)
+
+# 規模（銘柄数, 年数）
+ALL_SCALES = [(10, 1), (10, 10), (1000, 1), (1000, 10), (10000, 1), (10000, 10)]
+DEFAULT_SCALES = "10x1,10x10,1000x1"
+EXCHANGE = "US"
+# 一度に投入する株価の行数
+SEED_BATCH = 50_000
+# 銘柄比較（compare_stocks）の銘柄数。この銘柄数以上の規模でのみ計測する
+COMPARE_STOCKS = 500
+# 目標時間（ms）のある処理。超えた場合は結果に表示して終了コード1を返す
+TIME_BUDGETS_MS = {f"compare_stocks({COMPARE_STOCKS})": 1000}
+# 比較時に無視する差（計測誤差）
+MIN_TIME_DIFF_MS = 1.0
+MIN_MEMORY_DIFF_MB = 1.0
+
+# 起動時のimportを計測するモジュール（名前 -> (import するモジュール, 読み込まれてはいけない重いライブラリ)）
+IMPORT_TARGETS = {
+    # Webワーカーの起動（URL設定から全ビューが読み込まれる）
+    "web": (
+        "stock_forecast_project.urls",
+        ("pandas", "sklearn", "scipy", "yfinance", "requests"),
+    ),
+    # 予想の実行（scikit-learnはモデルの学習時、外部APIのライブラリは取得時に読み込む）
+    "predict": ("stocks.utils", ("sklearn", "scipy", "yfinance", "requests")),
+}
+# 内訳として表示するパッケージの数
+IMPORT_TOP_PACKAGES = 8
+# ru_maxrssはfork元のプロセスの値を引き継ぐため、Linuxでは現在のRSSを読む
+IMPORT_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import {module}
+elapsed = time.perf_counter() - started
+try:
+    with open("/proc/self/statm") as f:
+        rss = int(f.read().split()[1]) * resource.getpagesize() / 1024
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "time_ms": elapsed * 1000,
+    "rss_mb": rss / 1024,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def parse_scales(value):
+    if value == "all":
+        return ALL_SCALES
+    scales = []
+    for item in value.split(","):
+        stocks, years = item.lower().split("x")
+        scales.append((int(stocks), int(years)))
+    return scales
+
+
+def seed(n_stocks, years):
+    """
+    合成データを投入（同じ規模のデータが既にあれば再利用）
+    """
+    sessions = trading_days(
+        EXCHANGE, date.today() - timedelta(days=365 * years), date.today()
+    ).astype(object)
+    first = Stock.objects.order_by("symbol").first()
+    if (
+        Stock.objects.count() == n_stocks
+        and first is not None
+        and StockPrice.objects.filter(stock=first).count() == len(sessions)
+    ):
+        return
+
+    # 株価は依存するモデルがないため1回のDELETEで削除できる
+    StockPrice.objects.all().delete()
+    Stock.objects.all().delete()
+    Stock.objects.bulk_create(
+        [
+            Stock(
+                symbol=f"B{i:05d}",
+                name=f"Benchmark {i}",
+                exchange=EXCHANGE,
+                sector=f"Sector {i % 10}",
+            )
+            for i in range(n_stocks)
+        ]
+    )
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for stock_id in Stock.objects.order_by("symbol").values_list("id", flat=True):
+        closes = 3000 * np.cumprod(1 + rng.normal(0, 0.015, len(sessions)))
+        volumes = rng.integers(1_000_000, 10_000_000, len(sessions))
+        rows.extend(zip([stock_id] * len(sessions), sessions, closes, volumes))
+        if len(rows) >= SEED_BATCH:
+            _insert_prices(rows)
+            rows = []
+    _insert_prices(rows)
+
+
+def _insert_prices(rows):
+    """
+    株価をまとめて投入（PostgreSQLはCOPY、それ以外はbulk_create）
+    """
+    if not rows:
+        return
+    if connection.vendor == "postgresql":
+        buffer = io.StringIO()
+        now = datetime.now().isoformat()
+        for stock_id, day, close, volume in rows:
+            buffer.write(
+                f"{stock_id}\t{day}\t{close * 0.995:.2f}\t{close * 1.01:.2f}\t"
+                f"{close * 0.99:.2f}\t{close:.2f}\t{volume}\t{now}\n"
+            )
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {StockPrice._meta.db_table} (stock_id, date, open_price, "
+                "high_price, low_price, close_price, volume, created_at) FROM STDIN",
+                buffer,
+            )
+        return
+
+    StockPrice.objects.bulk_create(
+        [
+            StockPrice(
+                stock_id=stock_id,
+                date=day,
+                open_price=Decimal(f"{close * 0.995:.2f}"),
+                high_price=Decimal(f"{close * 1.01:.2f}"),
+                low_price=Decimal(f"{close * 0.99:.2f}"),
+                close_price=Decimal(f"{close:.2f}"),
+                volume=int(volume),
+            )
+            for stock_id, day, close, volume in rows
+        ],
+        batch_size=5000,
+    )
+
+
+def price_frame(stock):
+    rows = StockPrice.objects.filter(stock=stock).order_by("date")
+    return pd.DataFrame.from_records(
+        rows.values_list(
+            "date", "open_price", "high_price", "low_price", "close_price", "volume"
+        ),
+        columns=["date", "open", "high", "low", "close", "volume"],
+        coerce_float=True,
+    ).astype({c: float for c in ["open", "high", "low", "close"]})
+
+
+def build_cases(stock, compare_symbols=None):
+    """
+    計測する処理（名前 -> 引数なしで呼び出せる関数）
+    compare_symbolsを指定すると、その銘柄の1年分の比較（キャッシュなし）も計測する
+    """
+    client = Client()
+    prices = price_frame(stock)
+    features = create_features(prices.copy()).dropna()
+    X = features[FEATURE_COLUMNS]
+    y = features["close"].shift(-1)
+
+    def refresh():
+        # 取得前のレート制限対策の待機（1秒）は除いて計測
+        with mock.patch("stocks.utils.time.sleep"):
+            update_stock_prices(stock, use_demo=True)
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+
+    def pattern_index_cold():
+        # プロセスの起動直後と同じく、DBからの読み込みとインデックスの作成を含めて計測
+        _index_cache.update(version=None, index=None)
+        load_pattern_index()
+
+    last = Stock.objects.order_by("-symbol").first()
+    new_bars = iter(range(1, 1_000_000))
+
+    def pattern_index_new_bar():
+        # 1銘柄に足を1本追加し、その銘柄だけを差し替える
+        load_pattern_index()
+        StockPrice.objects.create(
+            stock=last,
+            date=date.today() + timedelta(days=next(new_bars)),
+            open_price=Decimal("3000"),
+            high_price=Decimal("3000"),
+            low_price=Decimal("3000"),
+            close_price=Decimal("3000"),
+            volume=1000,
+        )
+        load_pattern_index()
+
+    def compare():
+        # キャッシュから返さず毎回計算する
+        cache.clear()
+        assert compare_stocks(compare_symbols, days=365) is not None
+
+    cases = {
+        "update_stock_prices": refresh,
+        "create_features": lambda: create_features(prices.copy()),
+        "train_and_predict": lambda: train_and_predict(
+            X.iloc[:-1], y.iloc[:-1], stock.symbol, gap=1
+        ),
+        "simple_prediction": lambda: simple_prediction(stock),
+        "get_chart_data(30)": lambda: get_chart_data(stock, days=30),
+        "get_chart_data(365)": lambda: get_chart_data(stock, days=365),
+        "index_view": lambda: get("/"),
+        "chart_data_api": lambda: get(f"/api/chart-data/{stock.symbol}/?days=365"),
+        "load_pattern_index(cold)": pattern_index_cold,
+        "load_pattern_index(new bar)": pattern_index_new_bar,
+    }
+    if compare_symbols:
+        cases[f"compare_stocks({len(compare_symbols)})"] = compare
+    return cases
+
+
+def measure(func, repeat):
+    """
+    実行時間の中央値（ms）と、別に1回実行したときのピークメモリ（MB）・クエリ数
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "time_ms": round(statistics.median(timings), 3),
+        "peak_mb": round(peak / 1024 / 1024, 3),
+        "queries": len(queries),
+    }
+
+
+def run(scales, repeat, keepdb):
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=keepdb)
+    results = []
+    try:
+        for n_stocks, years in scales:
+            scale = f"{n_stocks}x{years}y"
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed(n_stocks, years)
+                stock = Stock.objects.order_by("symbol").first()
+                symbols = list(
+                    Stock.objects.order_by("symbol").values_list("symbol", flat=True)[
+                        :COMPARE_STOCKS
+                    ]
+                )
+                cases = build_cases(
+                    stock, symbols if len(symbols) == COMPARE_STOCKS else None
+                )
+                # 初回のみの処理（特徴量ストアの作成など）を除くため1回実行しておく
+                for func in cases.values():
+                    func()
+            print(f"🌱 {scale}: seeded in {time.perf_counter() - started:.1f}s")
+
+            for name, func in cases.items():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = measure(func, repeat)
+                budget = TIME_BUDGETS_MS.get(name)
+                if budget is not None:
+                    result["budget_ms"] = budget
+                results.append({"scale": scale, "case": name, **result})
+                print(
+                    f"   {name:<28} {result['time_ms']:>10.1f} ms "
+                    f"{result['peak_mb']:>8.2f} MB {result['queries']:>6} queries"
+                    + (
+                        f" {'❌' if result['time_ms'] > budget else '✅'} "
+                        f"(budget {budget} ms)"
+                        if budget is not None
+                        else ""
+                    )
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+    return results
+
+
+def _run_import(module, importtime=False):
+    """
+    新しいプロセスでDjangoを初期化してmoduleをimportし、結果と-X importtimeの出力を返す
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    completed = subprocess.run(
+        command + ["-c", IMPORT_SCRIPT.format(module=module)],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def parse_importtime(stderr):
+    """
+    -X importtimeの出力をトップレベルのパッケージごとの合計時間（ms、自身の時間の合計）に集計
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1000
+    return sorted(packages.items(), key=lambda item: -item[1])
+
+
+def import_report(repeat):
+    """
+    起動時のimport時間（中央値）・プロセスの最大RSS・読み込まれた重いライブラリを計測
+    """
+    results = []
+    for name, (module, forbidden) in IMPORT_TARGETS.items():
+        runs = [_run_import(module)[0] for _ in range(repeat)]
+        result, stderr = _run_import(module, importtime=True)
+        heavy = [m for m in forbidden if m in result["modules"]]
+        results.append(
+            {
+                "scale": "startup",
+                "case": f"import {name}",
+                "time_ms": round(statistics.median(r["time_ms"] for r in runs), 3),
+                "peak_mb": round(max(r["rss_mb"] for r in runs), 3),
+                "queries": 0,
+                "heavy_modules": heavy,
+                "packages": [
+                    [package, round(ms, 3)]
+                    for package, ms in parse_importtime(stderr)[:IMPORT_TOP_PACKAGES]
+                ],
+            }
+        )
+        print(
+            f"📦 import {name} ({module}): {results[-1]['time_ms']:.1f} ms, "
+            f"{results[-1]['peak_mb']:.1f} MB RSS"
+        )
+        for package, ms in results[-1]["packages"]:
+            print(f"   {package:<22} {ms:>10.1f} ms")
+        if heavy:
+            print(f"   ⚠️ Heavy modules loaded: {', '.join(heavy)}")
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    基準の結果と比較し、実行時間・メモリがthreshold以上増えたか、クエリ数が増えた処理を表示
+    回帰があればTrueを返す
+    """
+    base = {(r["scale"], r["case"]): r for r in baseline["results"]}
+    print("=" * 102)
+    print(
+        f"{'scale':<10} | {'case':<28} | {'time (ms)':>21} | {'peak (MB)':>17} | "
+        f"{'queries':>11} |"
+    )
+    print("-" * 102)
+
+    regressed = False
+    for result in results:
+        before = base.get((result["scale"], result["case"]))
+        if before is None:
+            continue
+        problems = []
+        time_diff = result["time_ms"] - before["time_ms"]
+        if time_diff > MIN_TIME_DIFF_MS and result["time_ms"] > before["time_ms"] * (
+            1 + threshold
+        ):
+            problems.append("time")
+        memory_diff = result["peak_mb"] - before["peak_mb"]
+        if memory_diff > MIN_MEMORY_DIFF_MB and result["peak_mb"] > before[
+            "peak_mb"
+        ] * (1 + threshold):
+            problems.append("memory")
+        if result["queries"] > before["queries"]:
+            problems.append("queries")
+        if set(result.get("heavy_modules", [])) - set(before.get("heavy_modules", [])):
+            problems.append("imports")
+        regressed |= bool(problems)
+
+        print(
+            f"{result['scale']:<10} | {result['case']:<28} | "
+            f"{before['time_ms']:>9.1f} → {result['time_ms']:>9.1f} | "
+            f"{before['peak_mb']:>7.2f} → {result['peak_mb']:>7.2f} | "
+            f"{before['queries']:>4} → {result['queries']:>4} | "
+            f"{'❌ ' + ', '.join(problems) if problems else '✅'}"
+        )
+    print("-" * 102)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--scales",
+        default=DEFAULT_SCALES,
+        help='銘柄数x年数のカンマ区切り（例: 10x1,1000x10）。"all"で全規模',
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    parser.add_argument(
+        "--keepdb", action="store_true", help="テスト用データベースを残して再利用する"
+    )
+    parser.add_argument(
+        "--imports-only",
+        action="store_true",
+        help="起動時のimport時間だけを計測する（データベースを使わない）",
+    )
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    parser.add_argument("--results", help="計測せずに既存の結果ファイルを比較する")
+    parser.add_argument("--compare", help="比較する基準の結果ファイル")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="回帰とみなす実行時間・メモリの増加率（デフォルト0.2 = 20%%）",
+    )
+    args = parser.parse_args()
+
+    if args.results:
+        report = json.loads(Path(args.results).read_text())
+    else:
+        print(f"🚀 Benchmark suite ({connection.vendor})")
+        results = import_report(args.repeat)
+        if not args.imports_only:
+            results += run(parse_scales(args.scales), args.repeat, args.keepdb)
+        report = {"meta": metadata(), "results": results}
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+            print(f"💾 Saved results to {args.output}")
+
+    over_budget = [
+        result
+        for result in report["results"]
+        if "budget_ms" in result and result["time_ms"] > result["budget_ms"]
+    ]
+    for result in over_budget:
+        print(
+            f"❌ {result['scale']} {result['case']}: {result['time_ms']:.1f} ms "
+            f"(budget {result['budget_ms']} ms)"
+        )
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(report["results"], baseline, args.threshold):
+            return 1
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+学習データ読み込みのベンチマーク（1年・10年・30年分の日足）
+Usage: docker compose exec web python benchmarks/bench_training_window.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_forecast_project.settings")
+django.setup()
+
+from django.conf import settings
+
+import numpy as np
+import pandas as pd
+
+from stocks.feature_store import load_feature_frame, rebuild_stock_features
+from stocks.models import Stock, StockPrice
+from stocks.utils import ml_prediction
+
+TRADING_DAYS_PER_YEAR = 252
+YEARS = [1, 10, 30]
+
+
+def seed_stock(years):
+    """ベンチマーク用の合成株価データを作成"""
+    stock, _ = Stock.objects.get_or_create(
+        symbol=f"BENCH{years}Y", defaults={"name": f"Benchmark {years}Y"}
+    )
+    StockPrice.objects.filter(stock=stock).delete()
+
+    rng = np.random.default_rng(years)
+    bars = years * TRADING_DAYS_PER_YEAR
+    closes = 3000 * np.cumprod(1 + rng.normal(0, 0.015, bars))
+    start = date.today() - timedelta(days=bars)
+    StockPrice.objects.bulk_create(
+        [
+            StockPrice(
+                stock=stock,
+                date=start + timedelta(days=i),
+                open_price=Decimal(f"{close * 0.995:.2f}"),
+                high_price=Decimal(f"{close * 1.01:.2f}"),
+                low_price=Decimal(f"{close * 0.99:.2f}"),
+                close_price=Decimal(f"{close:.2f}"),
+                volume=int(rng.integers(1_000_000, 10_000_000)),
+            )
+            for i, close in enumerate(closes)
+        ],
+        batch_size=2000,
+    )
+    rebuild_stock_features(stock)
+    return stock
+
+
+def legacy_load(stock):
+    """変更前のml_predictionと同じ読み込み方（全モデルインスタンス＋Decimal変換）"""
+    price_data = StockPrice.objects.filter(stock=stock).order_by("date")
+    len(price_data)
+    return pd.DataFrame(
+        [
+            {
+                "date": p.date,
+                "open": float(p.open_price),
+                "high": float(p.high_price),
+                "low": float(p.low_price),
+                "close": float(p.close_price),
+                "volume": p.volume,
+            }
+            for p in price_data
+        ]
+    )
+
+
+def measure(func, *args, **kwargs):
+    """実行時間（ms）とピークメモリ（MB）を計測"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    lookback = settings.ML_TRAINING_LOOKBACK_BARS
+    print("🚀 Training window benchmark")
+    print(f"   ML_TRAINING_LOOKBACK_BARS = {lookback}")
+    print("=" * 78)
+    print(f"{'history':>8} | {'case':<34} | {'time (ms)':>10} | {'peak (MB)':>9}")
+    print("-" * 78)
+
+    stocks = []
+    try:
+        for years in YEARS:
+            stock = seed_stock(years)
+            stocks.append(stock)
+
+            cases = [
+                ("legacy read (model instances)", legacy_load, (stock,), {}),
+                ("feature read (full history)", load_feature_frame, (stock,), {}),
+                (
+                    "feature read (lookback)",
+                    load_feature_frame,
+                    (stock,),
+                    {"lookback": lookback},
+                ),
+                (
+                    "ml_prediction (full history)",
+                    ml_prediction,
+                    (stock,),
+                    {"lookback": 0},
+                ),
+                ("ml_prediction (lookback)", ml_prediction, (stock,), {}),
+            ]
+            for label, func, args, kwargs in cases:
+                # 標準出力のログを抑制して計測
+                with open(os.devnull, "w") as devnull:
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        elapsed, peak = measure(func, *args, **kwargs)
+                    finally:
+                        sys.stdout = stdout
+                print(f"{years:>6}y | {label:<34} | {elapsed:>10.1f} | {peak:>9.2f}")
+            print("-" * 78)
+    finally:
+        for stock in stocks:
+            stock.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+ASGI config for stock_forecast_project project.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_forecast_project.settings")
+
+application = get_asgi_application()
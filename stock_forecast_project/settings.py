@@ -3,6 +3,7 @@ Django settings for stock_forecast_project project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,6 +29,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # ミドルウェアを含めたレスポンス時間を計測するため先頭に置く
+    "stocks.middleware.MetricsMiddleware",
+    # 書き込んだリクエストの直後のリクエストの読み取りをプライマリに固定する
+    "stocks.middleware.PrimaryPinningMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -35,6 +40,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # スタッフ判定に認証情報を使うため認証ミドルウェアより後に置く
+    "stocks.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "stock_forecast_project.urls"
@@ -56,18 +63,46 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "stock_forecast_project.wsgi.application"
+ASGI_APPLICATION = "stock_forecast_project.asgi.application"
 
 # Database
-DATABASES = {
-    "default": {
+# 接続先は環境変数で指定（コネクションプーラー（PgBouncer）を使う場合はDB_HOSTにプーラーを指定）
+# ワーカーのスレッドごとに接続をDB_CONN_MAX_AGE秒再利用し、再利用前に接続が生きているか確認する
+# ASGI（uvicorn）ではリクエストごとにスレッドが変わり接続を再利用できないため、DB_CONN_MAX_AGE=0にしてプーラーを使う
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+
+def database_config(host, port):
+    return {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "stock_forecast",
-        "USER": "postgres",
-        "PASSWORD": "postgres",
-        "HOST": "db",
-        "PORT": "5432",
+        "NAME": os.environ.get("DB_NAME", "stock_forecast"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", "postgres"),
+        "HOST": host,
+        "PORT": port,
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 5))},
     }
-}
+
+
+DATABASES = {"default": database_config(os.environ.get("DB_HOST", "db"), DB_PORT)}
+
+# 読み取り専用のレプリカ（カンマ区切りの"ホスト[:ポート]"。replica1, replica2, ...として追加）
+# 一覧・詳細画面・チャートデータ・特徴量（学習データ）の読み取りをレプリカに振り分ける
+for number, replica in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f"replica{number}"] = {
+        **database_config(host, port or DB_PORT),
+        # テストではプライマリのテスト用データベースを共有する
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["stocks.db_router.PrimaryReplicaRouter"]
+# 書き込み後にプライマリから読む秒数（レプリカの遅延より長くする）
+DATABASE_REPLICA_LAG_SECONDS = int(os.environ.get("DATABASE_REPLICA_LAG_SECONDS", 5))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,5 +133,89 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# キャッシュ（CACHE_BACKEND: "locmem"はプロセスごとのメモリ、"file"はCACHE_LOCATIONのディレクトリを
+# 同じホストのプロセスで共有、"redis"はCACHE_LOCATION（redis://...）で複数ホストで共有。redisパッケージが必要）
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": os.environ.get(
+            "CACHE_LOCATION",
+            (
+                os.path.join(tempfile.gettempdir(), "stock_forecast_cache")
+                if CACHE_BACKEND == "file"
+                else "stock_forecast"
+            ),
+        ),
+        "OPTIONS": {"MAX_ENTRIES": 10000} if CACHE_BACKEND != "redis" else {},
+    }
+}
+# 銘柄ごとの画面のキャッシュ（詳細・予想・チャートデータ・一覧の行・テンプレートの断片）の保持秒数
+# 株価・予想の書き込みで銘柄ごとに無効化するため、期限は古いキーを消すためのもの
+PAGE_CACHE_TIMEOUT = int(os.environ.get("PAGE_CACHE_TIMEOUT", 60 * 60))
+
+# 機械学習の設定
+# 学習に使う直近の足の本数（約3年分の営業日）。Noneまたは0で全履歴を使用
+ML_TRAINING_LOOKBACK_BARS = int(os.environ.get("ML_TRAINING_LOOKBACK_BARS", 750))
+# 1回の学習でまとめて予想する期間（営業日数）
+ML_PREDICTION_HORIZONS = [1, 5, 20]
+# 市場全体・業種の共通ファクターを特徴量に加えるか
+ML_USE_MARKET_FACTORS = os.environ.get("ML_USE_MARKET_FACTORS", "1") == "1"
+# 予測区間のシミュレーション（価格パス数・手法・校正に使う直近の足の本数）
+SIMULATION_PATHS = int(os.environ.get("SIMULATION_PATHS", 10000))
+SIMULATION_METHOD = os.environ.get("SIMULATION_METHOD", "bootstrap")
+SIMULATION_CALIBRATION_BARS = 250
+# 予想モード（"batch": 毎回再学習、"online": 株価更新時に逐次学習したモデルを使用）
+ML_PREDICTION_MODE = os.environ.get("ML_PREDICTION_MODE", "batch")
+
+# 自動更新スケジューラ（run_schedulerコマンド）
+# データ提供元へのリクエスト上限（全銘柄の合計。1分あたり・1日あたり）
+SCHEDULER_REQUESTS_PER_MINUTE = int(os.environ.get("SCHEDULER_REQUESTS_PER_MINUTE", 5))
+SCHEDULER_DAILY_BUDGET = int(os.environ.get("SCHEDULER_DAILY_BUDGET", 500))
+# キューを見直す間隔（秒）
+SCHEDULER_INTERVAL = int(os.environ.get("SCHEDULER_INTERVAL", 60))
+# 複数銘柄をまとめて取得する場合のデータ提供元への同時リクエスト数
+PROVIDER_CONCURRENCY = int(os.environ.get("PROVIDER_CONCURRENCY", 4))
+
+# 処理ステージごとの計測（取得・保存・特徴量・学習などの処理時間をJSONログに出力）
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "0") == "1"
+
+# リクエストのプロファイル（スタッフユーザーが?_profile=1を付けたリクエストと、
+# PROFILING_SAMPLE_RATEの割合のリクエストをcProfileで計測して保存）
+PROFILING_QUERY_PARAM = "_profile"
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+
+# Prometheus形式のメトリクス（/metrics）をプロセスごとに書き出すディレクトリ
+# 複数のコンテナ・ホストで集計する場合は共有ボリュームを指定する
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "stock_forecast_metrics")
+)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "stocks.instrumentation.JsonFormatter"},
+    },
+    "handlers": {
+        "instrumentation": {
+            "class": "logging.StreamHandler",
+            "formatter": "json",
+        },
+    },
+    "loggers": {
+        "stocks.instrumentation": {
+            "handlers": ["instrumentation"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Abs, Cast, NullIf, Sign
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from .models import PredictionAccuracy, StockPrediction, StockPrice
+from .page_cache import invalidate_stocks
+
+# 精度集計に使う直近の採点済み予想の件数
+ACCURACY_WINDOW = 30
+
+
+def score_matured_predictions(stock_obj=None):
+    """
+    予測日を迎えた未採点の予想に実績価格を突き合わせて誤差を保存
+    予測日が休場日の場合は、その後の最初の営業日の終値を実績とする
+    """
+    scored_at = timezone.now()
+
+    # 予測日以降で最初の足の終値（1回のUPDATE文で全件まとめて計算）
+    actual = Subquery(
+        StockPrice.objects.filter(
+            stock=OuterRef("stock"), date__gte=OuterRef("prediction_date")
+        )
+        .order_by("date")
+        .values("close_price")[:1]
+    )
+    actual_float = Cast(actual, FloatField())
+    predicted_float = Cast(F("predicted_price"), FloatField())
+    base_float = Cast(F("base_price"), FloatField())
+
+    pending = StockPrediction.objects.filter(
+        Exists(
+            StockPrice.objects.filter(
+                stock=OuterRef("stock"), date__gte=OuterRef("prediction_date")
+            )
+        ),
+        scored_at__isnull=True,
+    )
+    if stock_obj is not None:
+        pending = pending.filter(stock=stock_obj)
+
+    with transaction.atomic():
+        scored_count = pending.update(
+            actual_price=actual,
+            abs_error=Abs(predicted_float - actual_float),
+            # 実績価格が0の場合は誤差率を計算しない（0除算で採点全体がロールバックされないように）
+            abs_pct_error=Abs(predicted_float - actual_float)
+            / NullIf(actual_float, Value(0.0))
+            * 100,
+            direction_hit=Case(
+                When(base_price__isnull=True, then=Value(None)),
+                When(
+                    Exact(
+                        Sign(predicted_float - base_float),
+                        Sign(actual_float - base_float),
+                    ),
+                    then=Value(True),
+                ),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            scored_at=scored_at,
+        )
+
+        if scored_count:
+            pairs = (
+                StockPrediction.objects.filter(scored_at=scored_at)
+                .values_list("stock_id", "method", "horizon")
+                .distinct()
+            )
+            pairs = list(pairs)
+            for stock_id, method, horizon in _families(pairs):
+                refresh_prediction_accuracy(stock_id, method, horizon)
+            # UPDATE文はシグナルを送らないため、採点した銘柄のキャッシュを明示的に無効化
+            invalidate_stocks({stock_id for stock_id, _, _ in pairs})
+
+    if scored_count:
+        print(f"🎯 Scored {scored_count} matured predictions")
+    return scored_count
+
+
+def _families(rows):
+    """
+    (銘柄ID, 手法, 予測期間)を手法の系統（モデル名・トレンドを除いた手法）ごとにまとめる
+    """
+    from .utils import method_family
+
+    return sorted(
+        {
+            (stock_id, method_family(method), horizon)
+            for stock_id, method, horizon in rows
+        },
+        key=lambda row: (row[0], row[1], row[2] or 0),
+    )
+
+
+def rebuild_prediction_accuracy():
+    """
+    採点済みの全予想から手法の系統ごとの精度を集計し直す（集計の単位を変えた場合など）
+    """
+    rows = StockPrediction.objects.filter(scored_at__isnull=False).values_list(
+        "stock_id", "method", "horizon"
+    )
+    families = _families(rows.distinct())
+    with transaction.atomic():
+        PredictionAccuracy.objects.all().delete()
+        for stock_id, method, horizon in families:
+            refresh_prediction_accuracy(stock_id, method, horizon)
+    invalidate_stocks({stock_id for stock_id, _, _ in families})
+    return len(families)
+
+
+def refresh_prediction_accuracy(stock_id, method, horizon=None):
+    """
+    指定した銘柄・手法・予測期間の直近の採点済み予想から精度を集計し直す
+    手法は系統（"機械学習"・"改良移動平均"など）ごとに、モデル名・トレンドの違いをまとめて集計する
+    """
+    from .utils import method_family
+
+    method = method_family(method)
+    recent = list(
+        StockPrediction.objects.filter(
+            Q(method=method) | Q(method__startswith=f"{method}（"),
+            stock_id=stock_id,
+            horizon=horizon,
+            scored_at__isnull=False,
+        )
+        .order_by("-prediction_date", "-created_at")
+        .values_list("abs_error", "abs_pct_error", "direction_hit")[:ACCURACY_WINDOW]
+    )
+
+    pcts = [pct for _, pct, _ in recent if pct is not None]
+    hits = [hit for _, _, hit in recent if hit is not None]
+    PredictionAccuracy.objects.update_or_create(
+        stock_id=stock_id,
+        method=method,
+        horizon=horizon,
+        defaults={
+            "sample_count": len(recent),
+            "mae": sum(error for error, _, _ in recent) / len(recent),
+            "mape": sum(pcts) / len(pcts) if pcts else None,
+            "hit_rate": sum(hits) / len(hits) * 100 if hits else None,
+        },
+    )
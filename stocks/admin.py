@@ -1,12 +1,25 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 
-from .models import Stock, StockPrediction, StockPrice
+from .models import (
+    BackfillAttempt,
+    LatestIndicator,
+    MarketFactor,
+    OnlineModelState,
+    PredictionAccuracy,
+    RequestProfile,
+    SingleFlight,
+    Stock,
+    StockFeature,
+    StockPrediction,
+    StockPrice,
+)
 
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
-    list_display = ("symbol", "name", "exchange", "created_at")
-    list_filter = ("exchange", "created_at")
+    list_display = ("symbol", "name", "exchange", "sector", "view_count", "created_at")
+    list_filter = ("exchange", "sector", "created_at")
     search_fields = ("symbol", "name")
 
 
@@ -26,6 +39,158 @@ class StockPredictionAdmin(admin.ModelAdmin):
         "predicted_price",
         "confidence",
         "method",
+        "horizon",
+        "lower_price",
+        "upper_price",
+        "actual_price",
+        "abs_pct_error",
+        "direction_hit",
     )
-    list_filter = ("method", "prediction_date")
+    list_filter = ("method", "prediction_date", "direction_hit")
     search_fields = ("stock__symbol", "stock__name")
+
+
+@admin.register(PredictionAccuracy)
+class PredictionAccuracyAdmin(admin.ModelAdmin):
+    list_display = (
+        "stock",
+        "method",
+        "horizon",
+        "sample_count",
+        "mae",
+        "mape",
+        "hit_rate",
+    )
+    list_filter = ("method",)
+    search_fields = ("stock__symbol", "stock__name")
+
+
+@admin.register(StockFeature)
+class StockFeatureAdmin(admin.ModelAdmin):
+    list_display = ("stock", "date", "close", "rsi", "macd", "volume_ratio")
+    list_filter = ("stock", "date")
+    search_fields = ("stock__symbol", "stock__name")
+    date_hierarchy = "date"
+
+
+@admin.register(LatestIndicator)
+class LatestIndicatorAdmin(admin.ModelAdmin):
+    list_display = (
+        "stock",
+        "date",
+        "close",
+        "rsi",
+        "ma20_gap",
+        "volume_ratio",
+        "price_change_5d",
+    )
+    search_fields = ("stock__symbol", "stock__name")
+
+
+@admin.register(OnlineModelState)
+class OnlineModelStateAdmin(admin.ModelAdmin):
+    list_display = ("stock", "updated_at")
+    search_fields = ("stock__symbol", "stock__name")
+    exclude = ("state",)
+
+
+@admin.register(SingleFlight)
+class SingleFlightAdmin(admin.ModelAdmin):
+    list_display = ("stock", "task", "started_at", "finished_at")
+    list_filter = ("task",)
+    search_fields = ("stock__symbol", "stock__name")
+    exclude = ("result",)
+
+
+@admin.register(MarketFactor)
+class MarketFactorAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "exchange",
+        "sector",
+        "market_return",
+        "breadth",
+        "volatility",
+        "member_count",
+    )
+    list_filter = ("exchange", "sector")
+    date_hierarchy = "date"
+
+
+@admin.register(BackfillAttempt)
+class BackfillAttemptAdmin(admin.ModelAdmin):
+    list_display = ("stock", "date", "attempts", "last_attempted_at")
+    list_filter = ("attempts",)
+    search_fields = ("stock__symbol", "stock__name")
+    date_hierarchy = "date"
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "similar_query_count",
+        "duplicate_query_count",
+        "username",
+        "sampled",
+    )
+    list_filter = ("view_name", "method", "sampled")
+    search_fields = ("path", "username")
+    date_hierarchy = "created_at"
+    exclude = ("top_functions", "queries")
+    readonly_fields = (
+        "created_at",
+        "method",
+        "path",
+        "view_name",
+        "status_code",
+        "username",
+        "sampled",
+        "duration_ms",
+        "query_count",
+        "query_time_ms",
+        "similar_query_count",
+        "duplicate_query_count",
+        "top_functions_table",
+        "queries_table",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="処理時間の長い関数")
+    def top_functions_table(self, obj):
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td>{}</td><td><code>{}</code></td></tr>",
+            (
+                (row["cumtime_ms"], row["tottime_ms"], row["ncalls"], row["function"])
+                for row in obj.top_functions
+            ),
+        )
+        return format_html(
+            "<table><tr><th>累積（ms）</th><th>自身（ms）</th><th>呼び出し回数</th>"
+            "<th>関数</th></tr>{}</table>",
+            rows,
+        )
+
+    @admin.display(description="SQLクエリ（同じ形のクエリをまとめて表示）")
+    def queries_table(self, obj):
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td>{}</td><td><code>{}</code></td></tr>",
+            (
+                (query["count"], query["duplicates"], query["time_ms"], query["sql"])
+                for query in obj.queries
+            ),
+        )
+        return format_html(
+            "<table><tr><th>回数</th><th>重複</th><th>合計（ms）</th><th>SQL</th>"
+            "</tr>{}</table>",
+            rows,
+        )
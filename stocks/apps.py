@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StocksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "stocks"
+
+    def ready(self):
+        # 株価・予想の書き込みでキャッシュを無効化するシグナルを登録
+        from . import page_cache  # noqa: F401
@@ -0,0 +1,247 @@
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from django.conf import settings
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import load_feature_frame, update_stock_features
+from .market_factors import (
+    MARKET_FEATURE_COLUMNS,
+    join_market_factors,
+    refresh_market_factors,
+)
+from .online_learning import new_online_state, partial_update, predict_returns
+from .utils import FEATURE_COLUMNS, train_and_predict
+
+# バックテスト対象の予想手法
+# ml: ml_predictionと同じモデル選択（train_and_predict）
+# online: オンライン学習（1本ごとに予想してから逐次更新）
+# moving_average: simple_predictionのフォールバック（改良移動平均）
+BACKTEST_METHODS = ["ml", "online", "moving_average"]
+
+
+def walk_forward_backtest(
+    stocks,
+    methods=None,
+    horizon=7,
+    retrain_every=20,
+    lookback=None,
+    min_train=120,
+    workers=None,
+    profile="fast",
+):
+    """
+    ウォークフォワード方式で予想手法を過去データに対して検証
+    horizon: 何本先の終値を予想するか（足の本数）
+    retrain_every: 何本ごとにモデルを再学習するか（間は学習済みモデルを再利用）
+    lookback: 学習に使う直近の足の本数（Noneで全履歴）
+    workers: 並列プロセス数（1で逐次実行、Noneで自動）
+    profile: 機械学習のモデル選択プロファイル
+    """
+    methods = methods or BACKTEST_METHODS
+    unknown = set(methods) - set(BACKTEST_METHODS)
+    if unknown:
+        raise ValueError(f"Unknown backtest method: {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+
+    # DBアクセスは親プロセスでまとめて行い、ワーカーには配列だけを渡す
+    feature_columns = FEATURE_COLUMNS
+    if settings.ML_USE_MARKET_FACTORS:
+        refresh_market_factors()
+        feature_columns = FEATURE_COLUMNS + MARKET_FEATURE_COLUMNS
+
+    jobs = []
+    for stock in stocks:
+        update_stock_features(stock)
+        df = load_feature_frame(stock)
+        if settings.ML_USE_MARKET_FACTORS:
+            df = join_market_factors(stock, df)
+        jobs.append(
+            {
+                "symbol": stock.symbol,
+                "features": df[feature_columns],
+                "close": df["close"].to_numpy(),
+                "methods": methods,
+                "horizon": horizon,
+                "retrain_every": retrain_every,
+                "lookback": lookback,
+                "min_train": min_train,
+                "profile": profile,
+            }
+        )
+
+    if workers == 1 or len(jobs) <= 1:
+        outputs = [_backtest_stock(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(_backtest_stock, jobs))
+
+    per_stock = []
+    pooled = {method: [] for method in methods}
+    retrains = 0
+    for output in outputs:
+        retrains += output["retrains"]
+        for method, arrays in output["methods"].items():
+            pooled[method].append(arrays)
+            per_stock.append(
+                {
+                    "symbol": output["symbol"],
+                    "method": method,
+                    **score_predictions(*arrays),
+                }
+            )
+
+    per_method = {}
+    for method, chunks in pooled.items():
+        if chunks:
+            arrays = [np.concatenate(parts) for parts in zip(*chunks)]
+        else:
+            arrays = [np.empty(0)] * 3
+        per_method[method] = score_predictions(*arrays)
+
+    elapsed = time.perf_counter() - started
+    total_predictions = sum(result["predictions"] for result in per_method.values())
+
+    return {
+        "per_method": per_method,
+        "per_stock": per_stock,
+        "stocks": len(jobs),
+        "predictions": total_predictions,
+        "retrains": retrains,
+        "elapsed": elapsed,
+        "throughput": total_predictions / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def score_predictions(predicted, actual, base):
+    """
+    予想値・実績値・予想時点の終値から評価指標をまとめて計算
+    """
+    count = len(predicted)
+    if count == 0:
+        return {"predictions": 0, "mae": None, "mape": None, "hit_rate": None}
+
+    errors = np.abs(predicted - actual)
+    hits = np.sign(predicted - base) == np.sign(actual - base)
+
+    return {
+        "predictions": int(count),
+        "mae": float(errors.mean()),
+        "mape": float((errors / np.abs(actual)).mean() * 100),
+        "hit_rate": float(hits.mean() * 100),
+    }
+
+
+def _backtest_stock(job):
+    """
+    1銘柄分のバックテスト（ワーカープロセスで実行、DBにはアクセスしない）
+    """
+    close = job["close"]
+    horizon = job["horizon"]
+    # 予想時点の足（horizon本先の実績がある範囲のみ）
+    targets = np.arange(job["min_train"], len(close) - horizon)
+
+    result = {"symbol": job["symbol"], "methods": {}, "retrains": 0}
+    if len(targets) == 0:
+        result["methods"] = {
+            method: (np.empty(0), np.empty(0), np.empty(0)) for method in job["methods"]
+        }
+        return result
+
+    actual = close[targets + horizon]
+    base = close[targets]
+
+    for method in job["methods"]:
+        if method == "moving_average":
+            predicted = _moving_average_predictions(job["features"], close, targets)
+        elif method == "online":
+            predicted = _online_predictions(job, targets)
+        else:
+            predicted, retrains = _ml_predictions(job, targets)
+            result["retrains"] += retrains
+        result["methods"][method] = (predicted, actual, base)
+
+    return result
+
+
+def _moving_average_predictions(features, close, targets):
+    """
+    simple_predictionの改良移動平均を全時点まとめて計算
+    上昇・下降どちらの場合も close * (1 + 0.1 * (ma_5 - ma_20) / ma_20) になる
+    """
+    ma_5 = features["ma_5"].to_numpy()[targets]
+    ma_20 = features["ma_20"].to_numpy()[targets]
+    return close[targets] * (1 + 0.1 * (ma_5 - ma_20) / ma_20)
+
+
+def _ml_predictions(job, targets):
+    """
+    再学習点ごとにtrain_and_predictでモデルを選び、次の再学習点まで使い回す
+    ml_predictionと同じくhorizon本先の終値を目的変数として学習する
+    """
+    features = job["features"]
+    horizon = job["horizon"]
+    y = pd.Series(job["close"]).shift(-horizon)
+    lookback = job["lookback"]
+    predicted = np.empty(len(targets))
+    retrains = 0
+
+    for block_start in range(0, len(targets), job["retrain_every"]):
+        block = targets[block_start : block_start + job["retrain_every"]]
+        # 再学習時点で目的変数（horizon本先の終値）が確定している行まで
+        train_end = block[0] + 1 - horizon
+        train_start = max(0, train_end - lookback) if lookback else 0
+
+        # 学習ログは大量になるため抑制
+        with redirect_stdout(io.StringIO()):
+            fitted = train_and_predict(
+                features.iloc[train_start:train_end],
+                y.iloc[train_start:train_end],
+                job["symbol"],
+                profile=job["profile"],
+                gap=horizon,
+            )
+        retrains += 1
+
+        if fitted is None:
+            # 学習に失敗した区間は現在値をそのまま予想とする
+            predicted[block_start : block_start + len(block)] = job["close"][block]
+            continue
+        predicted[block_start : block_start + len(block)] = fitted["model"].predict(
+            features.iloc[block]
+        )
+
+    return predicted, retrains
+
+
+def _online_predictions(job, targets):
+    """
+    オンライン学習を再現: 各時点で予想し、目的変数が確定した行で1本ずつ更新
+    """
+    # オンライン学習は銘柄自身の特徴量のみを使う
+    X = job["features"][FEATURE_COLUMNS].to_numpy()
+    close = job["close"]
+    horizon = job["horizon"]
+    state = new_online_state()
+
+    # 最初の予想時点までに目的変数が確定している行で初期学習
+    warmup = np.arange(0, targets[0] - horizon + 1)
+    partial_update(state, X[warmup], close[warmup + horizon] / close[warmup] - 1)
+
+    predicted = np.empty(len(targets))
+    for k, t in enumerate(targets):
+        predicted[k] = close[t] * (1 + predict_returns(state, X[t : t + 1])[0])
+        # 次の足が確定するとt + 1 - horizonの行の目的変数が確定する
+        i = t + 1 - horizon
+        partial_update(
+            state,
+            X[i : i + 1],
+            close[i + horizon : i + horizon + 1] / close[i : i + 1] - 1,
+        )
+
+    return predicted
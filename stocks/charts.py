@@ -0,0 +1,62 @@
+from .instrumentation import annotate, stage, timed
+from .models import StockPrice
+
+# APIで取得する本数の区切り（指定された本数以上の最小の区切りで取得・キャッシュし、直近の本数に切り出す）
+CHART_DAYS = [30, 90, 180, 365, 730, 1825, 3650]
+
+
+def _recent_prices(stock_obj, days):
+    return StockPrice.objects.filter(stock=stock_obj).order_by("-date")[:days]
+
+
+def _chart_data(prices):
+    """
+    新しい順の株価をチャート用のデータ（古い順）に変換
+    """
+    data = {"dates": [], "prices": [], "volumes": []}
+
+    with stage("serialize"):
+        for price in reversed(prices):
+            # 月日のみ表示（MM/DD形式）
+            data["dates"].append(price.date.strftime("%m/%d"))
+            data["prices"].append(float(price.close_price))
+            data["volumes"].append(price.volume)
+
+    return data
+
+
+@timed("get_chart_data")
+def get_chart_data(stock_obj, days=30):
+    """
+    チャート表示用のデータを取得
+    """
+    with stage("query"):
+        prices = list(_recent_prices(stock_obj, days))
+    annotate(symbol=stock_obj.symbol, rows=len(prices))
+    return _chart_data(prices)
+
+
+async def aget_chart_data(stock_obj, days=30):
+    """
+    get_chart_dataの非同期版（非同期ORMで取得するため、待機中にワーカーのスレッドを占有しない）
+    """
+    with stage("get_chart_data"):
+        with stage("query"):
+            prices = [price async for price in _recent_prices(stock_obj, days)]
+        annotate(symbol=stock_obj.symbol, rows=len(prices))
+        return _chart_data(prices)
+
+
+def chart_days_bucket(days):
+    """
+    指定された本数を含む最小の区切り（1〜CHART_DAYSの最大値に丸めてから選ぶ）
+    """
+    days = max(1, min(days, CHART_DAYS[-1]))
+    return days, next(bucket for bucket in CHART_DAYS if bucket >= days)
+
+
+def slice_chart_data(data, days):
+    """
+    チャート用のデータを直近days本に切り出す
+    """
+    return {key: values[-days:] for key, values in data.items()}
@@ -0,0 +1,182 @@
+import hashlib
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+import numpy as np
+import pandas as pd
+
+from .metrics import record_cache
+from .models import Stock, StockPrice
+from .page_cache import stock_versions
+
+CACHE_TIMEOUT = 60 * 60
+TRADING_DAYS_PER_YEAR = 252
+# 比較期間（日数）とベータの計算期間（取引日数）の範囲（APIの指定値はこの範囲に丸める）
+MAX_DAYS = 365 * 10
+MIN_BETA_WINDOW = 5
+MAX_BETA_WINDOW = 250
+# 期間の最初からこの取引日数より後に株価が始まる銘柄は、期間の途中で上場した銘柄として比較から除く
+LATE_LISTING_SESSIONS = 5
+
+
+def compare_stocks(symbols, days=365, benchmark=None, beta_window=60):
+    """
+    複数銘柄の終値を共通の日付に揃えて、累積リターン・リターンの相関行列・
+    ローリングベータを行列演算でまとめて計算
+    benchmark: ベータの基準とする銘柄（省略時は全銘柄の等加重平均リターン）
+    結果は（銘柄の組み合わせ・期間・銘柄ごとのキャッシュのバージョン）ごとにキャッシュする
+    （バージョンは過去の日付の補完を含む株価の書き込みで更新される。page_cacheを参照）
+    """
+    stocks = dict(
+        Stock.objects.filter(symbol__in=set(symbols)).values_list("id", "symbol")
+    )
+    since = date.today() - timedelta(days=days)
+    prices = StockPrice.objects.filter(stock_id__in=stocks, date__gte=since)
+
+    versions = stock_versions(stocks)
+    digest = hashlib.md5(
+        ",".join(
+            [f"{stocks[stock_id]}:{versions[stock_id]}" for stock_id in sorted(stocks)]
+            + [str(benchmark), str(since), str(beta_window)]
+        ).encode()
+    ).hexdigest()
+    key = f"comparison:{digest}"
+    result = cache.get(key)
+    record_cache("comparison", result is not None)
+    if result is None:
+        # 結合やDecimalへの変換を避け、銘柄IDと浮動小数点の終値だけを読み込む
+        rows = list(
+            prices.annotate(close=Cast("close_price", FloatField())).values_list(
+                "stock_id", "date", "close"
+            )
+        )
+        if not rows:
+            return None
+        closes = (
+            pd.DataFrame.from_records(rows, columns=["stock_id", "date", "close"])
+            .pivot(index="date", columns="stock_id", values="close")
+            .rename(columns=stocks)
+            .sort_index()
+        )
+        closes = closes[sorted(closes.columns)]
+        result = compare_closes(closes, benchmark=benchmark, beta_window=beta_window)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def compare_closes(closes, benchmark=None, beta_window=60):
+    """
+    日付×銘柄の終値DataFrameから比較指標を計算
+    取引所の休場日の違いは直前の終値で埋め、全銘柄の値が揃う日から比較する
+    期間の途中から株価が始まる銘柄は、全銘柄の比較期間がその日まで短くならないように除き、
+    開始日と共にexcludedに返す（期間全体の株価がある銘柄が2銘柄未満の場合・ベンチマークの場合は除かない）
+    """
+    if benchmark is not None and benchmark not in closes.columns:
+        raise ValueError(f"Benchmark {benchmark} is not in the comparison")
+
+    starts = closes.apply(pd.Series.first_valid_index)
+    positions = closes.index.get_indexer(starts)
+    late = [
+        symbol
+        for symbol, position in zip(closes.columns, positions)
+        if position > LATE_LISTING_SESSIONS
+    ]
+    excluded = []
+    if late and benchmark not in late and len(closes.columns) - len(late) >= 2:
+        excluded = [
+            {"symbol": symbol, "first_date": str(starts[symbol])} for symbol in late
+        ]
+        closes = closes.drop(columns=late)
+
+    closes = closes.ffill().dropna()
+    if len(closes) < 2:
+        return None
+
+    symbols = list(closes.columns)
+    values = closes.to_numpy()
+    returns = values[1:] / values[:-1] - 1
+
+    # 期間の初日を0とした累積リターン
+    cumulative = values / values[0] - 1
+
+    # リターンの相関行列（値動きのない銘柄はNaNになるためNoneで返す）
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = np.corrcoef(returns, rowvar=False)
+    correlation = np.atleast_2d(correlation)
+
+    if benchmark is None:
+        market = returns.mean(axis=1)
+    else:
+        market = returns[:, symbols.index(benchmark)]
+    betas = rolling_betas(returns, market, beta_window)
+
+    return {
+        "symbols": symbols,
+        "dates": [str(d) for d in closes.index[1:]],
+        "benchmark": benchmark or "equal_weight",
+        "beta_window": beta_window,
+        "excluded": excluded,
+        "cumulative_returns": {
+            symbol: _round_list(cumulative[1:, i] * 100, 2)
+            for i, symbol in enumerate(symbols)
+        },
+        "correlation": _round_list(correlation, 4),
+        "rolling_betas": {
+            symbol: _round_list(betas[:, i], 4) for i, symbol in enumerate(symbols)
+        },
+        "summary": [
+            {
+                "symbol": symbol,
+                "total_return": round(float(cumulative[-1, i]) * 100, 2),
+                "volatility": round(
+                    float(returns[:, i].std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100),
+                    2,
+                ),
+                "beta": _round_value(betas[-1, i], 4),
+            }
+            for i, symbol in enumerate(symbols)
+        ],
+    }
+
+
+def rolling_betas(returns, market, window):
+    """
+    全銘柄のローリングベータ（共分散 / 市場リターンの分散）を累積和から一括計算
+    最初のwindow - 1日分はNaN
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    market = np.asarray(market, dtype=np.float64)
+    betas = np.full(returns.shape, np.nan)
+    if len(market) < window:
+        return betas
+
+    def rolling_sum(values):
+        cumsum = np.cumsum(values, axis=0)
+        cumsum = np.concatenate([np.zeros((1,) + cumsum.shape[1:]), cumsum])
+        return cumsum[window:] - cumsum[:-window]
+
+    mean_x = rolling_sum(returns) / window
+    mean_m = rolling_sum(market) / window
+    cov = rolling_sum(returns * market[:, None]) / window - mean_x * mean_m[:, None]
+    var = rolling_sum(market**2) / window - mean_m**2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        betas[window - 1 :] = cov / var[:, None]
+    return betas
+
+
+def _round_value(value, digits):
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+def _round_list(values, digits):
+    """
+    配列を丸めてJSONに変換できるリストにする（NaN・infはNone）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, digits).astype(object)
+    rounded[~np.isfinite(values)] = None
+    return rounded.tolist()
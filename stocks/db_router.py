@@ -0,0 +1,129 @@
+import functools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from asgiref.sync import iscoroutinefunction
+
+# 読み取りに使うレプリカのエイリアス（read_from_replicaの範囲内のみ。Noneはプライマリ）
+# 同じ範囲の読み取りは1つのレプリカにまとめ、遅延の異なるレプリカで結果が前後しないようにする
+_replica = ContextVar("stocks_read_replica", default=None)
+# この時刻（time.monotonic）まではレプリカではなくプライマリから読む（書き込み直後の読み取り）
+_primary_until = ContextVar("stocks_primary_until", default=0.0)
+
+# 書き込んだリクエストの後続のリクエストをプライマリに固定するためのCookie
+PRIMARY_PIN_COOKIE = "db_primary"
+
+
+def replica_aliases():
+    """
+    設定されている読み取り専用レプリカのエイリアス（DB_REPLICA_HOSTSで指定）
+    """
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def pin_to_primary():
+    """
+    レプリカの遅延の間（DATABASE_REPLICA_LAG_SECONDS）、このコンテキストの読み取りをプライマリに固定
+    """
+    _primary_until.set(time.monotonic() + settings.DATABASE_REPLICA_LAG_SECONDS)
+
+
+def is_pinned_to_primary():
+    return time.monotonic() < _primary_until.get()
+
+
+@contextmanager
+def replica_reads():
+    """
+    この範囲の読み取りをレプリカに振り分ける（レプリカがない場合・書き込み直後はプライマリ）
+    """
+    aliases = replica_aliases()
+    token = _replica.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def read_from_replica(func):
+    """
+    関数・ビューの読み取りをレプリカに振り分けるデコレーター（非同期ビューにも対応）
+    """
+    if iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with replica_reads():
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def without_pinning():
+    """
+    書き込み直後の一貫性が不要な書き込み（閲覧数の加算など）で、読み取りをプライマリに固定しない
+    """
+    token = _primary_until.set(_primary_until.get())
+    try:
+        yield
+    finally:
+        _primary_until.reset(token)
+
+
+@contextmanager
+def pinning_scope(pinned=False):
+    """
+    プライマリへの固定の状態を新しく始める範囲（リクエストごとに使用）
+    pinned=Trueで最初から固定し、この範囲で書き込んだかを返す関数を渡す
+    """
+    token = _primary_until.set(0.0)
+    try:
+        if pinned:
+            pin_to_primary()
+        started = _primary_until.get()
+        yield lambda: _primary_until.get() > started
+    finally:
+        _primary_until.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    書き込みはすべてプライマリ、read_from_replicaを付けた読み取りの多い処理はレプリカに振り分ける
+    書き込んだコンテキストの読み取りはレプリカの遅延の間プライマリに固定する（read-your-writes）
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None:
+            # 振り分けの対象外（インスタンスを読み込んだDBまたはプライマリを使う）
+            return None
+        if is_pinned_to_primary():
+            return "default"
+        return replica
+
+    def db_for_write(self, model, **hints):
+        if replica_aliases():
+            pin_to_primary()
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはプライマリの複製のため、どのDBから読み込んだインスタンス同士も関連付けられる
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # スキーマはレプリケーションで反映されるため、マイグレーションはプライマリのみ
+        if db in replica_aliases():
+            return False
+        return None
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+
+import numpy as np
+import pandas as pd
+
+from .db_router import read_from_replica
+from .models import StockFeature, StockPrice
+from .screener import refresh_latest_indicator
+from .utils import FEATURE_COLUMNS, create_features
+
+# 再計算時に遡って読み込む足の本数
+# ローリング系（最大20本）はこの範囲で厳密に再現でき、MACDのEWM（span=26）も
+# 26本×10の履歴があれば打ち切り誤差は約1e-9まで減衰する
+ROLLING_WARMUP_BARS = 20
+MACD_SLOW_SPAN = 26
+FEATURE_WARMUP_BARS = max(ROLLING_WARMUP_BARS, MACD_SLOW_SPAN * 10)
+
+PRICE_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+
+def update_stock_features(stock_obj, start_date=None):
+    """
+    新しい足の影響を受ける行だけ特徴量を計算して保存
+    start_date未指定の場合は保存済みの最終日の翌日以降を計算する
+    """
+    if start_date is None:
+        last_date = (
+            StockFeature.objects.filter(stock=stock_obj)
+            .order_by("-date")
+            .values_list("date", flat=True)
+            .first()
+        )
+        if last_date is not None:
+            start_date = last_date + timedelta(days=1)
+
+    return _store_features(stock_obj, start_date)
+
+
+def rebuild_stock_features(stock_obj):
+    """
+    全履歴から特徴量を作り直す（特徴量の定義を変更した場合など）
+    """
+    return _store_features(stock_obj, None)
+
+
+def _store_features(stock_obj, start_date):
+    """
+    start_date以降の特徴量を計算して置き換える（Noneの場合は全期間）
+    """
+    prices = StockPrice.objects.filter(stock=stock_obj)
+
+    if start_date is not None:
+        # ウォームアップに必要な分だけ過去の足を含める
+        warmup = list(
+            prices.filter(date__lt=start_date)
+            .order_by("-date")
+            .values_list("date", flat=True)[
+                FEATURE_WARMUP_BARS - 1 : FEATURE_WARMUP_BARS
+            ]
+        )
+        if warmup:
+            prices = prices.filter(date__gte=warmup[0])
+
+    rows = list(
+        prices.order_by("date").values_list(
+            "date", "open_price", "high_price", "low_price", "close_price", "volume"
+        )
+    )
+    if start_date is not None and (not rows or rows[-1][0] < start_date):
+        return 0
+
+    df = pd.DataFrame.from_records(rows, columns=PRICE_COLUMNS)
+    df[PRICE_COLUMNS[1:]] = df[PRICE_COLUMNS[1:]].astype(float)
+    df = create_features(df)
+
+    if start_date is not None:
+        df = df[df["date"] >= start_date]
+
+    # ウォームアップ期間のNaNやゼロ除算によるinfは保存しない
+    df = df.replace([np.inf, -np.inf], np.nan).dropna(subset=FEATURE_COLUMNS)
+
+    features = [
+        StockFeature(stock=stock_obj, **record)
+        for record in df[["date", "close"] + FEATURE_COLUMNS].to_dict("records")
+    ]
+
+    with transaction.atomic():
+        existing = StockFeature.objects.filter(stock=stock_obj)
+        if start_date is not None:
+            existing = existing.filter(date__gte=start_date)
+        existing.delete()
+        StockFeature.objects.bulk_create(features, batch_size=1000)
+        # スクリーナー用の最新指標も合わせて更新
+        refresh_latest_indicator(stock_obj)
+
+    print(f"🧮 Stored {len(features)} feature rows for {stock_obj.symbol}")
+    return len(features)
+
+
+@read_from_replica
+def load_feature_frame(stock_obj, lookback=None, since=None):
+    """
+    保存済みの特徴量を1回のクエリで日付順のDataFrameとして取得
+    lookbackを指定すると直近の足の本数に、sinceを指定するとその翌日以降に制限する
+    """
+    columns = ["date", "close"] + FEATURE_COLUMNS
+    rows = StockFeature.objects.filter(stock=stock_obj).order_by("-date")
+    if since is not None:
+        rows = rows.filter(date__gt=since)
+    if lookback:
+        rows = rows[:lookback]
+    rows = list(rows.values_list(*columns))
+    rows.reverse()
+
+    # モデルインスタンスを作らず、数値列をそのままfloat64の配列に詰める
+    values = np.fromiter(
+        chain.from_iterable(row[1:] for row in rows),
+        dtype=np.float64,
+        count=len(rows) * (len(columns) - 1),
+    ).reshape(len(rows), len(columns) - 1)
+
+    df = pd.DataFrame(values, columns=columns[1:])
+    df.insert(0, "date", np.array([row[0] for row in rows], dtype="datetime64[D]"))
+    return df
@@ -3,6 +3,7 @@ import re
 from django import forms
 
 from .models import Stock
+from .trading_calendar import exchange_for_symbol
 
 
 class StockForm(forms.ModelForm):
@@ -80,6 +81,9 @@ class StockForm(forms.ModelForm):
         if Stock.objects.filter(symbol=symbol).exists():
             raise forms.ValidationError(f"銘柄 {symbol} は既に登録されています。")
 
+        # 取引日カレンダーに使う市場をシンボルから設定
+        self.instance.exchange = exchange_for_symbol(symbol)
+
         return symbol
 
     def clean_name(self):
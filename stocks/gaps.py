@@ -0,0 +1,235 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, Min, Q
+
+import numpy as np
+
+from .models import BackfillAttempt, Stock, StockPrice
+from .page_cache import invalidate_stocks
+from .trading_calendar import get_calendar, previous_session, trading_days
+
+# 補完時に1回のリクエストにまとめる欠損の間隔（この取引日数以内の欠損は連結する）
+COALESCE_SESSIONS = 5
+# 補完のリクエスト間の待機秒数（レート制限対策）
+REQUEST_INTERVAL = 1.0
+# この回数補完しても取得できなかった取引日は補完できない日とみなし、再リクエストしない
+# （データ提供元に足がない売買停止日など。管理画面で試行の記録を削除すると再度補完する）
+MAX_BACKFILL_ATTEMPTS = 3
+
+
+def scan_gaps(stocks=None, end_date=None):
+    """
+    銘柄ごとに最初の足から直近の取引日までの欠損している取引日を検出
+    集計クエリで取引日の足の件数（土日・休場日の足を除く）を取引日数と比べ、
+    一致しない銘柄だけ日付を読み込んで差分を取る
+    （休場日の余分な足があっても、取引日の足の件数が一致すれば欠損はない）
+    補完できない取引日（MAX_BACKFILL_ATTEMPTS回取得できなかった日）は補完の対象（missing_sessions・gaps）から除き、
+    unfillable_sessionsに数える（coverageは補完できない日も含めた実際の欠損から計算する）
+    """
+    stocks = list(stocks if stocks is not None else Stock.objects.all())
+    # 当日の足はまだ確定していない場合があるため前日までを対象にする
+    end_date = end_date or datetime.now().date() - timedelta(days=1)
+
+    # 土日と市場ごとの休場日の足は、取引日の足の件数に含めないように別に数える
+    until = np.datetime64(max(end_date, datetime.now().date()), "D")
+    off_session = Q(date__iso_week_day__gte=6)
+    for exchange in {stock.exchange for stock in stocks}:
+        holidays = get_calendar(exchange).holidays
+        holidays = holidays[holidays <= until].astype(object).tolist()
+        if holidays:
+            off_session |= Q(stock__exchange=exchange, date__in=holidays)
+
+    summary = {
+        row["stock_id"]: row
+        for row in StockPrice.objects.filter(stock__in=stocks)
+        .values("stock_id")
+        .annotate(
+            first_date=Min("date"),
+            last_date=Max("date"),
+            bars=Count("id"),
+            extra_bars=Count("id", filter=off_session),
+        )
+    }
+
+    reports = {}
+    incomplete = {}
+    for stock in stocks:
+        row = summary.get(stock.id)
+        if row is None:
+            continue
+        end = max(previous_session(stock.exchange, end_date), row["last_date"])
+        expected = trading_days(stock.exchange, row["first_date"], end)
+        reports[stock.id] = {
+            "symbol": stock.symbol,
+            "exchange": stock.exchange,
+            "first_date": row["first_date"],
+            "last_date": row["last_date"],
+            "end_date": end,
+            "expected_sessions": len(expected),
+            "bars": row["bars"],
+            "missing_sessions": 0,
+            "unfillable_sessions": 0,
+            "extra_bars": row["extra_bars"],
+            "coverage": 100.0,
+            "gaps": [],
+        }
+        if row["bars"] - row["extra_bars"] != len(expected):
+            incomplete[stock.id] = expected
+
+    # 欠損がありそうな銘柄の日付だけをまとめて読み込む
+    dates = {stock_id: [] for stock_id in incomplete}
+    for stock_id, day in (
+        StockPrice.objects.filter(stock_id__in=incomplete)
+        .order_by("stock_id", "date")
+        .values_list("stock_id", "date")
+    ):
+        dates[stock_id].append(day)
+
+    unfillable = {stock_id: [] for stock_id in incomplete}
+    for stock_id, day in BackfillAttempt.objects.filter(
+        stock_id__in=incomplete, attempts__gte=MAX_BACKFILL_ATTEMPTS
+    ).values_list("stock_id", "date"):
+        unfillable[stock_id].append(day)
+
+    for stock_id, expected in incomplete.items():
+        have = np.array(dates[stock_id], dtype="datetime64[D]")
+        missing = np.setdiff1d(expected, have, assume_unique=True)
+        report = reports[stock_id]
+        report["coverage"] = round((1 - len(missing) / len(expected)) * 100, 2)
+        skipped = np.intersect1d(
+            missing, np.array(unfillable[stock_id], dtype="datetime64[D]")
+        )
+        missing = np.setdiff1d(missing, skipped, assume_unique=True)
+        report["missing_sessions"] = len(missing)
+        report["unfillable_sessions"] = len(skipped)
+        report["gaps"] = group_sessions(expected, missing)
+
+    return [reports[stock.id] for stock in stocks if stock.id in reports]
+
+
+def group_sessions(expected, missing, tolerance=0):
+    """
+    欠損している取引日を連続する期間にまとめる
+    tolerance: 間に挟まる既存の取引日がこの数以内なら同じ期間として連結する
+    """
+    if len(missing) == 0:
+        return []
+
+    positions = np.searchsorted(expected, missing)
+    breaks = np.flatnonzero(np.diff(positions) > tolerance + 1) + 1
+    groups = []
+    for chunk in np.split(np.arange(len(missing)), breaks):
+        start, end = missing[chunk[0]], missing[chunk[-1]]
+        groups.append(
+            {
+                "start": start.astype(object),
+                "end": end.astype(object),
+                "missing_sessions": len(chunk),
+            }
+        )
+    return groups
+
+
+def backfill_gaps(stock_obj, report=None, dry_run=False):
+    """
+    欠損している期間だけを取得して補完（近い欠損は1回のリクエストにまとめる）
+    既存の足は変更せず、欠損していた取引日の足だけを追加する
+    取得できなかった取引日は試行回数を記録し、MAX_BACKFILL_ATTEMPTS回で補完の対象から外す
+    """
+    from .providers import fetch_stock_data_range
+    from .utils import process_new_prices
+
+    report = report or next(iter(scan_gaps([stock_obj])), None)
+    result = {"symbol": stock_obj.symbol, "requests": [], "inserted": 0}
+    if report is None or not report["missing_sessions"]:
+        return result
+
+    expected = trading_days(
+        stock_obj.exchange, report["first_date"], report["end_date"]
+    )
+    missing = np.concatenate(
+        [
+            trading_days(stock_obj.exchange, gap["start"], gap["end"])
+            for gap in report["gaps"]
+        ]
+    )
+    ranges = group_sessions(expected, missing, tolerance=COALESCE_SESSIONS)
+    result["requests"] = ranges
+    if dry_run:
+        return result
+
+    missing_dates = set(missing.astype(object))
+    first_new_date = None
+    for i, window in enumerate(ranges):
+        if i:
+            time.sleep(REQUEST_INTERVAL)
+        records = fetch_stock_data_range(
+            stock_obj.symbol, window["start"], window["end"]
+        )
+        # 取得中に他の処理が保存した足を除き、追加した件数は保存前後の件数の差で数える
+        # （ignore_conflictsで無視された行を含めない）
+        window_prices = StockPrice.objects.filter(
+            stock=stock_obj, date__gte=window["start"], date__lte=window["end"]
+        )
+        existing = set(window_prices.values_list("date", flat=True))
+        prices = [
+            StockPrice(
+                stock=stock_obj,
+                date=record["date"],
+                open_price=Decimal(str(record["open"])),
+                high_price=Decimal(str(record["high"])),
+                low_price=Decimal(str(record["low"])),
+                close_price=Decimal(str(record["close"])),
+                volume=record["volume"],
+            )
+            for record in records or []
+            if record["date"] in missing_dates and record["date"] not in existing
+        ]
+        if not prices:
+            continue
+        StockPrice.objects.bulk_create(prices, ignore_conflicts=True)
+        result["inserted"] += window_prices.count() - len(existing)
+        start = min(price.date for price in prices)
+        first_new_date = min(first_new_date or start, start)
+
+    filled = set(
+        StockPrice.objects.filter(stock=stock_obj, date__in=missing_dates).values_list(
+            "date", flat=True
+        )
+    )
+    _record_attempts(stock_obj, missing_dates - filled, filled)
+
+    print(
+        f"🩹 Backfilled {result['inserted']} bars for {stock_obj.symbol} "
+        f"in {len(ranges)} requests"
+    )
+    if first_new_date is not None:
+        # bulk_createはシグナルを送らないため、一覧・詳細画面のキャッシュを明示的に無効化
+        invalidate_stocks([stock_obj.id])
+        process_new_prices(stock_obj, first_new_date)
+    return result
+
+
+def _record_attempts(stock_obj, unfilled_dates, filled_dates):
+    """
+    取得できなかった取引日の試行回数を加算し、補完できた取引日の記録は削除
+    """
+    attempts = BackfillAttempt.objects.filter(stock=stock_obj)
+    if filled_dates:
+        attempts.filter(date__in=filled_dates).delete()
+    if not unfilled_dates:
+        return
+
+    attempts.filter(date__in=unfilled_dates).update(attempts=F("attempts") + 1)
+    recorded = set(
+        attempts.filter(date__in=unfilled_dates).values_list("date", flat=True)
+    )
+    BackfillAttempt.objects.bulk_create(
+        [
+            BackfillAttempt(stock=stock_obj, date=day, attempts=1)
+            for day in sorted(unfilled_dates - recorded)
+        ],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,148 @@
+import functools
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger("stocks.instrumentation")
+
+# 実行中のステージ（ネストしたステージは親の名前を前に付けて記録する）
+_current_stage = ContextVar("stocks_current_stage", default=None)
+
+
+class Stage:
+    """
+    計測中のステージ（処理時間・カウンター・付加情報）
+    """
+
+    __slots__ = ("name", "fields", "counters")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.counters = defaultdict(int)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def annotate(self, **fields):
+        self.fields.update(fields)
+
+
+class _NullStage:
+    """
+    計測が無効な場合のステージ（何もしない）
+    """
+
+    def count(self, name, value=1):
+        pass
+
+    def annotate(self, **fields):
+        pass
+
+
+_NULL_CONTEXT = nullcontext(_NullStage())
+
+
+def stage(name, **fields):
+    """
+    処理時間を計測するコンテキストマネージャー（終了時に構造化ログを1件出力）
+    INSTRUMENTATION_ENABLEDが無効の場合は何もしない
+    """
+    if not settings.INSTRUMENTATION_ENABLED:
+        return _NULL_CONTEXT
+    return _timed_stage(name, fields)
+
+
+@contextmanager
+def _timed_stage(name, fields):
+    parent = _current_stage.get()
+    current = Stage(f"{parent.name}.{name}" if parent else name, fields)
+    token = _current_stage.set(current)
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        _current_stage.reset(token)
+        logger.info(
+            "%s %.1fms",
+            current.name,
+            duration_ms,
+            extra={
+                "stage": current.name,
+                "duration_ms": round(duration_ms, 3),
+                "status": status,
+                "fields": current.fields,
+                "counters": dict(current.counters),
+            },
+        )
+
+
+def timed(name):
+    """
+    関数全体をステージとして計測するデコレーター
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.INSTRUMENTATION_ENABLED:
+                return func(*args, **kwargs)
+            with _timed_stage(name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1):
+    """
+    実行中のステージのカウンターを加算
+    """
+    current = _current_stage.get()
+    if current is not None:
+        current.count(name, value)
+
+
+def annotate(**fields):
+    """
+    実行中のステージに付加情報（銘柄・件数など）を追加
+    """
+    current = _current_stage.get()
+    if current is not None:
+        current.annotate(**fields)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    ステージの計測結果を1行のJSONとして出力するフォーマッター
+    """
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if hasattr(record, "stage"):
+            data.update(
+                {
+                    "stage": record.stage,
+                    "duration_ms": record.duration_ms,
+                    "status": record.status,
+                    **record.fields,
+                    "counters": record.counters,
+                }
+            )
+        return json.dumps(data, ensure_ascii=False, default=str)
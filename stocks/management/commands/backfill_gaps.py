@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.gaps import backfill_gaps, scan_gaps
+from stocks.market_factors import refresh_market_factors
+from stocks.models import Stock
+
+
+class Command(BaseCommand):
+    help = "株価データの欠損している取引日を検出し、欠損期間だけを取得して補完します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "symbols",
+            nargs="*",
+            help="対象のティッカーシンボル（省略時は全銘柄）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="欠損の検出とリクエストする期間の表示のみ行う",
+        )
+
+    def handle(self, *args, **options):
+        stocks = Stock.objects.all().order_by("symbol")
+        if options["symbols"]:
+            stocks = stocks.filter(symbol__in=options["symbols"])
+            missing = set(options["symbols"]) - set(
+                stocks.values_list("symbol", flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    f"銘柄が見つかりません: {', '.join(sorted(missing))}"
+                )
+
+        stocks = {stock.symbol: stock for stock in stocks}
+        inserted = 0
+        for report in scan_gaps(list(stocks.values())):
+            self.stdout.write(
+                f"{report['symbol']}: 欠損{report['missing_sessions']}日 / "
+                f"{report['expected_sessions']}取引日（{report['coverage']}%）"
+                + (
+                    f" 補完できない日{report['unfillable_sessions']}日"
+                    if report["unfillable_sessions"]
+                    else ""
+                )
+            )
+            if not report["missing_sessions"]:
+                continue
+
+            result = backfill_gaps(
+                stocks[report["symbol"]], report, dry_run=options["dry_run"]
+            )
+            for window in result["requests"]:
+                self.stdout.write(f"  {window['start']} 〜 {window['end']}")
+            inserted += result["inserted"]
+
+        # 補完した足の分の市場ファクターを計算しておく（予想は計算済みの値を読むだけ）
+        if inserted and settings.ML_USE_MARKET_FACTORS:
+            refresh_market_factors()
+        self.stdout.write(self.style.SUCCESS(f"{inserted}件の株価データを補完しました"))
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.backtest import BACKTEST_METHODS, walk_forward_backtest
+from stocks.model_selection import SELECTION_PROFILES
+from stocks.models import Stock
+
+
+class Command(BaseCommand):
+    help = "予想手法をウォークフォワード方式でバックテストします"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "symbols",
+            nargs="*",
+            help="対象のティッカーシンボル（省略時は全銘柄）",
+        )
+        parser.add_argument(
+            "--methods",
+            nargs="+",
+            choices=BACKTEST_METHODS,
+            default=BACKTEST_METHODS,
+            help="検証する予想手法",
+        )
+        parser.add_argument(
+            "--horizon", type=int, default=7, help="何本先の終値を予想するか"
+        )
+        parser.add_argument(
+            "--retrain-every", type=int, default=20, help="再学習の間隔（足の本数）"
+        )
+        parser.add_argument(
+            "--lookback", type=int, default=None, help="学習に使う直近の足の本数"
+        )
+        parser.add_argument("--workers", type=int, default=None, help="並列プロセス数")
+        parser.add_argument(
+            "--profile",
+            choices=SELECTION_PROFILES,
+            default="fast",
+            help="機械学習のモデル選択プロファイル",
+        )
+        parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+
+    def handle(self, *args, **options):
+        stocks = Stock.objects.all().order_by("symbol")
+        if options["symbols"]:
+            stocks = stocks.filter(symbol__in=options["symbols"])
+        if not stocks.exists():
+            raise CommandError("対象の銘柄がありません")
+
+        result = walk_forward_backtest(
+            list(stocks),
+            methods=options["methods"],
+            horizon=options["horizon"],
+            retrain_every=options["retrain_every"],
+            lookback=options["lookback"],
+            workers=options["workers"],
+            profile=options["profile"],
+        )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write("手法別の結果:")
+        for method, score in result["per_method"].items():
+            self.stdout.write(f"  {method:<15} {self._format(score)}")
+
+        self.stdout.write("銘柄別の結果:")
+        for row in result["per_stock"]:
+            self.stdout.write(
+                f"  {row['symbol']:<10} {row['method']:<15} {self._format(row)}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['stocks']}銘柄 / {result['predictions']}件の予想 / "
+                f"再学習{result['retrains']}回 / {result['elapsed']:.1f}秒 "
+                f"({result['throughput']:.0f}件/秒)"
+            )
+        )
+
+    def _format(self, score):
+        if not score["predictions"]:
+            return "予想なし"
+        return (
+            f"件数={score['predictions']} MAE={score['mae']:.2f} "
+            f"MAPE={score['mape']:.2f}% 方向的中率={score['hit_rate']:.1f}%"
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from stocks.market_factors import refresh_market_factors
+
+
+class Command(BaseCommand):
+    help = "全銘柄の終値から市場全体・業種別のファクターを計算します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true", help="全期間を再計算（業種の変更時など）"
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_market_factors(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"市場ファクターを{count}件計算しました"))
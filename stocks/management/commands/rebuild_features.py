@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.feature_store import rebuild_stock_features
+from stocks.models import Stock
+
+
+class Command(BaseCommand):
+    help = "特徴量ストアを全履歴から再構築します（特徴量の定義を変更した場合に使用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "symbols",
+            nargs="*",
+            help="対象のティッカーシンボル（省略時は全銘柄）",
+        )
+
+    def handle(self, *args, **options):
+        stocks = Stock.objects.all().order_by("symbol")
+        if options["symbols"]:
+            stocks = stocks.filter(symbol__in=options["symbols"])
+            missing = set(options["symbols"]) - set(
+                stocks.values_list("symbol", flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    f"銘柄が見つかりません: {', '.join(sorted(missing))}"
+                )
+
+        total = 0
+        for stock in stocks:
+            count = rebuild_stock_features(stock)
+            total += count
+            self.stdout.write(f"{stock.symbol}: {count}件")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"特徴量を再構築しました（合計{total}件）")
+        )
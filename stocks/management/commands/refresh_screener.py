@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from stocks.screener import rebuild_latest_indicators
+
+
+class Command(BaseCommand):
+    help = "スクリーナー用の最新指標を特徴量ストアから作り直します"
+
+    def handle(self, *args, **options):
+        count = rebuild_latest_indicators()
+        self.stdout.write(self.style.SUCCESS(f"最新指標を{count}銘柄分更新しました"))
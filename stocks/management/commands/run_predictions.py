@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.market_factors import refresh_market_factors
+from stocks.model_selection import SELECTION_PROFILES
+from stocks.models import Stock
+from stocks.single_flight import predict_stock
+
+
+class Command(BaseCommand):
+    help = "登録済み銘柄の株価予想を一括で実行します（夜間バッチ向け）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "symbols",
+            nargs="*",
+            help="対象のティッカーシンボル（省略時は全銘柄）",
+        )
+        parser.add_argument(
+            "--days-ahead", type=int, default=7, help="何日後の株価を予想するか"
+        )
+        parser.add_argument(
+            "--profile",
+            choices=SELECTION_PROFILES,
+            default="thorough",
+            help="機械学習のモデル選択プロファイル",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["batch", "online"],
+            default=None,
+            help="予想モード（省略時はML_PREDICTION_MODE）",
+        )
+
+    def handle(self, *args, **options):
+        stocks = Stock.objects.all().order_by("symbol")
+        if options["symbols"]:
+            stocks = stocks.filter(symbol__in=options["symbols"])
+        if not stocks.exists():
+            raise CommandError("対象の銘柄がありません")
+
+        # 予想は計算済みの市場ファクターを読むだけのため、先に未計算の日付を計算しておく
+        if settings.ML_USE_MARKET_FACTORS:
+            refresh_market_factors()
+
+        succeeded = 0
+        for stock in stocks:
+            result = predict_stock(
+                stock,
+                days_ahead=options["days_ahead"],
+                profile=options["profile"],
+                mode=options["mode"],
+            )
+            if result:
+                succeeded += 1
+                self.stdout.write(
+                    f"{stock.symbol}: ¥{result['predicted_price']:.2f} "
+                    f"（信頼度 {result['confidence']:.1f}%）"
+                )
+            else:
+                self.stdout.write(
+                    self.style.WARNING(f"{stock.symbol}: 予想に失敗しました")
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{succeeded}/{stocks.count()}銘柄の予想を実行しました")
+        )
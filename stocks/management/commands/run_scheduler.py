@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stocks.scheduler import RefreshScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "株価の自動更新スケジューラを起動します"
+        "（遅れ・閲覧数・取引時間から優先度を付け、リクエスト上限の範囲で更新）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.SCHEDULER_INTERVAL,
+            help="キューを見直す間隔（秒）",
+        )
+        parser.add_argument(
+            "--per-minute",
+            type=int,
+            default=None,
+            help="1分あたりのリクエスト上限（省略時はSCHEDULER_REQUESTS_PER_MINUTE）",
+        )
+        parser.add_argument(
+            "--per-day",
+            type=int,
+            default=None,
+            help="1日あたりのリクエスト上限（省略時はSCHEDULER_DAILY_BUDGET）",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="1回だけ実行して終了する"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="更新せずにキューの状態と更新する銘柄の表示のみ行う",
+        )
+
+    def handle(self, *args, **options):
+        scheduler = RefreshScheduler(
+            per_minute=options["per_minute"], per_day=options["per_day"]
+        )
+        self.stdout.write(
+            f"🗓️ Refresh scheduler started (every {options['interval']}s, "
+            f"{scheduler.budget.per_minute}/min, {scheduler.budget.per_day}/day)"
+        )
+
+        try:
+            while True:
+                status = scheduler.tick(dry_run=options["dry_run"])
+                self.stdout.write(
+                    f"queue={status['queue_depth']} "
+                    f"max_lag={status['max_lag_sessions']}日"
+                    f"（{status['max_lag_hours']}時間） "
+                    f"refreshed={len(status['refreshed'])} "
+                    f"backoff={status['backing_off']} "
+                    f"budget={status['budget_remaining_today']}"
+                )
+                if status["refreshed"]:
+                    self.stdout.write(f"  {', '.join(status['refreshed'])}")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("スケジューラを停止しました"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from stocks.accuracy import rebuild_prediction_accuracy, score_matured_predictions
+
+
+class Command(BaseCommand):
+    help = "予測日を迎えた予想を実績価格と突き合わせて採点し、手法別の精度を集計します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild-accuracy",
+            action="store_true",
+            help="採点済みの全予想から手法別の精度を集計し直す",
+        )
+
+    def handle(self, *args, **options):
+        count = score_matured_predictions()
+        self.stdout.write(self.style.SUCCESS(f"{count}件の予想を採点しました"))
+        if options["rebuild_accuracy"]:
+            count = rebuild_prediction_accuracy()
+            self.stdout.write(self.style.SUCCESS(f"{count}件の精度を集計し直しました"))
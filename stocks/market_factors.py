@@ -0,0 +1,248 @@
+import threading
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+import numpy as np
+import pandas as pd
+
+from .metrics import record_cache
+from .models import MarketFactor, Stock, StockPrice
+
+# 銘柄の特徴量行列に追加する市場ファクター列
+MARKET_FEATURE_COLUMNS = [
+    "market_return",
+    "market_breadth",
+    "market_volatility",
+    "sector_relative_strength",
+]
+
+# 再計算時に遡る日数（5日リターン＋20日ボラティリティ）
+FACTOR_WARMUP_DATES = 25
+CACHE_TIMEOUT = 60 * 60
+
+# アドバイザリロックのないDB（sqliteなど）向けのプロセス内ロック
+_local_lock = threading.Lock()
+
+
+@contextmanager
+def _refresh_lock():
+    """
+    市場ファクターの再計算を1つずつ実行する（同時に削除・保存して重複しないように）
+    PostgreSQLはトランザクション単位のアドバイザリロック、それ以外はプロセス内のロック
+    """
+    if connection.vendor == "postgresql":
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s)",
+                    [zlib.crc32(b"market_factors") & 0x7FFFFFFF],
+                )
+            yield
+    else:
+        with _local_lock:
+            yield
+
+
+def refresh_market_factors(full=False):
+    """
+    前回の計算以降に追加された足の最も古い日付から市場ファクターを再計算
+    銘柄ごとではなく、全銘柄の終値から日付ごとに1回だけ計算する
+    株価の取り込み（スケジューラ・欠損の補完）と予想のバッチから呼び出し、予想は計算済みの値を読むだけにする
+    同時に呼ばれた場合は順に実行し、後の呼び出しは先の計算以降に追加された足のみを対象にする
+    """
+    with _refresh_lock():
+        return _refresh_market_factors(full)
+
+
+def _refresh_market_factors(full):
+    last_run = None
+    if not full:
+        last_run = MarketFactor.objects.aggregate(Max("computed_at"))[
+            "computed_at__max"
+        ]
+
+    start_date = None
+    if last_run is not None:
+        start_date = StockPrice.objects.filter(created_at__gt=last_run).aggregate(
+            Min("date")
+        )["date__min"]
+        if start_date is None:
+            return 0
+
+    return _store_market_factors(start_date)
+
+
+def _store_market_factors(start_date):
+    """
+    start_date以降の市場全体・業種別ファクターを市場（取引所）ごとに計算して置き換える（Noneの場合は全期間）
+    """
+    # 計算開始時刻を記録し、計算中に追加された足は次回の対象にする
+    started = timezone.now()
+    exchanges = Stock.objects.order_by().values_list("exchange", flat=True).distinct()
+
+    factors = []
+    for exchange in sorted(exchanges):
+        factors.extend(_exchange_factors(exchange, start_date, started))
+    if not factors:
+        return 0
+
+    with transaction.atomic():
+        existing = MarketFactor.objects.all()
+        if start_date is not None:
+            existing = existing.filter(date__gte=start_date)
+        existing.delete()
+        MarketFactor.objects.bulk_create(factors, batch_size=1000)
+
+    print(f"🌐 Stored {len(factors)} market factor rows")
+    return len(factors)
+
+
+def _exchange_factors(exchange, start_date, started):
+    """
+    1つの市場の銘柄だけでファクターを計算
+    休場日の異なる市場の銘柄を同じ行列に入れると、他の市場の休場日の翌日のリターンが欠ける
+    """
+    prices = StockPrice.objects.filter(stock__exchange=exchange)
+
+    if start_date is not None:
+        warmup = list(
+            MarketFactor.objects.filter(
+                exchange=exchange, sector="", date__lt=start_date
+            )
+            .order_by("-date")
+            .values_list("date", flat=True)[
+                FACTOR_WARMUP_DATES - 1 : FACTOR_WARMUP_DATES
+            ]
+        )
+        if warmup:
+            prices = prices.filter(date__gte=warmup[0])
+
+    rows = list(prices.values_list("stock_id", "date", "close_price"))
+    if not rows:
+        return []
+
+    # 日付×銘柄の終値行列にして、市場内の全銘柄のリターンをまとめて計算
+    closes = (
+        pd.DataFrame.from_records(rows, columns=["stock_id", "date", "close"])
+        .pivot(index="date", columns="stock_id", values="close")
+        .astype(float)
+        .sort_index()
+    )
+    returns = closes.pct_change(fill_method=None)
+    returns_5d = closes.pct_change(5, fill_method=None)
+
+    sectors = dict(Stock.objects.filter(exchange=exchange).values_list("id", "sector"))
+    groups = {"": list(closes.columns)}
+    for stock_id in closes.columns:
+        if sectors.get(stock_id):
+            groups.setdefault(sectors[stock_id], []).append(stock_id)
+
+    factors = []
+    for sector, columns in groups.items():
+        group_returns = returns[columns]
+        counts = group_returns.notna().sum(axis=1)
+        market_return = group_returns.mean(axis=1)
+        frame = pd.DataFrame(
+            {
+                "market_return": market_return,
+                "return_5d": returns_5d[columns].mean(axis=1),
+                "breadth": (group_returns > 0).sum(axis=1) / counts.replace(0, np.nan),
+                "volatility": market_return.rolling(20).std(),
+                "member_count": counts,
+            }
+        )
+        frame = frame[counts > 0]
+        if start_date is not None:
+            frame = frame[frame.index >= start_date]
+        frame = frame.astype(object).where(frame.notna(), None)
+
+        factors.extend(
+            MarketFactor(
+                date=date,
+                exchange=exchange,
+                sector=sector,
+                computed_at=started,
+                **values,
+            )
+            for date, values in frame.to_dict("index").items()
+        )
+    return factors
+
+
+def load_market_factors():
+    """
+    市場ファクターを(市場, 業種)ごとの日付インデックス付きDataFrameとして取得
+    最終計算時刻をキーにキャッシュし、再計算されるまでは全銘柄で共有する
+    """
+    version = MarketFactor.objects.aggregate(Max("computed_at"))["computed_at__max"]
+    if version is None:
+        return {}
+
+    key = f"market_factors:{version.timestamp()}"
+    factors = cache.get(key)
+    record_cache("market_factors", factors is not None)
+    if factors is None:
+        df = pd.DataFrame.from_records(
+            list(
+                MarketFactor.objects.values_list(
+                    "exchange",
+                    "sector",
+                    "date",
+                    "market_return",
+                    "return_5d",
+                    "breadth",
+                    "volatility",
+                )
+            ),
+            columns=[
+                "exchange",
+                "sector",
+                "date",
+                "market_return",
+                "return_5d",
+                "breadth",
+                "volatility",
+            ],
+        )
+        df["date"] = pd.to_datetime(df["date"])
+        df[df.columns[3:]] = df[df.columns[3:]].astype(float)
+        factors = {
+            key: group.drop(columns=["exchange", "sector"])
+            .set_index("date")
+            .sort_index()
+            for key, group in df.groupby(["exchange", "sector"])
+        }
+        cache.set(key, factors, CACHE_TIMEOUT)
+    return factors
+
+
+def join_market_factors(stock_obj, df):
+    """
+    銘柄の特徴量に日付で銘柄の市場のファクターを結合（銘柄ごとの再計算はしない）
+    """
+    factors = load_market_factors()
+    df = df.copy()
+    market = factors.get((stock_obj.exchange, ""))
+    if market is None:
+        for column in MARKET_FEATURE_COLUMNS:
+            df[column] = 0.0
+        return df
+
+    sector = factors.get((stock_obj.exchange, stock_obj.sector), market)
+    market = market.reindex(df["date"])
+    sector = sector.reindex(df["date"])
+
+    df["market_return"] = market["market_return"].to_numpy()
+    df["market_breadth"] = market["breadth"].to_numpy()
+    df["market_volatility"] = market["volatility"].to_numpy()
+    df["sector_relative_strength"] = (
+        df["price_change_5d"].to_numpy() - sector["return_5d"].to_numpy()
+    )
+    # 計算前の日付などで欠けている値は直前の値、なければ0で補う
+    df[MARKET_FEATURE_COLUMNS] = df[MARKET_FEATURE_COLUMNS].ffill().fillna(0.0)
+    return df
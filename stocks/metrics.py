@@ -0,0 +1,254 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# メトリクスの定義（名前 -> 種類・説明・ヒストグラムのバケット）
+METRICS = {
+    "stock_forecast_requests_total": ("counter", "HTTPリクエスト数", None),
+    "stock_forecast_request_duration_seconds": (
+        "histogram",
+        "ビューごとのレスポンス時間（秒）",
+        [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+    ),
+    "stock_forecast_request_db_queries": (
+        "histogram",
+        "1リクエストあたりのSQLクエリ数",
+        [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+    ),
+    "stock_forecast_provider_requests_total": (
+        "counter",
+        "データ提供元へのリクエスト数（status: ok・empty・error・rate_limited）",
+        None,
+    ),
+    "stock_forecast_provider_request_duration_seconds": (
+        "histogram",
+        "データ提供元へのリクエストの所要時間（秒）",
+        [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+    ),
+    "stock_forecast_cache_requests_total": (
+        "counter",
+        "キャッシュの参照数（result: hit・miss）",
+        None,
+    ),
+    "stock_forecast_model_fit_seconds": (
+        "histogram",
+        "選択したモデルの学習時間（秒）",
+        [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120],
+    ),
+    "stock_forecast_model_selection_seconds": (
+        "histogram",
+        "交差検証によるモデル選択の所要時間（秒）",
+        [0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300],
+    ),
+}
+
+# メトリクスを書き出す間隔（秒）。リクエストの処理後は毎回書き出す
+FLUSH_INTERVAL = 1.0
+
+# このプロセスで記録した値（{(名前, ラベル): 値}・{(名前, ラベル): [バケットごとの件数, 合計, 件数]}）
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_state = {"dirty": False, "flushed_at": 0.0}
+
+
+def _key(name, labels):
+    return name, tuple(
+        sorted((key, str(value)) for key, value in (labels or {}).items())
+    )
+
+
+def inc(name, labels=None, value=1):
+    """
+    カウンターを加算
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        _state["dirty"] = True
+    _maybe_flush()
+
+
+def observe(name, value, labels=None):
+    """
+    ヒストグラムに値を記録
+    """
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        counts, total, n = _histograms.get(key, ([0] * (len(buckets) + 1), 0.0, 0))
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        _histograms[key] = (counts, total + value, n + 1)
+        _state["dirty"] = True
+    _maybe_flush()
+
+
+def record_cache(cache_name, hit):
+    """
+    キャッシュのヒット・ミスを記録
+    """
+    inc(
+        "stock_forecast_cache_requests_total",
+        {"cache": cache_name, "result": "hit" if hit else "miss"},
+    )
+
+
+class ProviderCall:
+    """
+    データ提供元への1回のリクエスト（statusを書き換えて結果を分類できる）
+    """
+
+    def __init__(self):
+        self.status = "ok"
+
+
+@contextmanager
+def provider_call(provider):
+    """
+    データ提供元へのリクエストの所要時間と結果（成功・エラー・レート制限）を記録
+    """
+    call = ProviderCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        # HTTPエラーの429、またはyfinanceのレート制限の例外（YFRateLimitError）
+        response = getattr(e, "response", None)
+        if getattr(response, "status_code", None) == 429:
+            call.status = "rate_limited"
+        elif "RateLimit" in type(e).__name__:
+            call.status = "rate_limited"
+        else:
+            call.status = "error"
+        raise
+    finally:
+        observe(
+            "stock_forecast_provider_request_duration_seconds",
+            time.perf_counter() - started,
+            {"provider": provider},
+        )
+        inc(
+            "stock_forecast_provider_requests_total",
+            {"provider": provider, "status": call.status},
+        )
+
+
+def _metrics_dir():
+    return Path(settings.METRICS_DIR)
+
+
+def flush(force=False):
+    """
+    このプロセスの値をMETRICS_DIRのプロセスごとのファイルに書き出す
+    （/metricsは全プロセスのファイルを合算して返す）
+    """
+    with _lock:
+        if not _state["dirty"] and not force:
+            return
+        snapshot = {
+            "counters": [
+                [name, list(labels), value]
+                for (name, labels), value in _counters.items()
+            ],
+            "histograms": [
+                [name, list(labels), counts, total, n]
+                for (name, labels), (counts, total, n) in _histograms.items()
+            ],
+        }
+        _state.update(dirty=False, flushed_at=time.monotonic())
+
+    directory = _metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"metrics-{os.getpid()}.json"
+    tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(snapshot))
+    os.replace(tmp, path)
+
+
+def _maybe_flush(force=False):
+    if force or time.monotonic() - _state["flushed_at"] >= FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError as e:
+            print(f"⚠️ Failed to write metrics: {e}")
+
+
+atexit.register(_maybe_flush, force=True)
+
+
+def collect():
+    """
+    全プロセスのファイルを読み込んで合算
+    """
+    counters, histograms = {}, {}
+    for path in sorted(_metrics_dir().glob("metrics-*.json")):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, n in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += n
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        f'{key}="'
+        + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_metrics():
+    """
+    Prometheusのテキスト形式で全プロセスの合計を出力
+    """
+    flush(force=True)
+    counters, histograms = collect()
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+
+        for (metric, labels), (counts, total, n) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, [('le', bound)])} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {n}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,171 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from . import metrics
+from .db_router import PRIMARY_PIN_COOKIE, pinning_scope, replica_aliases
+from .profiling import aprofile_request, profile_request, save_profile, should_profile
+from .query_tracking import observe_queries
+
+
+class MetricsMiddleware:
+    """
+    ビューごとのレスポンス時間・SQLクエリ数を記録するミドルウェア
+    WSGI・ASGIの両方に対応（ASGIでは非同期ビューをスレッドに切り替えずに実行する）
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self._measure(request) as measured:
+            measured["response"] = self.get_response(request)
+        return measured["response"]
+
+    async def __acall__(self, request):
+        with self._measure(request) as measured:
+            measured["response"] = await self.get_response(request)
+        return measured["response"]
+
+    @contextmanager
+    def _measure(self, request):
+        measured = {"queries": 0}
+
+        def count_query(sql, params, elapsed_ms):
+            measured["queries"] += 1
+
+        started = time.perf_counter()
+        with observe_queries(count_query):
+            yield measured
+        duration = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "unmatched"
+        metrics.inc(
+            "stock_forecast_requests_total",
+            {
+                "view": view,
+                "method": request.method,
+                "status": measured["response"].status_code,
+            },
+        )
+        metrics.observe(
+            "stock_forecast_request_duration_seconds", duration, {"view": view}
+        )
+        metrics.observe(
+            "stock_forecast_request_db_queries", measured["queries"], {"view": view}
+        )
+        metrics.flush()
+
+
+class ProfilingMiddleware:
+    """
+    スタッフユーザーの指定またはサンプリングで選ばれたリクエストのプロファイルを保存
+    保存したプロファイルは管理画面（リクエストのプロファイル）で確認できる
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        enabled, sampled = should_profile(request)
+        if not enabled:
+            return self.get_response(request)
+
+        response, profiler, queries, duration_ms = profile_request(
+            self.get_response, request
+        )
+        return self._save(request, response, profiler, queries, duration_ms, sampled)
+
+    async def __acall__(self, request):
+        # スタッフ判定はDBを参照するため、プロファイルの対象になりうる場合だけスレッドで判定
+        if (
+            settings.PROFILING_QUERY_PARAM not in request.GET
+            and settings.PROFILING_SAMPLE_RATE <= 0
+        ):
+            return await self.get_response(request)
+        enabled, sampled = await sync_to_async(should_profile)(request)
+        if not enabled:
+            return await self.get_response(request)
+
+        response, profiler, queries, duration_ms = await aprofile_request(
+            self.get_response, request
+        )
+        return await sync_to_async(self._save)(
+            request, response, profiler, queries, duration_ms, sampled
+        )
+
+    def _save(self, request, response, profiler, queries, duration_ms, sampled):
+        try:
+            profile = save_profile(
+                request, response, profiler, queries, duration_ms, sampled
+            )
+            response["X-Request-Profile"] = str(profile.id)
+        except Exception as e:
+            # プロファイルの保存に失敗してもレスポンスは返す
+            print(f"⚠️ Failed to save request profile: {e}")
+        return response
+
+
+class PrimaryPinningMiddleware:
+    """
+    書き込んだリクエストの直後のリクエスト（POST後のリダイレクト先など）の読み取りを
+    Cookieでプライマリに固定し、レプリカの遅延で更新前のデータが表示されないようにする
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_aliases():
+            return self.get_response(request)
+        with self._pinning(request) as pinning:
+            pinning["response"] = self.get_response(request)
+        return pinning["response"]
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        with self._pinning(request) as pinning:
+            pinning["response"] = await self.get_response(request)
+        return pinning["response"]
+
+    @contextmanager
+    def _pinning(self, request):
+        # リクエストごとに固定の状態を初期化（WSGIではスレッドのコンテキストが次のリクエストに残るため）
+        pinned = PRIMARY_PIN_COOKIE in request.COOKIES
+        with pinning_scope(pinned) as wrote:
+            pinning = {}
+            yield pinning
+            if wrote():
+                pinning["response"].set_cookie(
+                    PRIMARY_PIN_COOKIE,
+                    "1",
+                    max_age=settings.DATABASE_REPLICA_LAG_SECONDS,
+                    httponly=True,
+                    samesite="Lax",
+                )
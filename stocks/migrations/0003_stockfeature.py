@@ -0,0 +1,59 @@
+# Generated by Django 5.0 on 2026-10-19 14:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0002_alter_stockprediction_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockFeature",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="日付")),
+                ("close", models.FloatField(verbose_name="終値")),
+                ("ma_5", models.FloatField(verbose_name="5日移動平均")),
+                ("ma_10", models.FloatField(verbose_name="10日移動平均")),
+                ("ma_20", models.FloatField(verbose_name="20日移動平均")),
+                ("rsi", models.FloatField(verbose_name="RSI")),
+                ("macd", models.FloatField(verbose_name="MACD")),
+                ("volatility", models.FloatField(verbose_name="ボラティリティ")),
+                ("price_change_1d", models.FloatField(verbose_name="1日変化率")),
+                ("price_change_5d", models.FloatField(verbose_name="5日変化率")),
+                ("volume_ratio", models.FloatField(verbose_name="出来高比率")),
+                ("high_low_ratio", models.FloatField(verbose_name="高値安値比率")),
+                (
+                    "bb_position",
+                    models.FloatField(verbose_name="ボリンジャーバンド位置"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="features",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "特徴量",
+                "verbose_name_plural": "特徴量",
+                "ordering": ["-date"],
+                "unique_together": {("stock", "date")},
+            },
+        ),
+    ]
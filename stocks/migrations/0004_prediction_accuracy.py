@@ -0,0 +1,125 @@
+# Generated by Django 5.0 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0003_stockfeature"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PredictionAccuracy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("method", models.CharField(max_length=50, verbose_name="予測手法")),
+                ("sample_count", models.IntegerField(default=0, verbose_name="件数")),
+                (
+                    "mae",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="平均絶対誤差"
+                    ),
+                ),
+                (
+                    "mape",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="平均絶対誤差率（%）"
+                    ),
+                ),
+                (
+                    "hit_rate",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="方向的中率（%）"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "予想精度",
+                "verbose_name_plural": "予想精度",
+                "ordering": ["stock", "method"],
+            },
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="abs_error",
+            field=models.FloatField(blank=True, null=True, verbose_name="絶対誤差"),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="abs_pct_error",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="絶対誤差率（%）"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="actual_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="実績価格",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="base_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="予想時点の価格",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="direction_hit",
+            field=models.BooleanField(blank=True, null=True, verbose_name="方向的中"),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="scored_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="採点日時"),
+        ),
+        migrations.AddIndex(
+            model_name="stockprediction",
+            index=models.Index(
+                fields=["stock", "prediction_date"],
+                name="stocks_stoc_stock_i_d8b5b6_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockprediction",
+            index=models.Index(
+                fields=["stock", "method", "scored_at"],
+                name="stocks_stoc_stock_i_d6390d_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="predictionaccuracy",
+            name="stock",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="prediction_accuracies",
+                to="stocks.stock",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="predictionaccuracy",
+            unique_together={("stock", "method")},
+        ),
+    ]
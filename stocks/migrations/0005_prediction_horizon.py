@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-19 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0004_prediction_accuracy"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="predictionaccuracy",
+            options={
+                "ordering": ["stock", "method", "horizon"],
+                "verbose_name": "予想精度",
+                "verbose_name_plural": "予想精度",
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="stockprediction",
+            name="stocks_stoc_stock_i_d6390d_idx",
+        ),
+        migrations.AlterUniqueTogether(
+            name="predictionaccuracy",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="predictionaccuracy",
+            name="horizon",
+            field=models.PositiveSmallIntegerField(
+                blank=True, null=True, verbose_name="予測期間（営業日）"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="horizon",
+            field=models.PositiveSmallIntegerField(
+                blank=True, null=True, verbose_name="予測期間（営業日）"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="predictionaccuracy",
+            unique_together={("stock", "method", "horizon")},
+        ),
+        migrations.AddIndex(
+            model_name="stockprediction",
+            index=models.Index(
+                fields=["stock", "method", "horizon", "scored_at"],
+                name="stocks_stoc_stock_i_206b7c_idx",
+            ),
+        ),
+    ]
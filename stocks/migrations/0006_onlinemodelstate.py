@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-19 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0005_prediction_horizon"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OnlineModelState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("state", models.BinaryField(verbose_name="モデルの状態")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="online_model",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "オンライン学習モデル",
+                "verbose_name_plural": "オンライン学習モデル",
+            },
+        ),
+    ]
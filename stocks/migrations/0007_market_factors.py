@@ -0,0 +1,67 @@
+# Generated by Django 5.0 on 2026-10-19 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0006_onlinemodelstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stock",
+            name="sector",
+            field=models.CharField(
+                blank=True, default="", max_length=50, verbose_name="業種"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="MarketFactor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="日付")),
+                (
+                    "sector",
+                    models.CharField(
+                        blank=True, default="", max_length=50, verbose_name="業種"
+                    ),
+                ),
+                ("market_return", models.FloatField(verbose_name="平均リターン")),
+                (
+                    "return_5d",
+                    models.FloatField(null=True, verbose_name="5日平均リターン"),
+                ),
+                ("breadth", models.FloatField(verbose_name="上昇銘柄比率")),
+                (
+                    "volatility",
+                    models.FloatField(null=True, verbose_name="ボラティリティ（20日）"),
+                ),
+                ("member_count", models.IntegerField(verbose_name="銘柄数")),
+                (
+                    "computed_at",
+                    models.DateTimeField(db_index=True, verbose_name="計算日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "市場ファクター",
+                "verbose_name_plural": "市場ファクター",
+                "ordering": ["-date", "sector"],
+                "unique_together": {("date", "sector")},
+            },
+        ),
+    ]
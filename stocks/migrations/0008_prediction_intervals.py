@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-19 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0007_market_factors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockprediction",
+            name="lower_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="予測区間下限（5%）",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="price_bands",
+            field=models.JSONField(blank=True, null=True, verbose_name="日別予測区間"),
+        ),
+        migrations.AddField(
+            model_name="stockprediction",
+            name="upper_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="予測区間上限（95%）",
+            ),
+        ),
+    ]
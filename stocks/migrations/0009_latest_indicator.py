@@ -0,0 +1,73 @@
+# Generated by Django 5.0 on 2026-10-19 14:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0008_prediction_intervals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LatestIndicator",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="日付")),
+                ("close", models.FloatField(verbose_name="終値")),
+                ("ma_5", models.FloatField(verbose_name="5日移動平均")),
+                ("ma_20", models.FloatField(verbose_name="20日移動平均")),
+                ("ma20_gap", models.FloatField(verbose_name="20日移動平均乖離率")),
+                ("rsi", models.FloatField(verbose_name="RSI")),
+                ("macd", models.FloatField(verbose_name="MACD")),
+                ("volatility", models.FloatField(verbose_name="ボラティリティ")),
+                ("price_change_1d", models.FloatField(verbose_name="1日変化率")),
+                ("price_change_5d", models.FloatField(verbose_name="5日変化率")),
+                ("volume_ratio", models.FloatField(verbose_name="出来高比率")),
+                (
+                    "bb_position",
+                    models.FloatField(verbose_name="ボリンジャーバンド位置"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="latest_indicator",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "最新指標",
+                "verbose_name_plural": "最新指標",
+                "ordering": ["stock__symbol"],
+                "indexes": [
+                    models.Index(fields=["rsi"], name="stocks_late_rsi_44803d_idx"),
+                    models.Index(
+                        fields=["ma20_gap"], name="stocks_late_ma20_ga_f6b15b_idx"
+                    ),
+                    models.Index(
+                        fields=["volume_ratio"], name="stocks_late_volume__70f410_idx"
+                    ),
+                    models.Index(
+                        fields=["price_change_5d"],
+                        name="stocks_late_price_c_9e593c_idx",
+                    ),
+                    models.Index(
+                        fields=["volatility"], name="stocks_late_volatil_9f5acd_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
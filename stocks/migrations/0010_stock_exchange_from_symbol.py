@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-19 14:51
+
+from django.db import migrations
+
+
+def set_exchange_from_symbol(apps, schema_editor):
+    """
+    数字以外のシンボルで既定値（TSE）のままの銘柄を米国市場に設定
+    """
+    Stock = apps.get_model("stocks", "Stock")
+    for stock in Stock.objects.filter(exchange="TSE"):
+        if not stock.symbol.isdigit():
+            stock.exchange = "US"
+            stock.save(update_fields=["exchange"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0009_latest_indicator"),
+    ]
+
+    operations = [
+        migrations.RunPython(set_exchange_from_symbol, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0010_stock_exchange_from_symbol"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SingleFlight",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("task", models.CharField(max_length=100, verbose_name="処理")),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="開始日時"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="完了日時"
+                    ),
+                ),
+                ("result", models.BinaryField(null=True, verbose_name="結果")),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="single_flights",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "処理の実行状況",
+                "verbose_name_plural": "処理の実行状況",
+                "unique_together": {("stock", "task")},
+            },
+        ),
+    ]
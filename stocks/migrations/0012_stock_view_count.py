@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-19 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0011_single_flight"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stock",
+            name="last_viewed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="最終閲覧日時"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="閲覧数"),
+        ),
+    ]
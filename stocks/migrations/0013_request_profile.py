@@ -0,0 +1,73 @@
+# Generated by Django 5.0 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0012_stock_view_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("method", models.CharField(max_length=10, verbose_name="メソッド")),
+                ("path", models.CharField(max_length=500, verbose_name="パス")),
+                (
+                    "view_name",
+                    models.CharField(blank=True, max_length=100, verbose_name="ビュー"),
+                ),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(verbose_name="ステータス"),
+                ),
+                (
+                    "username",
+                    models.CharField(
+                        blank=True, max_length=150, verbose_name="ユーザー"
+                    ),
+                ),
+                (
+                    "sampled",
+                    models.BooleanField(default=False, verbose_name="サンプリング"),
+                ),
+                ("duration_ms", models.FloatField(verbose_name="処理時間（ms）")),
+                ("query_count", models.PositiveIntegerField(verbose_name="クエリ数")),
+                ("query_time_ms", models.FloatField(verbose_name="クエリ時間（ms）")),
+                (
+                    "similar_query_count",
+                    models.PositiveIntegerField(
+                        verbose_name="同じ形のクエリ数（N+1の候補）"
+                    ),
+                ),
+                (
+                    "duplicate_query_count",
+                    models.PositiveIntegerField(
+                        verbose_name="重複クエリ数（同じパラメータ）"
+                    ),
+                ),
+                (
+                    "top_functions",
+                    models.JSONField(default=list, verbose_name="処理時間の長い関数"),
+                ),
+                ("queries", models.JSONField(default=list, verbose_name="SQLクエリ")),
+            ],
+            options={
+                "verbose_name": "リクエストのプロファイル",
+                "verbose_name_plural": "リクエストのプロファイル",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0013_request_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="singleflight",
+            name="generation",
+            field=models.PositiveBigIntegerField(default=0, verbose_name="完了回数"),
+        ),
+    ]
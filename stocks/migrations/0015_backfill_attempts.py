@@ -0,0 +1,53 @@
+# Generated by Django 5.0 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0014_single_flight_generation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BackfillAttempt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="日付")),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="試行回数"
+                    ),
+                ),
+                (
+                    "last_attempted_at",
+                    models.DateTimeField(auto_now=True, verbose_name="最終試行日時"),
+                ),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="backfill_attempts",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "欠損の補完の試行",
+                "verbose_name_plural": "欠損の補完の試行",
+                "ordering": ["stock", "date"],
+                "unique_together": {("stock", "date")},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-19 16:20
+
+from django.db import migrations
+
+# 集計時点のaccuracy.ACCURACY_WINDOW
+ACCURACY_WINDOW = 30
+
+
+def group_accuracy_by_family(apps, schema_editor):
+    """
+    モデル名・トレンドごとの精度（"機械学習（Ridge）"など）を手法の系統ごとに集計し直す
+    """
+    PredictionAccuracy = apps.get_model("stocks", "PredictionAccuracy")
+    StockPrediction = apps.get_model("stocks", "StockPrediction")
+
+    scored = StockPrediction.objects.filter(scored_at__isnull=False)
+    groups = {}
+    for stock_id, method, horizon, error, pct, hit in scored.order_by(
+        "-prediction_date", "-created_at"
+    ).values_list(
+        "stock_id", "method", "horizon", "abs_error", "abs_pct_error", "direction_hit"
+    ):
+        rows = groups.setdefault((stock_id, method.split("（")[0], horizon), [])
+        if len(rows) < ACCURACY_WINDOW:
+            rows.append((error, pct, hit))
+
+    PredictionAccuracy.objects.all().delete()
+    for (stock_id, method, horizon), rows in groups.items():
+        pcts = [pct for _, pct, _ in rows if pct is not None]
+        hits = [hit for _, _, hit in rows if hit is not None]
+        PredictionAccuracy.objects.create(
+            stock_id=stock_id,
+            method=method,
+            horizon=horizon,
+            sample_count=len(rows),
+            mae=sum(error for error, _, _ in rows) / len(rows),
+            mape=sum(pcts) / len(pcts) if pcts else None,
+            hit_rate=sum(hits) / len(hits) * 100 if hits else None,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0015_backfill_attempts"),
+    ]
+
+    operations = [
+        migrations.RunPython(group_accuracy_by_family, migrations.RunPython.noop),
+    ]
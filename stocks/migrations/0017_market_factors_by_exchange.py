@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+def delete_mixed_factors(apps, schema_editor):
+    """
+    全市場の銘柄をまとめて計算したファクターを削除（次回の計算で市場ごとに全期間を計算し直す）
+    """
+    apps.get_model("stocks", "MarketFactor").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0016_accuracy_by_method_family"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_mixed_factors, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name="marketfactor",
+            options={
+                "ordering": ["-date", "exchange", "sector"],
+                "verbose_name": "市場ファクター",
+                "verbose_name_plural": "市場ファクター",
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="marketfactor",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="marketfactor",
+            name="exchange",
+            field=models.CharField(default="TSE", max_length=10, verbose_name="市場"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="marketfactor",
+            unique_together={("date", "exchange", "sector")},
+        ),
+    ]
@@ -0,0 +1,230 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .metrics import observe
+
+# scikit-learnは読み込みに時間がかかるため、モデルを作るときに読み込む
+# （SELECTION_PROFILESだけを参照する管理コマンドなどの起動を軽くする）
+
+
+def _linear_regression(multi_output):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return make_pipeline(StandardScaler(), LinearRegression())
+
+
+def _ridge(multi_output, alpha=1.0):
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return make_pipeline(StandardScaler(), Ridge(alpha=alpha))
+
+
+def _random_forest(multi_output, **params):
+    from sklearn.ensemble import RandomForestRegressor
+
+    return RandomForestRegressor(random_state=42, **params)
+
+
+def _hist_gradient_boosting(multi_output):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.multioutput import MultiOutputRegressor
+
+    model = HistGradientBoostingRegressor(max_iter=200, random_state=42)
+    # HistGradientBoostingは単一出力のみ対応のため目的変数ごとに学習
+    return MultiOutputRegressor(model) if multi_output else model
+
+
+# 候補モデル（名前 -> multi_outputを受け取って未学習のモデルを返す関数）
+# 新しい候補はここに追加し、プロファイルまたはcandidates引数で指定する
+CANDIDATE_MODELS = {
+    "LinearRegression": _linear_regression,
+    "Ridge": _ridge,
+    "Ridge(alpha=10)": lambda multi_output: _ridge(multi_output, alpha=10.0),
+    "RandomForest": lambda multi_output: _random_forest(
+        multi_output, n_estimators=100, max_depth=10
+    ),
+    "RandomForest(fast)": lambda multi_output: _random_forest(
+        multi_output, n_estimators=30, max_depth=8
+    ),
+    "RandomForest(deep)": lambda multi_output: _random_forest(
+        multi_output, n_estimators=300, min_samples_leaf=3
+    ),
+    "HistGradientBoosting": _hist_gradient_boosting,
+}
+
+# fast: 画面からの予想実行向け（軽い候補・少ない分割・短い制限時間）
+# thorough: 夜間バッチ向け（全候補・多い分割・長い制限時間）
+SELECTION_PROFILES = {
+    "fast": {
+        "candidates": ["Ridge", "LinearRegression", "RandomForest(fast)"],
+        "n_splits": 3,
+        "time_budget": 3.0,
+    },
+    "thorough": {
+        "candidates": [
+            "Ridge",
+            "Ridge(alpha=10)",
+            "LinearRegression",
+            "RandomForest",
+            "RandomForest(deep)",
+            "HistGradientBoosting",
+        ],
+        "n_splits": 5,
+        "time_budget": 120.0,
+    },
+}
+
+
+# 制限時間のうち交差検証に使う割合（残りを選んだモデルの全データでの再学習に充てる）
+CV_BUDGET_SHARE = 0.7
+# 交差検証の各分割の学習データの最小行数
+MIN_TRAIN_ROWS = 10
+
+
+def select_model(
+    X,
+    y,
+    profile="fast",
+    candidates=None,
+    n_splits=None,
+    time_budget=None,
+    n_jobs=None,
+    gap=0,
+):
+    """
+    拡張ウィンドウ方式の時系列交差検証で候補モデルを並列に評価し、最良のモデルを選択
+    gap: 学習と検証の間を空ける行数（目的変数の先読み期間。学習の末尾の行の目的変数が
+         検証期間の価格を含まないようにする）
+    制限時間（秒）は再学習を含めた目安（ベストエフォート）。交差検証は制限時間の
+    CV_BUDGET_SHAREで打ち切り、実行中の学習は待たずに、それまでに終わった分割の
+    スコアで比べる（途中までの候補も全候補が終えた分割までのスコアで比べる）
+    """
+    options = SELECTION_PROFILES[profile]
+    candidates = candidates or options["candidates"]
+    n_splits = n_splits or options["n_splits"]
+    time_budget = time_budget if time_budget is not None else options["time_budget"]
+    n_jobs = n_jobs or min(len(candidates), os.cpu_count() or 1)
+
+    started = time.monotonic()
+    deadline = started + time_budget * CV_BUDGET_SHARE
+    multi_output = isinstance(y, pd.DataFrame) and y.shape[1] > 1
+    splits = time_series_splits(len(X), n_splits, gap)
+
+    # 候補ごとの分割のスコア（各スレッドが分割を終えるたびに追加する）
+    fold_scores = {name: [] for name in candidates}
+    executor = ThreadPoolExecutor(max_workers=n_jobs)
+    futures = [
+        executor.submit(
+            _cross_validate,
+            name,
+            X,
+            y,
+            splits,
+            multi_output,
+            deadline,
+            fold_scores[name],
+        )
+        for name in candidates
+    ]
+    try:
+        for _ in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+            pass
+    except TimeoutError:
+        print(f"⏱️ Model selection budget ({time_budget:.1f}s) exceeded")
+    finally:
+        # 未着手の候補は取り消し、実行中の学習は待たない（次の分割の前に打ち切られる）
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    scores = compare_fold_scores(
+        {name: list(folds) for name, folds in fold_scores.items()}
+    )
+    if scores:
+        best_name = max(scores, key=scores.get)
+        best_score = scores[best_name]
+    else:
+        # 1つも評価が終わらなかった場合は先頭の候補をそのまま使う
+        best_name = candidates[0]
+        best_score = -np.inf
+
+    fit_started = time.monotonic()
+    model = CANDIDATE_MODELS[best_name](multi_output)
+    model.fit(X, y)
+    finished = time.monotonic()
+
+    observe(
+        "stock_forecast_model_fit_seconds",
+        finished - fit_started,
+        {"model": best_name, "profile": profile},
+    )
+    observe(
+        "stock_forecast_model_selection_seconds",
+        finished - started,
+        {"profile": profile},
+    )
+    return {
+        "name": best_name,
+        "model": model,
+        "score": best_score,
+        "scores": scores,
+        "profile": profile,
+        "elapsed": finished - started,
+    }
+
+
+def time_series_splits(n_rows, n_splits, gap=0):
+    """
+    TimeSeriesSplitの分割（学習と検証の間をgap行空ける）
+    行数が足りない場合は分割数を減らし、2分割もできなければ空のリストを返す
+    """
+    from sklearn.model_selection import TimeSeriesSplit
+
+    for splits in range(n_splits, 1, -1):
+        test_size = n_rows // (splits + 1)
+        if test_size and n_rows - splits * test_size - gap >= MIN_TRAIN_ROWS:
+            return list(TimeSeriesSplit(n_splits=splits, gap=gap).split(range(n_rows)))
+    return []
+
+
+def compare_fold_scores(fold_scores):
+    """
+    候補ごとの分割のスコアから比較用のR²を計算
+    時間切れで途中までしか評価できなかった候補も残し、評価できた全候補が終えた
+    先頭の分割までの平均で比べる（学習データの量が同じ分割どうしで比べるため）
+    """
+    evaluated = {name: folds for name, folds in fold_scores.items() if folds}
+    if not evaluated:
+        return {}
+    common = min(len(folds) for folds in evaluated.values())
+    return {name: float(np.mean(folds[:common])) for name, folds in evaluated.items()}
+
+
+def _cross_validate(name, X, y, splits, multi_output, deadline, fold_scores):
+    """
+    1つの候補モデルを分割ごとに評価し、R²をfold_scoresに追加する
+    制限時間を過ぎたら次の分割に進まない。失敗した場合はスコアを空にする
+    """
+    from sklearn.metrics import r2_score
+
+    try:
+        for train_index, test_index in splits:
+            if time.monotonic() > deadline:
+                return
+            model = CANDIDATE_MODELS[name](multi_output)
+            model.fit(X.iloc[train_index], y.iloc[train_index])
+            pred = model.predict(X.iloc[test_index])
+            fold_scores.append(r2_score(y.iloc[test_index], pred))
+    except Exception as e:
+        print(f"❌ Model {name} failed: {e}")
+        fold_scores.clear()
+        return
+
+    if fold_scores:
+        print(f"📊 {name} CV R² Score: {np.mean(fold_scores):.4f}")
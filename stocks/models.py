@@ -9,6 +9,14 @@ class Stock(models.Model):
     )
     name = models.CharField(max_length=100, verbose_name="銘柄名")
     exchange = models.CharField(max_length=10, verbose_name="市場", default="TSE")
+    sector = models.CharField(
+        max_length=50, verbose_name="業種", blank=True, default=""
+    )
+    # 閲覧数（自動更新スケジューラの優先度に使用）
+    view_count = models.PositiveIntegerField(default=0, verbose_name="閲覧数")
+    last_viewed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="最終閲覧日時"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -38,7 +46,7 @@ class StockPrice(models.Model):
         max_digits=10, decimal_places=2, verbose_name="終値"
     )
     volume = models.BigIntegerField(verbose_name="出来高")
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         verbose_name = "株価データ"
@@ -64,12 +72,260 @@ class StockPrediction(models.Model):
     method = models.CharField(
         max_length=50, verbose_name="予測手法", default="移動平均"
     )
+    horizon = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name="予測期間（営業日）"
+    )
+    base_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="予想時点の価格",
+    )
+    lower_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="予測区間下限（5%）",
+    )
+    upper_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="予測区間上限（95%）",
+    )
+    # 1日目から予測日までの日ごとの分位点（シミュレーション結果）
+    price_bands = models.JSONField(null=True, blank=True, verbose_name="日別予測区間")
+    actual_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="実績価格"
+    )
+    abs_error = models.FloatField(null=True, blank=True, verbose_name="絶対誤差")
+    abs_pct_error = models.FloatField(
+        null=True, blank=True, verbose_name="絶対誤差率（%）"
+    )
+    direction_hit = models.BooleanField(null=True, blank=True, verbose_name="方向的中")
+    scored_at = models.DateTimeField(null=True, blank=True, verbose_name="採点日時")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = "株価予想"
         verbose_name_plural = "株価予想"
         ordering = ["-created_at"]  # 作成日時の新しい順
+        indexes = [
+            models.Index(fields=["stock", "prediction_date"]),
+            models.Index(fields=["stock", "method", "horizon", "scored_at"]),
+        ]
 
     def __str__(self):
         return f"{self.stock.symbol} - {self.prediction_date}: ¥{self.predicted_price}"
+
+
+class PredictionAccuracy(models.Model):
+    """予想手法ごとの実績精度（直近の採点済み予想の集計）"""
+
+    stock = models.ForeignKey(
+        Stock, on_delete=models.CASCADE, related_name="prediction_accuracies"
+    )
+    method = models.CharField(max_length=50, verbose_name="予測手法")
+    horizon = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name="予測期間（営業日）"
+    )
+    sample_count = models.IntegerField(verbose_name="件数", default=0)
+    mae = models.FloatField(verbose_name="平均絶対誤差", null=True, blank=True)
+    mape = models.FloatField(verbose_name="平均絶対誤差率（%）", null=True, blank=True)
+    hit_rate = models.FloatField(verbose_name="方向的中率（%）", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "予想精度"
+        verbose_name_plural = "予想精度"
+        unique_together = ["stock", "method", "horizon"]
+        ordering = ["stock", "method", "horizon"]
+
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.method}: MAPE {self.mape}"
+
+
+class MarketFactor(models.Model):
+    """市場（取引所）全体（sectorが空）または市場内の業種ごとの日次ファクター"""
+
+    date = models.DateField(verbose_name="日付")
+    exchange = models.CharField(max_length=10, verbose_name="市場", default="TSE")
+    sector = models.CharField(
+        max_length=50, verbose_name="業種", blank=True, default=""
+    )
+    market_return = models.FloatField(verbose_name="平均リターン")
+    return_5d = models.FloatField(verbose_name="5日平均リターン", null=True)
+    breadth = models.FloatField(verbose_name="上昇銘柄比率")
+    volatility = models.FloatField(verbose_name="ボラティリティ（20日）", null=True)
+    member_count = models.IntegerField(verbose_name="銘柄数")
+    computed_at = models.DateTimeField(verbose_name="計算日時", db_index=True)
+
+    class Meta:
+        verbose_name = "市場ファクター"
+        verbose_name_plural = "市場ファクター"
+        unique_together = ["date", "exchange", "sector"]
+        ordering = ["-date", "exchange", "sector"]
+
+    def __str__(self):
+        return f"{self.exchange} {self.sector or '市場全体'} - {self.date}"
+
+
+class StockFeature(models.Model):
+    """特徴量ストアのモデル（create_featuresの計算結果を保存）"""
+
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name="features")
+    date = models.DateField(verbose_name="日付")
+    close = models.FloatField(verbose_name="終値")
+    ma_5 = models.FloatField(verbose_name="5日移動平均")
+    ma_10 = models.FloatField(verbose_name="10日移動平均")
+    ma_20 = models.FloatField(verbose_name="20日移動平均")
+    rsi = models.FloatField(verbose_name="RSI")
+    macd = models.FloatField(verbose_name="MACD")
+    volatility = models.FloatField(verbose_name="ボラティリティ")
+    price_change_1d = models.FloatField(verbose_name="1日変化率")
+    price_change_5d = models.FloatField(verbose_name="5日変化率")
+    volume_ratio = models.FloatField(verbose_name="出来高比率")
+    high_low_ratio = models.FloatField(verbose_name="高値安値比率")
+    bb_position = models.FloatField(verbose_name="ボリンジャーバンド位置")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "特徴量"
+        verbose_name_plural = "特徴量"
+        unique_together = ["stock", "date"]
+        ordering = ["-date"]
+
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.date}"
+
+
+class LatestIndicator(models.Model):
+    """スクリーナー用の銘柄ごとの最新指標（特徴量ストアの最終行）"""
+
+    stock = models.OneToOneField(
+        Stock, on_delete=models.CASCADE, related_name="latest_indicator"
+    )
+    date = models.DateField(verbose_name="日付")
+    close = models.FloatField(verbose_name="終値")
+    ma_5 = models.FloatField(verbose_name="5日移動平均")
+    ma_20 = models.FloatField(verbose_name="20日移動平均")
+    ma20_gap = models.FloatField(verbose_name="20日移動平均乖離率")
+    rsi = models.FloatField(verbose_name="RSI")
+    macd = models.FloatField(verbose_name="MACD")
+    volatility = models.FloatField(verbose_name="ボラティリティ")
+    price_change_1d = models.FloatField(verbose_name="1日変化率")
+    price_change_5d = models.FloatField(verbose_name="5日変化率")
+    volume_ratio = models.FloatField(verbose_name="出来高比率")
+    bb_position = models.FloatField(verbose_name="ボリンジャーバンド位置")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "最新指標"
+        verbose_name_plural = "最新指標"
+        ordering = ["stock__symbol"]
+        # スクリーナーでよく使う条件の列
+        indexes = [
+            models.Index(fields=["rsi"]),
+            models.Index(fields=["ma20_gap"]),
+            models.Index(fields=["volume_ratio"]),
+            models.Index(fields=["price_change_5d"]),
+            models.Index(fields=["volatility"]),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.date}"
+
+
+class OnlineModelState(models.Model):
+    """オンライン学習モデルの状態（予測期間ごとのスケーラーと線形モデル）"""
+
+    stock = models.OneToOneField(
+        Stock, on_delete=models.CASCADE, related_name="online_model"
+    )
+    state = models.BinaryField(verbose_name="モデルの状態")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "オンライン学習モデル"
+        verbose_name_plural = "オンライン学習モデル"
+
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.updated_at}"
+
+
+class SingleFlight(models.Model):
+    """銘柄ごとの実行中・直近の処理（同時実行された同じ処理を1回にまとめる）"""
+
+    stock = models.ForeignKey(
+        Stock, on_delete=models.CASCADE, related_name="single_flights"
+    )
+    task = models.CharField(max_length=100, verbose_name="処理")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="開始日時")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完了日時")
+    result = models.BinaryField(null=True, verbose_name="結果")
+    # 完了した回数（ホスト間の時計のずれに影響されないよう、待っていた呼び出しは時刻ではなくこれで比較）
+    generation = models.PositiveBigIntegerField(default=0, verbose_name="完了回数")
+
+    class Meta:
+        verbose_name = "処理の実行状況"
+        verbose_name_plural = "処理の実行状況"
+        unique_together = ["stock", "task"]
+
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.task}"
+
+
+class BackfillAttempt(models.Model):
+    """欠損している取引日の補完の試行回数（取得できない日を繰り返しリクエストしないため）"""
+
+    stock = models.ForeignKey(
+        Stock, on_delete=models.CASCADE, related_name="backfill_attempts"
+    )
+    date = models.DateField(verbose_name="日付")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="試行回数")
+    last_attempted_at = models.DateTimeField(auto_now=True, verbose_name="最終試行日時")
+
+    class Meta:
+        verbose_name = "欠損の補完の試行"
+        verbose_name_plural = "欠損の補完の試行"
+        unique_together = ["stock", "date"]
+        ordering = ["stock", "date"]
+
+    def __str__(self):
+        return f"{self.stock.symbol} - {self.date}（{self.attempts}回）"
+
+
+class RequestProfile(models.Model):
+    """リクエストのプロファイル（関数ごとの処理時間・実行されたSQL）"""
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10, verbose_name="メソッド")
+    path = models.CharField(max_length=500, verbose_name="パス")
+    view_name = models.CharField(max_length=100, blank=True, verbose_name="ビュー")
+    status_code = models.PositiveSmallIntegerField(verbose_name="ステータス")
+    username = models.CharField(max_length=150, blank=True, verbose_name="ユーザー")
+    sampled = models.BooleanField(default=False, verbose_name="サンプリング")
+    duration_ms = models.FloatField(verbose_name="処理時間（ms）")
+    query_count = models.PositiveIntegerField(verbose_name="クエリ数")
+    query_time_ms = models.FloatField(verbose_name="クエリ時間（ms）")
+    similar_query_count = models.PositiveIntegerField(
+        verbose_name="同じ形のクエリ数（N+1の候補）"
+    )
+    duplicate_query_count = models.PositiveIntegerField(
+        verbose_name="重複クエリ数（同じパラメータ）"
+    )
+    # 累積時間の長い関数（関数・呼び出し回数・自身の時間・累積時間）
+    top_functions = models.JSONField(default=list, verbose_name="処理時間の長い関数")
+    # 実行されたSQL（同じ形のクエリはまとめて回数・合計時間を記録）
+    queries = models.JSONField(default=list, verbose_name="SQLクエリ")
+
+    class Meta:
+        verbose_name = "リクエストのプロファイル"
+        verbose_name_plural = "リクエストのプロファイル"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms)"
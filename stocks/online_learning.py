@@ -0,0 +1,135 @@
+import pickle
+
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from .feature_store import load_feature_frame
+from .models import OnlineModelState
+from .utils import FEATURE_COLUMNS
+
+ONLINE_MODEL_NAME = "SGDRegressor"
+ONLINE_METHOD = "オンライン学習（SGD）"
+
+
+def new_online_state():
+    """
+    1つの予測期間分のオンライン学習の状態（逐次スケーラー＋線形モデル）
+    目的変数は予測期間先までのリターンとし、価格水準に依存しないようにする
+    """
+    return {
+        "scaler": StandardScaler(),
+        "model": SGDRegressor(random_state=42),
+        "last_date": None,
+        "samples": 0,
+        # 更新前のモデルによる予想誤差の累計（プリクエンシャル評価）
+        "sse": 0.0,
+        "sst": 0.0,
+    }
+
+
+def partial_update(state, X, returns):
+    """
+    新しい行だけでスケーラーとモデルを更新
+    """
+    if state["samples"]:
+        errors = returns - predict_returns(state, X)
+        state["sse"] += float(np.sum(errors**2))
+        state["sst"] += float(np.sum(returns**2))
+
+    state["scaler"].partial_fit(X)
+    state["model"].partial_fit(state["scaler"].transform(X), returns)
+    state["samples"] += len(returns)
+
+
+def predict_returns(state, X):
+    """
+    標準化した特徴量と係数の内積でリターンを予想
+    """
+    scaler = state["scaler"]
+    model = state["model"]
+    return ((X - scaler.mean_) / scaler.scale_) @ model.coef_ + model.intercept_[0]
+
+
+def online_skill(state):
+    """
+    「価格は変わらない」という予想に対する改善度（1 - 誤差二乗和 / リターン二乗和）
+    """
+    if state["sst"] <= 0:
+        return 0.0
+    return 1 - state["sse"] / state["sst"]
+
+
+def update_online_models(stock_obj, horizons=(), create=False):
+    """
+    前回の更新以降に目的変数が確定した行だけでオンライン学習モデルを更新
+    状態がない銘柄はcreate=Trueの場合のみ全履歴から初期学習する
+    """
+    record = OnlineModelState.objects.filter(stock=stock_obj).first()
+    if record is None and not create:
+        return None
+
+    states = pickle.loads(record.state) if record else {}
+    for horizon in horizons:
+        states.setdefault(horizon, new_online_state())
+    if not states:
+        return None
+
+    last_dates = [state["last_date"] for state in states.values()]
+    since = None if None in last_dates else min(last_dates)
+    df = load_feature_frame(stock_obj, since=since)
+
+    X = df[FEATURE_COLUMNS].to_numpy()
+    close = df["close"].to_numpy()
+    dates = df["date"].to_numpy().astype("datetime64[D]")
+
+    updated = 0
+    for horizon, state in states.items():
+        rows = np.arange(max(0, len(df) - horizon))
+        if state["last_date"] is not None:
+            rows = rows[dates[rows] > np.datetime64(state["last_date"])]
+        if len(rows) == 0:
+            continue
+
+        partial_update(state, X[rows], close[rows + horizon] / close[rows] - 1)
+        state["last_date"] = dates[rows[-1]].astype(object)
+        updated += len(rows)
+
+    if updated or record is None:
+        OnlineModelState.objects.update_or_create(
+            stock=stock_obj, defaults={"state": pickle.dumps(states)}
+        )
+        print(f"🔁 Online models updated with {updated} rows for {stock_obj.symbol}")
+
+    return states
+
+
+def online_predict(stock_obj, df, horizons):
+    """
+    逐次学習済みのモデルで各期間の価格を予想（再学習はしない）
+    """
+    states = update_online_models(stock_obj, horizons=horizons, create=True)
+    if not states or any(states[h]["samples"] == 0 for h in horizons):
+        print(f"❌ Online model has no training data for {stock_obj.symbol}")
+        return None
+
+    latest = df[FEATURE_COLUMNS].to_numpy()[-1:]
+    current_price = float(df["close"].iloc[-1])
+    predicted_prices = {
+        horizon: current_price
+        * (1 + float(predict_returns(states[horizon], latest)[0]))
+        for horizon in horizons
+    }
+    predicted_price = predicted_prices[horizons[0]]
+
+    return {
+        "predicted_price": predicted_price,
+        "predicted_prices": predicted_prices,
+        "current_price": current_price,
+        "trend": "上昇" if predicted_price > current_price else "下降",
+        "accuracy": max(0, online_skill(states[horizons[0]])),
+        "best_model": f"{ONLINE_MODEL_NAME}（オンライン）",
+        "feature_importance": {},
+        "symbol": stock_obj.symbol,
+        "method": ONLINE_METHOD,
+    }
@@ -0,0 +1,163 @@
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from .db_router import pinning_scope
+from .metrics import record_cache
+from .models import Stock, StockPrediction, StockPrice
+
+# 一括処理の中で無効化する銘柄ID（Noneは一括処理の外。batched_invalidationで使用）
+_pending = ContextVar("stocks_pending_invalidation", default=None)
+
+
+def _version_key(stock_id):
+    return f"stock_version:{stock_id}"
+
+
+def stock_versions(stock_ids):
+    """
+    銘柄ごとのキャッシュのバージョンをまとめて取得
+    バージョンは無効化した時刻（ns）で、キャッシュから消えていた場合も新しい値にして古いキーを使わない
+    """
+    keys = {stock_id: _version_key(stock_id) for stock_id in stock_ids}
+    found = cache.get_many(list(keys.values()))
+    created = {key: time.time_ns() for key in keys.values() if key not in found}
+    if created:
+        cache.set_many(created, None)
+    return {stock_id: found.get(key) or created[key] for stock_id, key in keys.items()}
+
+
+def stock_cache_key(stock_id, name, version):
+    return f"stock:{stock_id}:{version}:{name}"
+
+
+def _fill_scope(version):
+    # 無効化の直後はレプリカに書き込みが届いていない場合があるため、プライマリから読んで保存する
+    age = (time.time_ns() - version) / 1e9
+    if age < settings.DATABASE_REPLICA_LAG_SECONDS:
+        return pinning_scope(pinned=True)
+    return nullcontext()
+
+
+def cached_for_stock(stock_id, name, build):
+    """
+    銘柄ごとのキャッシュ（cache-aside）。キャッシュになければbuild()の結果を保存する
+    (値, バージョン)を返す（バージョンはテンプレートの断片のキャッシュのキーに使う）
+    nameの":"より前をヒット・ミスの集計に使う（例: "chart_data:30"）
+    """
+    version = stock_versions([stock_id])[stock_id]
+    key = stock_cache_key(stock_id, name, version)
+    value = cache.get(key)
+    record_cache(name.partition(":")[0], value is not None)
+    if value is None:
+        with _fill_scope(version):
+            value = build()
+        cache.set(key, value, settings.PAGE_CACHE_TIMEOUT)
+    return value, version
+
+
+async def acached_for_stock(stock_id, name, abuild):
+    """
+    cached_for_stockの非同期版（abuildはコルーチン関数）
+    """
+    version_key = _version_key(stock_id)
+    version = await cache.aget(version_key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aset(version_key, version, None)
+    key = stock_cache_key(stock_id, name, version)
+    value = await cache.aget(key)
+    record_cache(name.partition(":")[0], value is not None)
+    if value is None:
+        with _fill_scope(version):
+            value = await abuild()
+        await cache.aset(key, value, settings.PAGE_CACHE_TIMEOUT)
+    return value, version
+
+
+def cached_many_for_stocks(stock_ids, name, build_missing):
+    """
+    複数銘柄のキャッシュをまとめて取得し、ないものだけbuild_missing(銘柄IDのリスト)で
+    {銘柄ID: 値}を作って保存する。{銘柄ID: (値, バージョン)}を返す
+    """
+    versions = stock_versions(stock_ids)
+    keys = {
+        stock_id: stock_cache_key(stock_id, name, version)
+        for stock_id, version in versions.items()
+    }
+    found = cache.get_many(list(keys.values()))
+    missing = [stock_id for stock_id, key in keys.items() if key not in found]
+    for stock_id in stock_ids:
+        record_cache(name, stock_id not in missing)
+
+    values = {stock_id: found[key] for stock_id, key in keys.items() if key in found}
+    if missing:
+        with _fill_scope(max(versions[stock_id] for stock_id in missing)):
+            built = build_missing(missing)
+        cache.set_many(
+            {keys[stock_id]: value for stock_id, value in built.items()},
+            settings.PAGE_CACHE_TIMEOUT,
+        )
+        values.update(built)
+    return {
+        stock_id: (values.get(stock_id), versions[stock_id]) for stock_id in stock_ids
+    }
+
+
+def invalidate_stocks(stock_ids):
+    """
+    銘柄のキャッシュ（詳細画面・チャートデータ・一覧の行・テンプレートの断片）を無効化
+    バージョンを更新して古いキーを参照しないようにする（古いキーは期限切れで消える）
+    トランザクションの中ではコミット後に更新する（コミット前のデータを新しいバージョンで
+    キャッシュされないように。トランザクションの外ではすぐに更新する）
+    """
+    pending = _pending.get()
+    if pending is not None:
+        pending.update(stock_ids)
+        return
+    stock_ids = set(stock_ids)
+    transaction.on_commit(lambda: _bump_versions(stock_ids))
+
+
+def _bump_versions(stock_ids):
+    now = time.time_ns()
+    cache.set_many({_version_key(stock_id): now for stock_id in stock_ids}, None)
+
+
+@contextmanager
+def batched_invalidation():
+    """
+    この範囲の書き込みによる無効化を最後に1回にまとめる（株価の取り込みなど行ごとに保存する処理向け）
+    """
+    if _pending.get() is not None:
+        yield
+        return
+    pending = set()
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+        if pending:
+            invalidate_stocks(pending)
+
+
+def _on_stock_saved(sender, instance, **kwargs):
+    invalidate_stocks([instance.pk])
+
+
+def _on_stock_data_saved(sender, instance, **kwargs):
+    invalidate_stocks([instance.stock_id])
+
+
+# bulk_create・QuerySet.update()はシグナルを送らないため、それらを使う処理はinvalidate_stocksを呼ぶ
+# 削除のシグナルを受け取ると一括削除で行を読み込むようになるため、削除は受け取らない
+# （予想の削除は作り直しと同時、銘柄の削除は一覧から消えるため無効化は不要）
+post_save.connect(_on_stock_saved, sender=Stock)
+post_save.connect(_on_stock_data_saved, sender=StockPrice)
+post_save.connect(_on_stock_data_saved, sender=StockPrediction)
@@ -0,0 +1,325 @@
+import threading
+from datetime import date, timedelta
+
+from django.db.models import Max
+
+import numpy as np
+import pandas as pd
+
+from .metrics import record_cache
+from .models import Stock, StockPrice
+
+# 検索対象とする過去の期間（年）
+PATTERN_SEARCH_YEARS = 10
+# 既定のウィンドウ長（インデックス作成時に移動統計量を計算しておく）
+DEFAULT_WINDOW = 30
+# 移動標準偏差を保持するウィンドウ長の数
+MAX_CACHED_WINDOWS = 3
+# 一度に距離を計算する銘柄数（一時配列のメモリを抑える）
+CHUNK_SIZE = 512
+
+# 全銘柄の終値とFFTをプロセス内に保持（株価が追加された銘柄だけ差し替える）
+_index_lock = threading.Lock()
+_index_cache = {"version": None, "index": None}
+
+
+def build_pattern_index(symbols, names, dates, closes):
+    """
+    銘柄ごとの終値系列から類似パターン検索用のインデックスを作成
+    各系列を平均0・標準偏差1に変換してから0埋めし、FFTを事前に計算しておく
+    （z正規化距離は系列全体の一次変換で変わらないため、float32でも精度を保てる）
+    """
+    lengths = np.array([len(c) for c in closes], dtype=np.int64)
+    n_max = int(lengths.max()) if len(lengths) else 0
+    n_fft = 1 << max(n_max - 1, 1).bit_length()
+
+    series = np.zeros((len(closes), n_fft), dtype=np.float32)
+    for i, c in enumerate(closes):
+        series[i, : len(c)] = _normalize(c)
+
+    index = {
+        "symbols": list(symbols),
+        "names": list(names),
+        "dates": [np.asarray(d, dtype="datetime64[D]") for d in dates],
+        "closes": [np.asarray(c, dtype=np.float64) for c in closes],
+        "lengths": lengths,
+        "n_fft": n_fft,
+        "series": series,
+        "fft": np.fft.rfft(series, axis=1).astype(np.complex64),
+        # ウィンドウ長ごとの移動標準偏差（初回の検索時に計算して再利用）
+        "rolling": {},
+    }
+    _rolling_std(index, DEFAULT_WINDOW)
+    return index
+
+
+def update_pattern_index(index, symbols, names, dates, closes):
+    """
+    指定した銘柄の系列だけを差し替えたインデックスを返す（インデックスにない銘柄は追加）
+    差し替える行のFFT・移動標準偏差だけを計算し直す
+    検索中のインデックスは変更せずに配列をコピーする
+    系列がFFT長を超える場合は作り直しが必要なためNoneを返す
+    """
+    n_fft = index["n_fft"]
+    if any(len(c) > n_fft for c in closes):
+        return None
+
+    positions = {symbol: i for i, symbol in enumerate(index["symbols"])}
+    added = sum(1 for symbol in set(symbols) if symbol not in positions)
+
+    def grow(array):
+        extra = np.zeros((added,) + array.shape[1:], dtype=array.dtype)
+        return np.concatenate([array, extra])
+
+    index = {
+        **index,
+        "symbols": list(index["symbols"]),
+        "names": list(index["names"]),
+        "dates": list(index["dates"]),
+        "closes": list(index["closes"]),
+        "lengths": grow(index["lengths"]),
+        "series": grow(index["series"]),
+        "fft": grow(index["fft"]),
+        "rolling": {window: grow(std) for window, std in index["rolling"].items()},
+    }
+
+    rows = []
+    for symbol, name, d, c in zip(symbols, names, dates, closes):
+        if symbol not in positions:
+            positions[symbol] = len(index["symbols"])
+            for key in ["symbols", "names", "dates", "closes"]:
+                index[key].append(None)
+        row = positions[symbol]
+        rows.append(row)
+        index["symbols"][row] = symbol
+        index["names"][row] = name
+        index["dates"][row] = np.asarray(d, dtype="datetime64[D]")
+        index["closes"][row] = np.asarray(c, dtype=np.float64)
+        index["lengths"][row] = len(c)
+        index["series"][row] = 0
+        index["series"][row, : len(c)] = _normalize(c)
+
+    if rows:
+        series = index["series"][rows]
+        index["fft"][rows] = np.fft.rfft(series, axis=1).astype(np.complex64)
+        for window, std in index["rolling"].items():
+            std[rows] = _window_std(series, window)
+    return index
+
+
+def _load_series(stock_ids=None):
+    """
+    DBから銘柄ごとの直近PATTERN_SEARCH_YEARS年の終値系列を読み込む（stock_idsで銘柄を限定）
+    """
+    since = date.today() - timedelta(days=365 * PATTERN_SEARCH_YEARS)
+    rows = StockPrice.objects.filter(date__gte=since)
+    stocks = Stock.objects.all()
+    if stock_ids is not None:
+        rows = rows.filter(stock_id__in=stock_ids)
+        stocks = stocks.filter(id__in=stock_ids)
+
+    df = pd.DataFrame.from_records(
+        list(
+            rows.order_by("stock_id", "date").values_list(
+                "stock_id", "date", "close_price"
+            )
+        ),
+        columns=["stock_id", "date", "close"],
+    )
+    labels = {
+        stock_id: (symbol, name)
+        for stock_id, symbol, name in stocks.values_list("id", "symbol", "name")
+    }
+
+    symbols, names, dates, closes = [], [], [], []
+    for stock_id, group in df.groupby("stock_id", sort=False):
+        symbols.append(labels[stock_id][0])
+        names.append(labels[stock_id][1])
+        dates.append(group["date"].to_numpy(dtype="datetime64[D]"))
+        closes.append(group["close"].to_numpy(dtype=np.float64))
+    return symbols, names, dates, closes
+
+
+def load_pattern_index():
+    """
+    DBの全銘柄の終値からインデックスを作成（前回から変更がなければ再利用）
+    前回以降に足が追加された銘柄だけ系列を読み直して差し替え、全銘柄は読み直さない
+    銘柄が減った場合や系列がFFT長を超える場合は作り直す
+    """
+    version = (
+        Stock.objects.count(),
+        StockPrice.objects.aggregate(Max("id"))["id__max"],
+    )
+    with _index_lock:
+        cached = _index_cache["version"]
+        hit = cached == version
+        record_cache("pattern_index", hit)
+        if hit:
+            return _index_cache["index"]
+
+        index = None
+        if (
+            cached is not None
+            and None not in cached
+            and version[1] is not None
+            and version[0] >= cached[0]
+            and version[1] > cached[1]
+        ):
+            changed = list(
+                StockPrice.objects.filter(id__gt=cached[1])
+                .order_by()
+                .values_list("stock_id", flat=True)
+                .distinct()
+            )
+            index = update_pattern_index(_index_cache["index"], *_load_series(changed))
+            if index is not None:
+                print(f"🧭 Updated pattern index for {len(changed)} stocks")
+
+        if index is None:
+            index = build_pattern_index(*_load_series())
+            print(f"🧭 Built pattern index for {len(index['symbols'])} stocks")
+        _index_cache.update(version=version, index=index)
+        return index
+
+
+def _normalize(closes):
+    """
+    終値系列を平均0・標準偏差1に変換
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    std = closes.std()
+    return (closes - closes.mean()) / (std if std > 0 else 1.0)
+
+
+def _window_std(series, window):
+    """
+    系列ごと・開始位置ごとのウィンドウの標準偏差（累積和から一括計算）
+    """
+    series = series.astype(np.float64)
+    cumsum = np.zeros((len(series), series.shape[1] + 1))
+    cumsum_sq = np.zeros_like(cumsum)
+    np.cumsum(series, axis=1, out=cumsum[:, 1:])
+    np.cumsum(series**2, axis=1, out=cumsum_sq[:, 1:])
+
+    mean = (cumsum[:, window:] - cumsum[:, :-window]) / window
+    var = (cumsum_sq[:, window:] - cumsum_sq[:, :-window]) / window - mean**2
+    return np.sqrt(np.maximum(var, 0)).astype(np.float32)
+
+
+def _rolling_std(index, window):
+    """
+    全銘柄・全開始位置のウィンドウの標準偏差
+    平均はクエリを平均0にしているため距離の計算には不要
+    """
+    rolling = index["rolling"]
+    if window not in rolling:
+        # 既定以外のウィンドウ長は直近に使ったものだけ保持してメモリを抑える
+        for cached in [w for w in rolling if w != DEFAULT_WINDOW]:
+            if len(rolling) >= MAX_CACHED_WINDOWS:
+                del rolling[cached]
+        rolling[window] = _window_std(index["series"], window)
+    return rolling[window]
+
+
+def distance_profiles(index, query):
+    """
+    z正規化したクエリと全銘柄・全開始位置のウィンドウとのz正規化ユークリッド距離
+    スライディング内積をFFTで計算する（MASS）
+    """
+    query = np.asarray(query, dtype=np.float64)
+    window = len(query)
+    query = (query - query.mean()) / query.std()
+
+    sigma = _rolling_std(index, window)
+    query_fft = np.fft.rfft(query[::-1], index["n_fft"]).astype(np.complex64)
+    positions = index["n_fft"] - window + 1
+
+    distances = np.empty((len(index["series"]), positions), dtype=np.float32)
+    for start in range(0, len(distances), CHUNK_SIZE):
+        stop = start + CHUNK_SIZE
+        products = np.fft.irfft(index["fft"][start:stop] * query_fft, index["n_fft"])
+        dot = products[:, window - 1 :]
+        # クエリは平均0・標準偏差1なので、内積 / (window * σ) が相関係数になる
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = dot / (window * sigma[start:stop])
+        distances[start:stop] = np.sqrt(
+            np.maximum(2 * window * (1 - np.clip(corr, -1, 1)), 0)
+        )
+
+    # 値幅のない区間や系列の長さを超える位置は除外
+    distances[~np.isfinite(distances)] = np.inf
+    distances[sigma < 1e-6] = np.inf
+    distances[np.arange(positions)[None, :] > (index["lengths"] - window)[:, None]] = (
+        np.inf
+    )
+    return distances
+
+
+def search_similar_patterns(stock_obj, window=DEFAULT_WINDOW, top_k=10, forward=10):
+    """
+    指定銘柄の直近window本の値動きに似た過去のチャートを全銘柄から検索
+    一致した区間のその後forward本の値動きも返す（銘柄ごとに最も近い1区間のみ）
+    """
+    index = load_pattern_index()
+    if stock_obj.symbol not in index["symbols"]:
+        return None
+
+    row = index["symbols"].index(stock_obj.symbol)
+    closes = index["closes"][row]
+    if len(closes) < window or closes[-window:].std() == 0:
+        return None
+
+    distances = distance_profiles(index, closes[-window:])
+
+    # その後の値動きが確定している区間のみ対象にする
+    limits = index["lengths"] - window - forward
+    positions = np.arange(distances.shape[1])
+    distances[positions[None, :] > limits[:, None]] = np.inf
+    # 検索元の銘柄は直近の区間（クエリ自身と重なる区間）を除外
+    distances[row, max(0, len(closes) - 2 * window + 1) :] = np.inf
+
+    best = distances.argmin(axis=1)
+    best_distance = distances[np.arange(len(best)), best]
+    order = np.argsort(best_distance)[:top_k]
+
+    matches = []
+    for i in order:
+        if not np.isfinite(best_distance[i]):
+            break
+        start = int(best[i])
+        end = start + window - 1
+        series = index["closes"][i]
+        after = series[end : end + forward + 1] / series[end] - 1
+        matches.append(
+            {
+                "symbol": index["symbols"][i],
+                "name": index["names"][i],
+                "start_date": str(index["dates"][i][start]),
+                "end_date": str(index["dates"][i][end]),
+                "distance": round(float(best_distance[i]), 4),
+                "correlation": round(
+                    float(1 - best_distance[i] ** 2 / (2 * window)), 4
+                ),
+                "forward_return": round(float(after[-1]) * 100, 2),
+                "forward_path": [round(float(r) * 100, 2) for r in after[1:]],
+            }
+        )
+
+    forward_returns = [m["forward_return"] for m in matches]
+    return {
+        "symbol": stock_obj.symbol,
+        "window": window,
+        "forward": forward,
+        "query_start": str(index["dates"][row][-window]),
+        "query_end": str(index["dates"][row][-1]),
+        "matches": matches,
+        "mean_forward_return": (
+            round(float(np.mean(forward_returns)), 2) if forward_returns else None
+        ),
+        "up_ratio": (
+            round(float(np.mean(np.array(forward_returns) > 0)) * 100, 1)
+            if forward_returns
+            else None
+        ),
+        "stocks_searched": len(index["symbols"]),
+    }
@@ -0,0 +1,159 @@
+import cProfile
+import pstats
+import random
+import time
+
+from django.conf import settings
+
+from .models import RequestProfile
+from .query_tracking import observe_queries
+
+# 保存する関数の数（累積時間の長い順）
+TOP_FUNCTIONS = 40
+# 保存するSQLの形の数（実行回数の多い順）
+MAX_QUERIES = 200
+# 保存しておくプロファイルの件数（古いものから削除）
+MAX_PROFILES = 500
+
+
+def should_profile(request):
+    """
+    プロファイルを取るリクエストか判定
+    スタッフユーザーがクエリパラメータ（PROFILING_QUERY_PARAM）を付けた場合、
+    またはPROFILING_SAMPLE_RATEの割合でサンプリングされた場合
+    """
+    user = getattr(request, "user", None)
+    if settings.PROFILING_QUERY_PARAM in request.GET:
+        if user is not None and user.is_active and user.is_staff:
+            return True, False
+    rate = settings.PROFILING_SAMPLE_RATE
+    if rate > 0 and random.random() < rate:
+        return True, True
+    return False, False
+
+
+def _record_queries(queries):
+    """
+    実行されたSQLとその時間をqueriesに記録する
+    """
+
+    def record_query(sql, params, elapsed_ms):
+        queries.append((sql, repr(params), elapsed_ms))
+
+    return observe_queries(record_query)
+
+
+def profile_request(get_response, request):
+    """
+    ビューをcProfileの下で実行し、実行されたSQLとその時間も記録
+    """
+    queries = []
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with _record_queries(queries):
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration_ms = (time.perf_counter() - started) * 1000
+    return response, profiler, queries, duration_ms
+
+
+async def aprofile_request(get_response, request):
+    """
+    profile_requestの非同期版（ASGIで非同期ビューを実行する場合）
+    cProfileはイベントループのスレッドだけを計測するため、スレッドで実行されるORMなどの
+    同期処理は関数の一覧に含まれない（SQLとその時間はスレッドで実行されたものも記録される）
+    """
+    queries = []
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with _record_queries(queries):
+        profiler.enable()
+        try:
+            response = await get_response(request)
+        finally:
+            profiler.disable()
+    duration_ms = (time.perf_counter() - started) * 1000
+    return response, profiler, queries, duration_ms
+
+
+def summarize_queries(queries):
+    """
+    SQLを形（パラメータを除いた文）ごとにまとめる
+    同じ形のクエリが繰り返されていればN+1、同じパラメータなら重複クエリ
+    """
+    grouped = {}
+    for sql, params, elapsed in queries:
+        entry = grouped.setdefault(
+            sql, {"sql": sql, "count": 0, "time_ms": 0.0, "params": {}}
+        )
+        entry["count"] += 1
+        entry["time_ms"] += elapsed
+        entry["params"][params] = entry["params"].get(params, 0) + 1
+
+    summary = []
+    for entry in grouped.values():
+        summary.append(
+            {
+                "sql": entry["sql"],
+                "count": entry["count"],
+                "duplicates": sum(n - 1 for n in entry["params"].values()),
+                "time_ms": round(entry["time_ms"], 3),
+            }
+        )
+    summary.sort(key=lambda q: (-q["count"], -q["time_ms"]))
+    return summary
+
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    """
+    累積時間の長い関数の一覧
+    """
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{filename}:{line}({name})",
+                "ncalls": ncalls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            }
+        )
+    rows.sort(key=lambda row: -row["cumtime_ms"])
+    return rows[:limit]
+
+
+def save_profile(request, response, profiler, queries, duration_ms, sampled):
+    """
+    プロファイルを保存し、保存件数の上限を超えた古いプロファイルを削除
+    """
+    summary = summarize_queries(queries)
+    match = getattr(request, "resolver_match", None)
+    user = getattr(request, "user", None)
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        view_name=(match.url_name or "") if match else "",
+        status_code=response.status_code,
+        username=user.get_username() if user and user.is_authenticated else "",
+        sampled=sampled,
+        duration_ms=round(duration_ms, 3),
+        query_count=len(queries),
+        query_time_ms=round(sum(elapsed for _, _, elapsed in queries), 3),
+        similar_query_count=sum(q["count"] for q in summary if q["count"] > 1),
+        duplicate_query_count=sum(q["duplicates"] for q in summary),
+        top_functions=top_functions(profiler),
+        queries=summary[:MAX_QUERIES],
+    )
+
+    stale = list(
+        RequestProfile.objects.order_by("-id").values_list("id", flat=True)[
+            MAX_PROFILES : MAX_PROFILES + 1
+        ]
+    )
+    if stale:
+        RequestProfile.objects.filter(id__lte=stale[0]).delete()
+    return profile
@@ -0,0 +1,546 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from asgiref.sync import sync_to_async
+
+from .instrumentation import annotate, count, stage, timed
+from .metrics import provider_call
+from .trading_calendar import exchange_for_symbol, trading_days
+
+# Alpha Vantage用（フリーAPI）
+ALPHA_VANTAGE_API_KEY = "demo"  # デモ用キー、本番では専用キーを取得
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+
+# 取得期間と、その期間で必ず含まれる日数（短い順。1か月は28日、3か月は89日で数える）
+PERIOD_DAYS = [("5d", 5), ("1mo", 28), ("3mo", 89), ("6mo", 181)]
+
+
+def period_since(start_date, today=None):
+    """
+    start_dateから今日までを含む最も短い取得期間（半年を超える場合は"1y"）
+    """
+    # サーバーと市場の日付のずれの分だけ余裕を持たせる
+    days = ((today or datetime.now().date()) - start_date).days + 2
+    for period, period_days in PERIOD_DAYS:
+        if days <= period_days:
+            return period
+    return "1y"
+
+
+def _alpha_vantage_request(symbol):
+    """
+    Alpha Vantage APIのシンボルとリクエストパラメータ（日本株は非対応のためNone）
+    """
+    if symbol.isdigit():
+        return None, None
+
+    # 米国株のみ対応
+    av_symbol = symbol.replace(".T", "")  # .Tを削除
+    params = {
+        "function": "TIME_SERIES_DAILY",
+        "symbol": av_symbol,
+        "apikey": ALPHA_VANTAGE_API_KEY,
+        "outputsize": "compact",  # 最新100日分
+    }
+    return av_symbol, params
+
+
+def _classify_alpha_vantage_response(response, call):
+    """
+    レスポンスのJSON（200以外は空）を返し、レート制限・エラーをメトリクス用に分類
+    """
+    data_json = response.json() if response.status_code == 200 else {}
+    # 無料枠の上限に達した場合は200で説明文（NoteまたはInformation）が返る
+    if response.status_code == 429 or {"Note", "Information"} & set(data_json):
+        call.status = "rate_limited"
+    elif "Time Series (Daily)" not in data_json:
+        call.status = "error"
+    return data_json
+
+
+def _alpha_vantage_records(av_symbol, data_json):
+    """
+    Alpha Vantageのレスポンスを株価データの辞書のリストに変換（取得できなければNone）
+    """
+    if "Time Series (Daily)" not in data_json:
+        print(f"Alpha Vantage API failed for {av_symbol}")
+        return None
+
+    data = []
+    time_series = data_json["Time Series (Daily)"]
+    for date_str, values in list(time_series.items())[:30]:  # 最新30日
+        try:
+            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+            data.append(
+                {
+                    "date": date_obj,
+                    "open": float(values["1. open"]),
+                    "high": float(values["2. high"]),
+                    "low": float(values["3. low"]),
+                    "close": float(values["4. close"]),
+                    "volume": int(values["5. volume"]),
+                }
+            )
+        except (ValueError, KeyError) as e:
+            print(f"Error processing Alpha Vantage data for {date_str}: {e}")
+            continue
+
+    # 日付順にソート
+    data.sort(key=lambda x: x["date"])
+
+    if not data:
+        print(f"Alpha Vantage API failed for {av_symbol}")
+        return None
+    print(f"✅ Alpha Vantage: Retrieved {len(data)} records for {av_symbol}")
+    return data
+
+
+def fetch_stock_data_alpha_vantage(symbol, period="1y"):
+    """
+    Alpha Vantage APIから株価データを取得（代替手段）
+    """
+    # 外部APIのライブラリは重いため、実際に取得するときに読み込む
+    import httpx
+
+    try:
+        av_symbol, params = _alpha_vantage_request(symbol)
+        if av_symbol is None:
+            # 日本株は対応していないので、デモデータにフォールバック
+            print(
+                f"Alpha Vantage does not support Japanese stocks ({symbol}), using demo data"
+            )
+            return generate_demo_stock_data(symbol, period), True
+
+        print(f"Trying Alpha Vantage API for {av_symbol}...")
+        with provider_call("alpha_vantage") as call:
+            response = httpx.get(ALPHA_VANTAGE_URL, params=params, timeout=10)
+            data_json = _classify_alpha_vantage_response(response, call)
+
+        data = _alpha_vantage_records(av_symbol, data_json)
+        return (data, False) if data else (None, True)
+
+    except Exception as e:
+        print(f"Alpha Vantage error for {symbol}: {e}")
+        return None, True
+
+
+async def afetch_stock_data_alpha_vantage(
+    symbol, period="1y", client=None, acquire=None
+):
+    """
+    fetch_stock_data_alpha_vantageの非同期版（clientを渡すと接続を使い回す）
+    acquire: APIを呼び出す前に呼ぶ関数（Falseを返した場合は呼び出さない。リクエスト数の上限用）
+    """
+    import httpx
+
+    try:
+        av_symbol, params = _alpha_vantage_request(symbol)
+        if av_symbol is None:
+            print(
+                f"Alpha Vantage does not support Japanese stocks ({symbol}), using demo data"
+            )
+            return generate_demo_stock_data(symbol, period), True
+        if acquire is not None and not acquire():
+            return None, True
+
+        print(f"Trying Alpha Vantage API for {av_symbol}...")
+        with provider_call("alpha_vantage") as call:
+            if client is None:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    response = await client.get(ALPHA_VANTAGE_URL, params=params)
+            else:
+                response = await client.get(ALPHA_VANTAGE_URL, params=params)
+            data_json = _classify_alpha_vantage_response(response, call)
+
+        data = _alpha_vantage_records(av_symbol, data_json)
+        return (data, False) if data else (None, True)
+
+    except Exception as e:
+        print(f"Alpha Vantage error for {symbol}: {e}")
+        return None, True
+
+
+def _validate_symbol(symbol):
+    if not symbol or "," in symbol:
+        print(f"Invalid symbol: {symbol}")
+        return False
+    return True
+
+
+@timed("fetch_stock_data")
+def fetch_stock_data(symbol, period="1y", max_retries=3, use_demo=False):
+    """
+    複数のAPIから株価データを取得（改善版）
+    """
+    annotate(symbol=symbol, period=period)
+    # 入力の検証
+    if not _validate_symbol(symbol):
+        return None, True  # (data, is_demo)
+
+    # デモデータを強制的に使用する場合
+    if use_demo:
+        print(f"Using demo data as requested for {symbol}")
+        annotate(provider="demo")
+        return generate_demo_stock_data(symbol, period), True
+
+    print(f"🔍 Fetching REAL data for symbol: {symbol}")
+
+    # 1. Alpha Vantage APIを最初に試す（より安定）
+    print("1️⃣ Trying Alpha Vantage API...")
+    with stage("alpha_vantage"):
+        data, is_demo = fetch_stock_data_alpha_vantage(symbol, period)
+    if data and not is_demo:
+        annotate(provider="alpha_vantage", records=len(data))
+        return data, False
+
+    # 2. Yahoo Finance APIをフォールバックとして使用
+    data = fetch_stock_data_yahoo(symbol, period, max_retries)
+    if data:
+        return data, False
+
+    # Yahoo Finance APIが利用できない場合、デモデータを生成
+    print(f"⚠️  Yahoo Finance API failed, generating DEMO data for {symbol}")
+    annotate(provider="demo")
+    return generate_demo_stock_data(symbol, period), True  # (data, is_demo)
+
+
+async def afetch_stock_data(
+    symbol,
+    period="1y",
+    max_retries=3,
+    use_demo=False,
+    client=None,
+    allow_demo=True,
+    acquire=None,
+):
+    """
+    fetch_stock_dataの非同期版
+    Alpha Vantageは非同期のHTTPクライアントで取得する。yfinanceには非同期のAPIがないため、
+    Yahoo Financeへのフォールバックのみスレッドで実行する
+    allow_demo=Falseでは取得できなかった場合にデモデータを返さず(None, True)を返す
+    acquire: データ提供元を1回呼び出すごとに呼ぶ関数（Falseを返した場合は以降の呼び出しをやめる）
+    """
+    if not _validate_symbol(symbol):
+        return None, True
+
+    if use_demo:
+        print(f"Using demo data as requested for {symbol}")
+        return generate_demo_stock_data(symbol, period), True
+
+    print(f"🔍 Fetching REAL data for symbol: {symbol}")
+    data, is_demo = await afetch_stock_data_alpha_vantage(
+        symbol, period, client, acquire
+    )
+    if data and not is_demo:
+        return data, False
+
+    data = await sync_to_async(fetch_stock_data_yahoo, thread_sensitive=False)(
+        symbol, period, max_retries, acquire
+    )
+    if data:
+        return data, False
+
+    if not allow_demo:
+        print(f"⚠️  No real data retrieved for {symbol}")
+        return None, True
+    print(f"⚠️  Yahoo Finance API failed, generating DEMO data for {symbol}")
+    return generate_demo_stock_data(symbol, period), True
+
+
+async def afetch_stocks_data(
+    symbols,
+    period="1y",
+    use_demo=False,
+    concurrency=None,
+    allow_demo=True,
+    acquire=None,
+    periods=None,
+):
+    """
+    複数銘柄の株価データを並行して取得（同時リクエスト数はPROVIDER_CONCURRENCYまで）
+    {シンボル: (data, is_demo)}を返す
+    acquire: acquire(symbol)がデータ提供元を1回呼び出すごとに呼ばれる（afetch_stock_dataを参照）
+    periods: {シンボル: 取得期間}（含まれない銘柄はperiod）
+    """
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency or settings.PROVIDER_CONCURRENCY)
+
+    async with httpx.AsyncClient(timeout=10) as client:
+
+        async def fetch(symbol):
+            async with semaphore:
+                return await afetch_stock_data(
+                    symbol,
+                    (periods or {}).get(symbol, period),
+                    use_demo=use_demo,
+                    client=client,
+                    allow_demo=allow_demo,
+                    acquire=acquire and (lambda: acquire(symbol)),
+                )
+
+        results = await asyncio.gather(*(fetch(symbol) for symbol in symbols))
+    return dict(zip(symbols, results))
+
+
+def fetch_stock_data_yahoo(symbol, period="1y", max_retries=3, acquire=None):
+    """
+    Yahoo Financeから株価データを取得（レート制限時は期間を短くして再試行。取得できなければNone）
+    acquire: 試行ごとに呼ぶ関数（Falseを返した場合は再試行をやめる。リクエスト数の上限用）
+    """
+    import requests
+
+    print("2️⃣ Trying Yahoo Finance API...")
+
+    # 日本株の場合は.Tを追加（数字のみの場合）
+    yahoo_symbol = yahoo_symbol_for(symbol)
+
+    print(f"Yahoo symbol: {yahoo_symbol}")
+
+    for attempt in range(max_retries):
+        if acquire is not None and not acquire():
+            print(f"Provider request budget exhausted for {symbol}")
+            break
+        count("yahoo_attempts")
+        try:
+            if attempt > 0:
+                wait_time = min(15, 5**attempt)  # さらに長い待機時間
+                print(f"Waiting {wait_time} seconds before retry {attempt + 1}...")
+                time.sleep(wait_time)
+
+            # yfinanceの設定を最適化
+            stock = yahoo_ticker(yahoo_symbol)
+
+            # より短い期間で試す（レート制限回避）
+            if period == "1y" and attempt > 0:
+                test_period = "3mo"
+            elif period in ["1y", "3mo"] and attempt > 1:
+                test_period = "1mo"
+            else:
+                test_period = period
+
+            print(f"Attempting Yahoo Finance with period: {test_period}")
+
+            # historyメソッドの呼び出し（タイムアウト設定）
+            with stage("yahoo", period=test_period), provider_call("yahoo") as call:
+                hist = stock.history(
+                    period=test_period,
+                    timeout=10,
+                    prepost=False,
+                    auto_adjust=True,
+                    back_adjust=False,
+                    repair=True,
+                )
+                if hist.empty:
+                    call.status = "empty"
+
+            print(f"Retrieved {len(hist)} records for {yahoo_symbol}")
+
+            if hist.empty:
+                print(f"No data found for {yahoo_symbol} with period {test_period}")
+                if attempt < max_retries - 1:
+                    continue  # リトライ
+                break  # 最後の試行でもデータが空の場合、デモデータ生成へ
+
+            # データフレームを辞書のリストに変換
+            data = history_to_records(hist)
+
+            print(f"✅ Successfully processed {len(data)} REAL records for {symbol}")
+            annotate(provider="yahoo", records=len(data))
+            return data
+
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 429:  # Too Many Requests
+                count("rate_limited")
+                print(f"Rate limit exceeded (attempt {attempt + 1}/{max_retries})")
+                if attempt < max_retries - 1:
+                    continue  # リトライ
+                else:
+                    print(f"Failed after {max_retries} attempts due to rate limiting")
+                    break  # ループを抜けてデモデータ生成へ
+            else:
+                print(f"HTTP Error {e.response.status_code}: {e}")
+                break  # ループを抜けてデモデータ生成へ
+        except Exception as e:
+            print(f"Error fetching data for {symbol} (attempt {attempt + 1}): {e}")
+            if attempt == max_retries - 1:  # 最後の試行
+                break  # ループを抜けてデモデータ生成へ
+            continue  # リトライ
+
+    return None
+
+
+def yahoo_symbol_for(symbol):
+    """
+    Yahoo Financeのシンボル（日本株は数字のみの場合に.Tを追加）
+    """
+    return f"{symbol}.T" if symbol.isdigit() else symbol
+
+
+def yahoo_ticker(yahoo_symbol):
+    """
+    ブラウザ相当のヘッダーを設定したyfinanceのTicker
+    """
+    import requests
+    import yfinance as yf
+
+    stock = yf.Ticker(yahoo_symbol)
+    stock._session = requests.Session()
+    stock._session.headers.update(
+        {
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.5",
+            "Accept-Encoding": "gzip, deflate, br",
+            "DNT": "1",
+            "Connection": "keep-alive",
+            "Upgrade-Insecure-Requests": "1",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "none",
+        }
+    )
+    return stock
+
+
+def history_to_records(hist):
+    """
+    yfinanceの履歴DataFrameを株価データの辞書のリストに変換
+    """
+    import pandas as pd
+
+    data = []
+    for date, row in hist.iterrows():
+        try:
+            # NaNや無効な値をスキップ
+            if pd.isna(row["Close"]) or row["Close"] <= 0:
+                continue
+
+            data.append(
+                {
+                    "date": date.date(),
+                    "open": (
+                        float(row["Open"])
+                        if not pd.isna(row["Open"])
+                        else float(row["Close"])
+                    ),
+                    "high": (
+                        float(row["High"])
+                        if not pd.isna(row["High"])
+                        else float(row["Close"])
+                    ),
+                    "low": (
+                        float(row["Low"])
+                        if not pd.isna(row["Low"])
+                        else float(row["Close"])
+                    ),
+                    "close": float(row["Close"]),
+                    "volume": (int(row["Volume"]) if not pd.isna(row["Volume"]) else 0),
+                }
+            )
+        except (ValueError, TypeError) as e:
+            print(f"Error processing row for {date}: {e}")
+            continue
+    return data
+
+
+def fetch_stock_data_range(symbol, start_date, end_date):
+    """
+    指定期間（両端を含む）の株価データをYahoo Financeから取得（欠損の補完用）
+    取得できなかった場合はNoneを返す（デモデータは生成しない）
+    """
+    yahoo_symbol = yahoo_symbol_for(symbol)
+    try:
+        with provider_call("yahoo") as call:
+            hist = yahoo_ticker(yahoo_symbol).history(
+                start=start_date,
+                end=end_date + timedelta(days=1),
+                timeout=10,
+                prepost=False,
+                auto_adjust=True,
+                back_adjust=False,
+                repair=True,
+            )
+            if hist.empty:
+                call.status = "empty"
+    except Exception as e:
+        print(f"Error fetching {yahoo_symbol} from {start_date} to {end_date}: {e}")
+        return None
+
+    if hist.empty:
+        print(f"No data found for {yahoo_symbol} from {start_date} to {end_date}")
+        return None
+    return history_to_records(hist)
+
+
+def generate_demo_stock_data(symbol, period="1y"):
+    """
+    デモ用の株価データを生成
+    """
+    # 期間の設定
+    if period == "1d":
+        days = 1
+    elif period == "5d":
+        days = 5
+    elif period == "1mo":
+        days = 30
+    elif period == "3mo":
+        days = 90
+    elif period == "6mo":
+        days = 180
+    else:  # 1y or other
+        days = 365
+
+    # 基準価格の設定（銘柄別）
+    base_prices = {
+        "7203": 2800,  # トヨタ自動車
+        "9984": 6000,  # ソフトバンクグループ
+        "6758": 1200,  # ソニーグループ
+        "7974": 9000,  # 任天堂
+        "4063": 12000,  # 信越化学工業
+    }
+
+    base_price = base_prices.get(symbol, 3000)  # デフォルト価格
+
+    data = []
+    current_price = base_price
+
+    # 銘柄の市場の取引日のみ生成
+    today = datetime.now().date()
+    sessions = trading_days(
+        exchange_for_symbol(symbol), today - timedelta(days=days - 1), today
+    )
+
+    for session in sessions:
+        date = session.astype(object)
+
+        # ランダムな価格変動（±3%以内）
+        daily_change = random.uniform(-0.03, 0.03)
+        current_price = current_price * (1 + daily_change)
+
+        # 日中の変動を模擬
+        day_high = current_price * random.uniform(1.0, 1.02)
+        day_low = current_price * random.uniform(0.98, 1.0)
+        open_price = current_price * random.uniform(0.99, 1.01)
+
+        # 出来高（百万株単位）
+        volume = random.randint(1000000, 10000000)
+
+        data.append(
+            {
+                "date": date,
+                "open": round(open_price, 2),
+                "high": round(day_high, 2),
+                "low": round(day_low, 2),
+                "close": round(current_price, 2),
+                "volume": volume,
+            }
+        )
+
+    print(f"Generated {len(data)} demo records for {symbol}")
+    return data
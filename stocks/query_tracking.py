@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# 実行されたSQLを通知する関数（sql, params, 所要時間ms）のタプル
+# ContextVarはsync_to_asyncで実行されるスレッドにも引き継がれるため、
+# ASGIで非同期ビューからスレッド上のORMを呼び出した場合もSQLを記録できる
+_observers = ContextVar("stocks_query_observers", default=())
+
+
+def _notify_observers(execute, sql, params, many, context):
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for observer in observers:
+            observer(sql, params, elapsed_ms)
+
+
+def install(connection):
+    """
+    接続にSQLの通知用のラッパーを追加（接続はスレッドごとにあるため、接続時にも追加する）
+    execute_wrapperは終了時に末尾のラッパーを取り除くため、先頭に追加して順序を崩さない
+    """
+    if _notify_observers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _notify_observers)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    このコンテキストで実行されたSQLをobserver(sql, params, elapsed_ms)に通知
+    """
+    for connection in connections.all():
+        install(connection)
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
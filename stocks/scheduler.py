@@ -0,0 +1,292 @@
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max
+from django.utils import timezone
+
+from asgiref.sync import async_to_sync
+
+from .db_router import without_pinning
+from .models import Stock
+from .providers import afetch_stocks_data, period_since
+from .single_flight import refresh_stock_prices
+from .trading_calendar import (
+    add_sessions,
+    last_closed_session,
+    session_close,
+    sessions_between,
+)
+
+# 優先度の重み（遅れている取引日数・閲覧の多さ・取引終了直後）
+LAG_WEIGHT = 10.0
+POPULARITY_WEIGHT = 3.0
+JUST_CLOSED_BONUS = 5.0
+# 取引終了からこの時間以内は優先度を上げる（確定した日足を早く取り込む）
+JUST_CLOSED_HOURS = 3
+# 閲覧数の重みが半分になるまでの時間（最後の閲覧から）
+POPULARITY_HALF_LIFE_HOURS = 72
+# 株価が1件もない銘柄の遅れとして扱う取引日数（遅れの上限）
+MAX_LAG_SESSIONS = 20
+# 更新に失敗した銘柄の再試行までの間隔（分、失敗が続くごとに延ばす）
+RETRY_BACKOFF_MINUTES = [5, 15, 60, 240]
+# 取得できたが新しい足がまだない銘柄（取引終了直後など）を再び取得するまでの間隔（分、失敗としては数えない）
+NO_NEW_BARS_RETRY_MINUTES = 5
+
+
+def record_stock_view(stock_obj):
+    """
+    銘柄の閲覧を記録（スケジューラの優先度に使用）
+    """
+    # 閲覧数の加算では詳細画面の読み取りをプライマリに固定しない
+    with without_pinning():
+        Stock.objects.filter(pk=stock_obj.pk).update(
+            view_count=F("view_count") + 1, last_viewed_at=timezone.now()
+        )
+
+
+def popularity(view_count, last_viewed_at, now):
+    """
+    閲覧数の対数を最後の閲覧からの経過時間で減衰させた人気度
+    """
+    if not view_count or last_viewed_at is None:
+        return 0.0
+    hours = max((now - last_viewed_at).total_seconds() / 3600, 0)
+    return math.log1p(view_count) * 0.5 ** (hours / POPULARITY_HALF_LIFE_HOURS)
+
+
+def build_refresh_queue(now=None, stocks=None):
+    """
+    全銘柄の株価の遅れ（確定済みの取引日のうち未取得の日数）と優先度を計算
+    遅れのある銘柄を優先度の高い順に返す（市場ごとの取引時間・休場日を考慮）
+    """
+    now = now or timezone.now()
+    stocks = (stocks if stocks is not None else Stock.objects.all()).annotate(
+        latest_date=Max("prices__date")
+    )
+
+    queue = []
+    for stock in stocks:
+        due = last_closed_session(stock.exchange, now)
+        if stock.latest_date is None:
+            lag, first_missing = MAX_LAG_SESSIONS, due
+        else:
+            lag = min(
+                sessions_between(stock.exchange, stock.latest_date, due),
+                MAX_LAG_SESSIONS,
+            )
+            first_missing = add_sessions(stock.exchange, stock.latest_date, 1)
+        if lag <= 0:
+            continue
+
+        score = popularity(stock.view_count, stock.last_viewed_at, now)
+        just_closed = now - session_close(stock.exchange, due) < timedelta(
+            hours=JUST_CLOSED_HOURS
+        )
+        # 未取得の最初の取引日の取引終了からの経過時間
+        lag_hours = (now - session_close(stock.exchange, first_missing)).total_seconds()
+        priority = (
+            LAG_WEIGHT * lag
+            + POPULARITY_WEIGHT * score
+            + (JUST_CLOSED_BONUS if just_closed else 0.0)
+        )
+        queue.append(
+            {
+                "stock": stock,
+                "symbol": stock.symbol,
+                "exchange": stock.exchange,
+                "latest_date": stock.latest_date,
+                "due_session": due,
+                "lag_sessions": lag,
+                "first_missing": first_missing,
+                "lag_hours": round(lag_hours / 3600, 1),
+                "popularity": round(score, 3),
+                "priority": round(priority, 3),
+            }
+        )
+
+    queue.sort(key=lambda item: (-item["priority"], item["symbol"]))
+    return queue
+
+
+def queue_status(queue):
+    """
+    キューの深さと遅れの集計
+    """
+    return {
+        "queue_depth": len(queue),
+        "max_lag_sessions": max((item["lag_sessions"] for item in queue), default=0),
+        "total_lag_sessions": sum(item["lag_sessions"] for item in queue),
+        "max_lag_hours": max((item["lag_hours"] for item in queue), default=0),
+    }
+
+
+class ProviderBudget:
+    """
+    データ提供元へのリクエスト数の上限（1分あたりのトークンバケットと1日あたりの上限）
+    データ提供元を1回呼び出すごとに1トークン使う（並行取得のスレッドからも呼ばれる）
+    """
+
+    def __init__(self, per_minute, per_day):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.tokens = float(per_minute)
+        self.refilled_at = time.monotonic()
+        self.day = timezone.now().date()
+        self.used_today = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.per_minute,
+            self.tokens + (now - self.refilled_at) * self.per_minute / 60,
+        )
+        self.refilled_at = now
+
+        today = timezone.now().date()
+        if today != self.day:
+            self.day, self.used_today = today, 0
+
+    def available(self):
+        """
+        今すぐ使えるトークン数（消費しない）
+        """
+        with self._lock:
+            self._refill()
+            return max(min(int(self.tokens), self.per_day - self.used_today), 0)
+
+    def try_acquire(self):
+        with self._lock:
+            self._refill()
+            if self.tokens < 1 or self.used_today >= self.per_day:
+                return False
+            self.tokens -= 1
+            self.used_today += 1
+            return True
+
+    @property
+    def remaining_today(self):
+        return max(self.per_day - self.used_today, 0)
+
+
+class RefreshScheduler:
+    """
+    優先度付きキューから株価の更新を実行する（run_schedulerコマンドから使用）
+    更新はsingle_flight経由で行うため、画面からの更新と同時に走っても取得は1回になる
+    """
+
+    def __init__(self, per_minute=None, per_day=None):
+        self.budget = ProviderBudget(
+            per_minute or settings.SCHEDULER_REQUESTS_PER_MINUTE,
+            per_day or settings.SCHEDULER_DAILY_BUDGET,
+        )
+        # 銘柄ID -> (連続失敗回数, 次に再試行できる時刻)
+        self.backoff = {}
+        self.dispatched = 0
+        self.failed = 0
+
+    def tick(self, dry_run=False):
+        """
+        キューを作り直し、上限の範囲内で優先度の高い銘柄から更新
+        """
+        now = timezone.now()
+        queue = build_refresh_queue(now)
+        status = queue_status(queue)
+
+        # 1銘柄につき少なくとも1回は呼び出すため、使えるトークン数までの銘柄を取得する
+        # （実際のトークンは再試行を含めてデータ提供元を呼び出すごとに使う）
+        limit = None if dry_run else self.budget.available()
+        batch = []
+        for item in queue:
+            failures, retry_at = self.backoff.get(item["stock"].id, (0, None))
+            if retry_at is not None and retry_at > now:
+                continue
+            if limit is not None and len(batch) >= limit:
+                break
+            batch.append((item, failures))
+
+        refreshed = [item["symbol"] for item, _ in batch]
+        if not dry_run and batch:
+            # 上限の範囲内の銘柄はまとめて並行に取得し、保存は銘柄ごとに行う
+            # バックグラウンドの更新ではデモデータに切り替えない（実在の銘柄に架空の株価を保存しない）
+            denied = set()
+
+            def acquire(symbol):
+                if self.budget.try_acquire():
+                    return True
+                denied.add(symbol)
+                return False
+
+            # 株価のない銘柄は1年分、それ以外は未取得の最初の取引日から取得する
+            periods = {
+                item["symbol"]: period_since(item["first_missing"], now.date())
+                for item, _ in batch
+                if item["latest_date"] is not None
+            }
+            prefetched = async_to_sync(afetch_stocks_data)(
+                refreshed, allow_demo=False, acquire=acquire, periods=periods
+            )
+            saved = 0
+            for item, failures in batch:
+                data, is_demo = prefetched[item["symbol"]]
+                if not data and item["symbol"] in denied:
+                    # 上限に達して取得できなかった銘柄は失敗として扱わず、次回に回す
+                    continue
+                saved += self._refresh(item["stock"], failures, (data, is_demo))
+            if saved and settings.ML_USE_MARKET_FACTORS:
+                # 新しい足の分の市場ファクターを取り込み側で計算しておく（予想は読むだけ）
+                from .market_factors import refresh_market_factors
+
+                refresh_market_factors()
+            refreshed = [
+                symbol
+                for symbol in refreshed
+                if symbol not in denied or prefetched[symbol][0]
+            ]
+
+        status.update(
+            {
+                "refreshed": refreshed,
+                "backing_off": sum(
+                    1 for _, retry_at in self.backoff.values() if retry_at > now
+                ),
+                "dispatched_total": self.dispatched,
+                "failed_total": self.failed,
+                "budget_remaining_today": self.budget.remaining_today,
+            }
+        )
+        return status
+
+    def _refresh(self, stock, failures, prefetched):
+        """
+        取得済みのデータを保存し、取得できなかった銘柄は間隔を延ばしながら再試行
+        取得できて新しい足がなかった銘柄（休場日・取引終了直後など）は失敗として数えない
+        デモデータは保存しない（get_or_createのため、後から実際の株価で上書きされない）
+        保存した足の本数を返す
+        """
+        data, is_demo = prefetched
+        self.dispatched += 1
+        if data and not is_demo:
+            # 市場ファクターはtickの最後にまとめて更新する
+            updated, _ = refresh_stock_prices(
+                stock, prefetched=prefetched, refresh_factors=False
+            )
+            if updated:
+                self.backoff.pop(stock.id, None)
+            else:
+                self.backoff[stock.id] = (
+                    0,
+                    timezone.now() + timedelta(minutes=NO_NEW_BARS_RETRY_MINUTES),
+                )
+            return updated
+
+        self.failed += 1
+        delay = RETRY_BACKOFF_MINUTES[min(failures, len(RETRY_BACKOFF_MINUTES) - 1)]
+        self.backoff[stock.id] = (
+            failures + 1,
+            timezone.now() + timedelta(minutes=delay),
+        )
+        return 0
@@ -0,0 +1,124 @@
+from django.db.models import F
+
+from .models import LatestIndicator, Stock, StockFeature
+
+# スクリーナーで条件・並び替えに使える列（列名 -> 表示名）
+SCREENER_FIELDS = {
+    "close": "終値",
+    "rsi": "RSI",
+    "ma20_gap": "20日移動平均乖離率",
+    "volume_ratio": "出来高比率",
+    "price_change_1d": "1日変化率",
+    "price_change_5d": "5日変化率",
+    "volatility": "ボラティリティ",
+    "macd": "MACD",
+    "bb_position": "ボリンジャーバンド位置",
+}
+SCREENER_OPERATORS = ["lt", "lte", "gt", "gte"]
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+INDICATOR_COLUMNS = [
+    "date",
+    "close",
+    "ma_5",
+    "ma_20",
+    "rsi",
+    "macd",
+    "volatility",
+    "price_change_1d",
+    "price_change_5d",
+    "volume_ratio",
+    "bb_position",
+]
+
+
+def refresh_latest_indicator(stock_obj):
+    """
+    特徴量ストアの最終行から銘柄の最新指標を更新（特徴量の保存時に呼ばれる）
+    """
+    latest = (
+        StockFeature.objects.filter(stock=stock_obj)
+        .order_by("-date")
+        .values(*INDICATOR_COLUMNS)
+        .first()
+    )
+    if latest is None:
+        LatestIndicator.objects.filter(stock=stock_obj).delete()
+        return None
+
+    latest["ma20_gap"] = latest["close"] / latest["ma_20"] - 1
+    indicator, _ = LatestIndicator.objects.update_or_create(
+        stock=stock_obj, defaults=latest
+    )
+    return indicator
+
+
+def rebuild_latest_indicators():
+    """
+    全銘柄の最新指標を作り直す
+    """
+    count = 0
+    for stock in Stock.objects.all():
+        if refresh_latest_indicator(stock) is not None:
+            count += 1
+    return count
+
+
+def parse_screener_query(params):
+    """
+    「列名__演算子=値」形式のパラメータをスクリーナーの条件に変換
+    例: rsi__lt=30&ma20_gap__gt=0&volume_ratio__gt=2&sort=-volume_ratio&limit=50
+    不正な列名・演算子・値の場合はValueErrorを送出する
+    「列名__演算子」の形でないパラメータ（_profile・utm_source・キャッシュ回避用など）は無視する
+    """
+    filters = {}
+    for key, value in params.items():
+        if "__" not in key or key.startswith("_") or value in ("", None):
+            continue
+        field, _, operator = key.partition("__")
+        if field not in SCREENER_FIELDS or operator not in SCREENER_OPERATORS:
+            raise ValueError(f"Unknown screener condition: {key}")
+        try:
+            filters[f"{field}__{operator}"] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for {key}: {value}")
+
+    sort = params.get("sort") or "symbol"
+    if sort.lstrip("-") not in list(SCREENER_FIELDS) + ["symbol"]:
+        raise ValueError(f"Unknown sort field: {sort}")
+
+    try:
+        limit = int(params.get("limit") or DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError(f"Invalid limit: {params.get('limit')}")
+
+    return {"filters": filters, "sort": sort, "limit": max(1, min(limit, MAX_LIMIT))}
+
+
+def _screener_queryset(filters, sort, limit):
+    order = sort.replace("symbol", "stock__symbol")
+    return (
+        LatestIndicator.objects.filter(**filters)
+        .order_by(order, "stock__symbol")
+        .values(
+            "date",
+            *SCREENER_FIELDS,
+            symbol=F("stock__symbol"),
+            name=F("stock__name"),
+        )[:limit]
+    )
+
+
+def run_screener(filters, sort="symbol", limit=DEFAULT_LIMIT):
+    """
+    最新指標テーブルに対して条件・並び替え・件数制限をSQLで実行
+    """
+    return list(_screener_queryset(filters, sort, limit))
+
+
+async def arun_screener(filters, sort="symbol", limit=DEFAULT_LIMIT):
+    """
+    run_screenerの非同期版（非同期ビュー用）
+    """
+    return [row async for row in _screener_queryset(filters, sort, limit)]
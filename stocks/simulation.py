@@ -0,0 +1,97 @@
+import numpy as np
+
+# 予測区間として保存する分位点（5%・25%・中央値・75%・95%）
+BAND_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+SIMULATION_METHODS = ["bootstrap", "gbm"]
+
+
+def log_returns(closes):
+    """
+    終値の配列から対数リターンを計算
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    return np.diff(np.log(closes))
+
+
+def simulate_price_paths(
+    current_price,
+    returns,
+    days,
+    n_paths=10000,
+    method="bootstrap",
+    drift=None,
+    seed=None,
+):
+    """
+    将来の価格パスをまとめて生成（n_paths × daysの配列）
+    returns: 校正に使う直近の対数リターン
+    method: "bootstrap"（過去のリターンの残差を復元抽出）または"gbm"（幾何ブラウン運動）
+    drift: 1日あたりの対数リターンの中心（省略時は過去の平均）
+    どちらの方法も対数リターンの中心をdriftにそろえるため、パスの中央値はcurrent_price×exp(drift×日数)になる
+    """
+    if method not in SIMULATION_METHODS:
+        raise ValueError(f"Unknown simulation method: {method}")
+    if not (np.isfinite(current_price) and current_price > 0):
+        raise ValueError(f"Current price must be positive: {current_price}")
+
+    returns = np.asarray(returns, dtype=np.float64)
+    returns = returns[np.isfinite(returns)]
+    if len(returns) < 2:
+        raise ValueError("At least 2 returns are required for simulation")
+
+    mean = returns.mean()
+    drift = mean if drift is None else drift
+    if not np.isfinite(drift):
+        raise ValueError(f"Drift must be finite: {drift}")
+    rng = np.random.default_rng(seed)
+
+    if method == "bootstrap":
+        # 平均を除いた残差を復元抽出し、期待値をdriftに置き換える
+        residuals = returns - mean
+        steps = residuals[rng.integers(0, len(residuals), size=(n_paths, days))]
+        steps += drift
+    else:
+        sigma = returns.std(ddof=1)
+        # 正規分布は平均と中央値が同じため、bootstrapと同じく中央値をdriftに合わせる
+        # （期待値を合わせる-0.5σ²の補正はしない）
+        steps = rng.normal(drift, sigma, size=(n_paths, days))
+
+    np.cumsum(steps, axis=1, out=steps)
+    np.exp(steps, out=steps)
+    steps *= current_price
+    return steps
+
+
+def quantile_bands(paths, quantiles=BAND_QUANTILES):
+    """
+    価格パスから日ごとの分位点を計算（len(quantiles) × daysの配列）
+    """
+    return np.quantile(paths, quantiles, axis=0)
+
+
+def simulate_bands(
+    current_price,
+    returns,
+    days,
+    n_paths=10000,
+    method="bootstrap",
+    drift=None,
+    seed=None,
+):
+    """
+    価格パスを生成して、1日目からdays日目までの分位点を辞書のリストで返す
+    """
+    paths = simulate_price_paths(
+        current_price, returns, days, n_paths, method, drift, seed
+    )
+    bands = quantile_bands(paths)
+    return [
+        {
+            "horizon": day + 1,
+            **{
+                f"p{round(q * 100)}": float(bands[i, day])
+                for i, q in enumerate(BAND_QUANTILES)
+            },
+        }
+        for day in range(days)
+    ]
@@ -0,0 +1,152 @@
+import pickle
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models.functions import Now
+
+from .models import SingleFlight
+
+# sqliteなどアドバイザリロックのないDB向けのプロセス内ロック
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+# 実行中の処理の完了を確認する間隔（秒）
+POLL_INTERVAL = 0.2
+# 完了しないまま残った実行中の印（プロセスの異常終了など）を無視して引き継ぐまでの時間
+STALE_AFTER = timedelta(minutes=10)
+
+
+@contextmanager
+def _flight_lock(task, stock_obj):
+    """
+    銘柄・処理ごとの排他ロック（複数プロセス・ホストの間でも1つだけが取得できる）
+    実行中の印の確認・更新だけを囲む短いトランザクションで使い、終了時に解放する
+    PostgreSQLはトランザクション単位のアドバイザリロック（PgBouncerのトランザクションプーリングでも使える）、
+    それ以外はロック行のSELECT FOR UPDATE
+    """
+    if connection.vendor == "sqlite":
+        # sqliteは行ロックがないため同一プロセス内の排他のみ
+        with _local_locks_guard:
+            lock = _local_locks.setdefault((task, stock_obj.id), threading.Lock())
+        with lock, transaction.atomic():
+            yield
+        return
+
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            key = (zlib.crc32(task.encode()) & 0x7FFFFFFF, stock_obj.id)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", key)
+        else:
+            SingleFlight.objects.select_for_update().get(stock=stock_obj, task=task)
+        yield
+
+
+def _claim(task, stock_obj, pk, requested_generation):
+    """
+    呼び出し後に完了した処理があれば("joined", 結果)、実行中の処理があれば("wait", None)、
+    どちらもなければ実行中の印を付けて("run", None)を返す
+    時刻の比較はDBの時計（Now()）で行い、ホスト間の時計のずれに影響されない
+    """
+    with _flight_lock(task, stock_obj):
+        # 書き込み用のクエリセットでプライマリから読み直す
+        flight = SingleFlight.objects.select_for_update().get(pk=pk)
+        if flight.generation > requested_generation and flight.result is not None:
+            return "joined", pickle.loads(flight.result)
+
+        running = flight.started_at is not None and flight.finished_at is None
+        if (
+            running
+            and not SingleFlight.objects.filter(
+                pk=pk, started_at__lt=Now() - STALE_AFTER
+            ).exists()
+        ):
+            return "wait", None
+
+        SingleFlight.objects.filter(pk=pk).update(started_at=Now(), finished_at=None)
+        return "run", None
+
+
+def _finish(task, stock_obj, pk, result=None, failed=False):
+    """
+    実行中の印を外して結果を保存し、完了回数を増やす（失敗した場合は印を外すだけ）
+    """
+    with _flight_lock(task, stock_obj):
+        if failed:
+            SingleFlight.objects.filter(pk=pk).update(finished_at=Now())
+            return
+        flight = SingleFlight.objects.select_for_update().get(pk=pk)
+        flight.finished_at = Now()
+        flight.result = pickle.dumps(result)
+        flight.generation += 1
+        flight.save(update_fields=["finished_at", "result", "generation"])
+
+
+def single_flight(task, stock_obj, func, *args, **kwargs):
+    """
+    同じ銘柄・処理の同時実行を1回にまとめる
+    実行中の処理があれば完了を待ち、呼び出し後に完了していればその結果を返す
+    （待っていた呼び出しは処理を繰り返さず、同じ結果を受け取る）
+    funcはトランザクション・ロックの外で実行し（取得・学習の間に接続やロックを保持しない）、
+    funcの書き込みがコミットされた後に完了回数を増やして待っている呼び出しに知らせる
+    """
+    # 呼び出し時点の完了回数。待つ間に増えていれば、実行中だった処理の結果を共有する
+    flight, _ = SingleFlight.objects.get_or_create(stock=stock_obj, task=task)
+    requested_generation = flight.generation
+    while True:
+        state, result = _claim(task, stock_obj, flight.pk, requested_generation)
+        if state == "joined":
+            print(f"🤝 Joined in-flight {task} for {stock_obj.symbol}")
+            return result
+        if state == "run":
+            break
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        result = func(*args, **kwargs)
+    except BaseException:
+        # 失敗した場合は待っている呼び出しがそれぞれ実行する
+        _finish(task, stock_obj, flight.pk, failed=True)
+        raise
+    _finish(task, stock_obj, flight.pk, result)
+    return result
+
+
+def refresh_stock_prices(
+    stock_obj, use_demo=False, prefetched=None, refresh_factors=True
+):
+    """
+    株価の取得（同じ銘柄の同時更新は1回の取得にまとめる）
+    """
+    from .utils import update_stock_prices
+
+    return single_flight(
+        "refresh",
+        stock_obj,
+        update_stock_prices,
+        stock_obj,
+        use_demo=use_demo,
+        prefetched=prefetched,
+        refresh_factors=refresh_factors,
+    )
+
+
+def predict_stock(stock_obj, days_ahead=7, **kwargs):
+    """
+    予測の実行（同じ銘柄・同じ条件の同時実行は1回の予測にまとめる）
+    """
+    from .utils import simple_prediction
+
+    options = ",".join(f"{key}={value}" for key, value in sorted(kwargs.items()))
+    return single_flight(
+        f"predict:{days_ahead}:{options}",
+        stock_obj,
+        simple_prediction,
+        stock_obj,
+        days_ahead,
+        **kwargs,
+    )
@@ -0,0 +1,115 @@
+"""
+予測日を迎えた予想の採点のテスト
+実績価格の突き合わせ、実績がまだない予想・実績価格が0の予想の扱いを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from stocks.accuracy import score_matured_predictions
+from stocks.models import PredictionAccuracy, Stock, StockPrediction, StockPrice
+
+METHOD = "機械学習（Ridge）"
+
+
+class ScoreMaturedPredictionsTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol="ACC", name="Accuracy", exchange="US")
+
+    def create_price(self, day, close):
+        StockPrice.objects.create(
+            stock=self.stock,
+            date=day,
+            open_price=Decimal(close),
+            high_price=Decimal(close),
+            low_price=Decimal(close),
+            close_price=Decimal(close),
+            volume=1000,
+        )
+
+    def create_prediction(self, day, predicted, base="100", method=METHOD):
+        return StockPrediction.objects.create(
+            stock=self.stock,
+            prediction_date=day,
+            predicted_price=Decimal(predicted),
+            base_price=Decimal(base),
+            confidence=50.0,
+            method=method,
+            horizon=1,
+        )
+
+    def score(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return score_matured_predictions(self.stock)
+
+    def test_matured_predictions_are_scored(self):
+        # 2025-06-13（金）の実績と、6/14（土）の予想は次の営業日6/16の終値で採点する
+        self.create_price(date(2025, 6, 13), "110")
+        self.create_price(date(2025, 6, 16), "90")
+        friday = self.create_prediction(date(2025, 6, 13), "105")
+        saturday = self.create_prediction(date(2025, 6, 14), "108")
+
+        self.assertEqual(self.score(), 2)
+
+        friday.refresh_from_db()
+        self.assertEqual(friday.actual_price, Decimal("110"))
+        self.assertAlmostEqual(friday.abs_error, 5)
+        self.assertAlmostEqual(friday.abs_pct_error, 5 / 110 * 100)
+        self.assertTrue(friday.direction_hit)
+        saturday.refresh_from_db()
+        self.assertEqual(saturday.actual_price, Decimal("90"))
+        self.assertFalse(saturday.direction_hit)
+
+        accuracy = PredictionAccuracy.objects.get(stock=self.stock, method="機械学習")
+        self.assertEqual(accuracy.sample_count, 2)
+        self.assertEqual(accuracy.hit_rate, 50)
+
+    def test_predictions_without_actual_are_not_scored(self):
+        self.create_price(date(2025, 6, 13), "110")
+        pending = self.create_prediction(date(2025, 6, 17), "105")
+
+        self.assertEqual(self.score(), 0)
+
+        pending.refresh_from_db()
+        self.assertIsNone(pending.scored_at)
+        self.assertFalse(PredictionAccuracy.objects.exists())
+
+    def test_zero_actual_does_not_block_scoring(self):
+        self.create_price(date(2025, 6, 12), "0")
+        self.create_price(date(2025, 6, 13), "110")
+        zero = self.create_prediction(date(2025, 6, 12), "105")
+        self.create_prediction(date(2025, 6, 13), "121")
+
+        self.assertEqual(self.score(), 2)
+
+        zero.refresh_from_db()
+        self.assertIsNotNone(zero.scored_at)
+        self.assertAlmostEqual(zero.abs_error, 105)
+        self.assertIsNone(zero.abs_pct_error)
+        # 誤差率は実績価格が0の予想を除いて集計する
+        accuracy = PredictionAccuracy.objects.get(stock=self.stock, method="機械学習")
+        self.assertEqual(accuracy.sample_count, 2)
+        self.assertAlmostEqual(accuracy.mape, 10)
+
+    def test_method_variants_share_one_accuracy_row(self):
+        self.create_price(date(2025, 6, 13), "110")
+        self.create_price(date(2025, 6, 16), "90")
+        self.create_prediction(date(2025, 6, 13), "105", method="機械学習（Ridge）")
+        self.create_prediction(
+            date(2025, 6, 16), "95", method="機械学習（RandomForest(fast)）"
+        )
+        self.create_prediction(
+            date(2025, 6, 16), "95", method="改良移動平均（上昇トレンド）"
+        )
+
+        self.score()
+
+        self.assertEqual(
+            sorted(PredictionAccuracy.objects.values_list("method", "sample_count")),
+            [("改良移動平均", 1), ("機械学習", 2)],
+        )
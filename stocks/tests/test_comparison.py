@@ -0,0 +1,127 @@
+"""
+銘柄比較のテスト
+最新の足より前の日付の書き込み（補完・修正）でもキャッシュが無効化されること、
+期間の途中から株価がある銘柄の扱いと、APIのパラメータの検証を確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+import numpy as np
+import pandas as pd
+
+from stocks.comparison import compare_closes, compare_stocks
+from stocks.models import StockPrice
+from stocks.page_cache import invalidate_stocks
+
+from .test_view_budgets import seed_dataset
+
+
+class CompareStocksCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.symbols = seed_dataset(2, 80)
+
+    def setUp(self):
+        cache.clear()
+        self.older = (
+            StockPrice.objects.filter(stock__symbol=self.symbols[0])
+            .order_by("date")
+            .select_related("stock")[10]
+        )
+
+    def test_correcting_an_older_bar_invalidates(self):
+        before = compare_stocks(self.symbols)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.older.close_price *= Decimal("1.5")
+            self.older.save()
+
+        self.assertNotEqual(compare_stocks(self.symbols), before)
+
+    def test_backfilling_an_older_bar_invalidates(self):
+        self.older.delete()
+        before = compare_stocks(self.symbols)
+
+        # 欠損の補完と同じくbulk_createで追加し、明示的に無効化する
+        self.older.pk = None
+        with self.captureOnCommitCallbacks(execute=True):
+            StockPrice.objects.bulk_create([self.older])
+            invalidate_stocks([self.older.stock_id])
+
+        # 欠けていた日は直前の終値で埋めていたため、補完した終値で結果が変わる
+        self.assertNotEqual(compare_stocks(self.symbols), before)
+
+    def test_unchanged_data_is_served_from_cache(self):
+        compare_stocks(self.symbols)
+        with self.assertNumQueries(1):
+            compare_stocks(self.symbols)
+
+
+class LateListingTests(SimpleTestCase):
+    def closes(self, starts):
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2025-01-01", periods=60, freq="B").date
+        closes = pd.DataFrame(
+            {
+                symbol: 100 * np.cumprod(1 + rng.normal(0, 0.01, len(index)))
+                for symbol in starts
+            },
+            index=index,
+        )
+        for symbol, start in starts.items():
+            closes.iloc[:start, closes.columns.get_loc(symbol)] = np.nan
+        return closes
+
+    def test_late_listed_stocks_are_excluded(self):
+        result = compare_closes(self.closes({"AAA": 0, "BBB": 1, "NEW": 40}))
+
+        self.assertEqual(result["symbols"], ["AAA", "BBB"])
+        self.assertEqual(len(result["dates"]), 58)
+        self.assertEqual(
+            result["excluded"], [{"symbol": "NEW", "first_date": "2025-02-26"}]
+        )
+
+    def test_pair_is_compared_from_the_later_start(self):
+        result = compare_closes(self.closes({"AAA": 0, "NEW": 40}))
+
+        self.assertEqual(result["symbols"], ["AAA", "NEW"])
+        self.assertEqual(len(result["dates"]), 19)
+        self.assertEqual(result["excluded"], [])
+
+
+class CompareApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.symbols = seed_dataset(2, 80)
+
+    def get(self, **params):
+        return self.client.get(reverse("stocks:compare_api"), params)
+
+    def test_unknown_symbols_are_listed(self):
+        response = self.get(symbols=",".join(self.symbols + ["NOPE", "GONE"]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["unknown_symbols"], ["NOPE", "GONE"])
+
+    def test_duplicate_symbols_count_once(self):
+        response = self.get(symbols=f"{self.symbols[0]},{self.symbols[0]}")
+        self.assertEqual(response.status_code, 400)
+
+    def test_days_and_window_are_clamped(self):
+        response = self.get(symbols=",".join(self.symbols), days=10**9, window=-3)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["beta_window"], 5)
+
+    def test_invalid_parameters_are_rejected(self):
+        response = self.get(symbols=",".join(self.symbols), days="1y")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,86 @@
+"""
+特徴量ストアのテスト
+新しい足の分だけ計算した特徴量が、全履歴からの再計算と一致することを確認する
+（ウォームアップ（FEATURE_WARMUP_BARS本）より長い履歴ではMACDのEWMの打ち切り誤差のみ）
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+import numpy as np
+
+from stocks.feature_store import (
+    FEATURE_WARMUP_BARS,
+    load_feature_frame,
+    rebuild_stock_features,
+    update_stock_features,
+)
+from stocks.models import Stock, StockPrice
+from stocks.trading_calendar import trading_days
+
+EXCHANGE = "US"
+SESSIONS = list(
+    trading_days(EXCHANGE, date(2023, 1, 3), date(2025, 6, 30)).astype(object)
+)
+
+
+class IncrementalFeatureTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(
+            symbol="FEAT", name="Feature", exchange=EXCHANGE
+        )
+        rng = np.random.default_rng(0)
+        self.closes = 1000 * np.cumprod(1 + rng.normal(0.0005, 0.015, len(SESSIONS)))
+        self.volumes = rng.integers(50_000, 150_000, len(SESSIONS))
+
+    def add_prices(self, start, end):
+        StockPrice.objects.bulk_create(
+            StockPrice(
+                stock=self.stock,
+                date=SESSIONS[i],
+                open_price=Decimal(f"{self.closes[i] * 0.995:.2f}"),
+                high_price=Decimal(f"{self.closes[i] * 1.01:.2f}"),
+                low_price=Decimal(f"{self.closes[i] * 0.99:.2f}"),
+                close_price=Decimal(f"{self.closes[i]:.2f}"),
+                volume=int(self.volumes[i]),
+            )
+            for i in range(start, end)
+        )
+
+    def assert_incremental_matches_rebuild(self, batches):
+        with contextlib.redirect_stdout(io.StringIO()):
+            previous = 0
+            for end in batches:
+                self.add_prices(previous, end)
+                update_stock_features(self.stock)
+                previous = end
+            incremental = load_feature_frame(self.stock)
+            rebuild_stock_features(self.stock)
+            rebuilt = load_feature_frame(self.stock)
+
+        self.assertEqual(len(incremental), len(rebuilt))
+        np.testing.assert_array_equal(incremental["date"], rebuilt["date"])
+        np.testing.assert_allclose(
+            incremental.drop(columns="date").to_numpy(),
+            rebuilt.drop(columns="date").to_numpy(),
+            rtol=1e-6,
+            atol=1e-8,
+        )
+
+    def test_updates_after_full_warmup(self):
+        # 最初の計算でウォームアップより長い履歴を保存し、以降は1本・数本ずつ追加する
+        first = FEATURE_WARMUP_BARS + 40
+        self.assert_incremental_matches_rebuild(
+            [first, first + 1, first + 5, first + 60, len(SESSIONS)]
+        )
+
+    def test_updates_across_warmup_boundary(self):
+        # ウォームアップの本数の前後をまたいで履歴が伸びていく場合
+        self.assert_incremental_matches_rebuild(
+            [40, 120, FEATURE_WARMUP_BARS - 1, FEATURE_WARMUP_BARS + 1, 400]
+        )
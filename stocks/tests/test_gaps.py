@@ -0,0 +1,147 @@
+"""
+株価データの欠損の検出・補完のテスト
+欠損の検出、実際に追加した件数、取得できない取引日を繰り返しリクエストしないことを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from stocks import gaps
+from stocks.gaps import MAX_BACKFILL_ATTEMPTS, backfill_gaps, scan_gaps
+from stocks.models import Stock, StockPrice
+from stocks.trading_calendar import trading_days
+
+EXCHANGE = "US"
+SESSIONS = list(
+    trading_days(EXCHANGE, date(2025, 3, 3), date(2025, 3, 31)).astype(object)
+)
+END_DATE = SESSIONS[-1]
+
+
+def record(day):
+    return {
+        "date": day,
+        "open": 100.0,
+        "high": 101.0,
+        "low": 99.0,
+        "close": 100.5,
+        "volume": 1000,
+    }
+
+
+def create_price(stock, day):
+    return StockPrice.objects.create(
+        stock=stock,
+        date=day,
+        open_price=Decimal("100"),
+        high_price=Decimal("100"),
+        low_price=Decimal("100"),
+        close_price=Decimal("100"),
+        volume=1000,
+    )
+
+
+@mock.patch.object(gaps, "REQUEST_INTERVAL", 0)
+@mock.patch("stocks.utils.process_new_prices")
+class GapTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol="GAP", name="Gap", exchange=EXCHANGE)
+        # 5本目〜7本目と12本目が欠損
+        self.missing = SESSIONS[4:7] + [SESSIONS[11]]
+        for day in SESSIONS:
+            if day not in self.missing:
+                create_price(self.stock, day)
+
+    def scan(self):
+        return scan_gaps([self.stock], end_date=END_DATE)[0]
+
+    def backfill(self, fetch):
+        with (
+            contextlib.redirect_stdout(io.StringIO()),
+            mock.patch(
+                "stocks.providers.fetch_stock_data_range", side_effect=fetch
+            ) as fetcher,
+        ):
+            result = backfill_gaps(self.stock, self.scan())
+        return result, fetcher
+
+    def test_gaps_are_detected(self, process):
+        report = self.scan()
+
+        self.assertEqual(report["expected_sessions"], len(SESSIONS))
+        self.assertEqual(report["missing_sessions"], 4)
+        self.assertEqual(
+            [(gap["start"], gap["end"]) for gap in report["gaps"]],
+            [(SESSIONS[4], SESSIONS[6]), (SESSIONS[11], SESSIONS[11])],
+        )
+
+    def test_extra_bars_do_not_hide_missing_sessions(self, process):
+        # 欠損と同じ数の土日の足があっても、件数の一致で欠損なしとみなさない
+        for day in [
+            date(2025, 3, 8),
+            date(2025, 3, 9),
+            date(2025, 3, 15),
+            date(2025, 3, 16),
+        ]:
+            create_price(self.stock, day)
+
+        report = self.scan()
+
+        self.assertEqual(report["bars"], report["expected_sessions"])
+        self.assertEqual(report["missing_sessions"], 4)
+        self.assertEqual(report["extra_bars"], 4)
+
+    def test_holiday_bars_do_not_hide_missing_sessions(self, process):
+        stock = Stock.objects.create(symbol="7203", name="トヨタ", exchange="TSE")
+        sessions = list(trading_days("TSE", date(2025, 3, 3), END_DATE).astype(object))
+        for day in sessions[:5] + sessions[6:]:
+            create_price(stock, day)
+        create_price(stock, date(2025, 3, 20))  # 春分の日（東証の休場日）
+
+        report = scan_gaps([stock], end_date=END_DATE)[0]
+
+        self.assertEqual(report["bars"], report["expected_sessions"])
+        self.assertEqual(report["missing_sessions"], 1)
+        self.assertEqual(report["extra_bars"], 1)
+
+    def test_inserted_counts_only_new_rows(self, process):
+        def fetch(symbol, start, end):
+            # 既存の足と、取得中に別の処理が保存した欠損日の足も返す
+            create_price(self.stock, SESSIONS[5])
+            return [record(day) for day in SESSIONS if start <= day <= end]
+
+        result, _ = self.backfill(fetch)
+
+        self.assertEqual(result["inserted"], 3)
+        self.assertEqual(self.scan()["missing_sessions"], 0)
+        process.assert_called_once_with(self.stock, SESSIONS[4])
+
+    def test_unfillable_sessions_are_not_requested_forever(self, process):
+        def fetch(symbol, start, end):
+            # 12本目はデータ提供元にも足がない
+            return [
+                record(day)
+                for day in SESSIONS
+                if start <= day <= end and day != SESSIONS[11]
+            ]
+
+        result, _ = self.backfill(fetch)
+        self.assertEqual(result["inserted"], 3)
+
+        for _ in range(MAX_BACKFILL_ATTEMPTS - 1):
+            result, fetcher = self.backfill(fetch)
+            self.assertEqual(result["inserted"], 0)
+            self.assertEqual(fetcher.call_count, 1)
+
+        report = self.scan()
+        self.assertEqual(report["missing_sessions"], 0)
+        self.assertEqual(report["unfillable_sessions"], 1)
+        self.assertLess(report["coverage"], 100)
+        result, fetcher = self.backfill(fetch)
+        fetcher.assert_not_called()
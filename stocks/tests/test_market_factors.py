@@ -0,0 +1,91 @@
+"""
+市場ファクターのテスト
+休場日の異なる市場の銘柄を混ぜずに計算し、画面からの取り込みでも新しい足の分を計算することを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from stocks.market_factors import refresh_market_factors
+from stocks.models import MarketFactor, Stock, StockPrice
+from stocks.utils import update_stock_prices
+
+
+def create_prices(stock, closes):
+    for day, close in closes.items():
+        StockPrice.objects.create(
+            stock=stock,
+            date=day,
+            open_price=Decimal(close),
+            high_price=Decimal(close),
+            low_price=Decimal(close),
+            close_price=Decimal(close),
+            volume=1000,
+        )
+
+
+@override_settings(ML_USE_MARKET_FACTORS=True)
+class MarketFactorTests(TestCase):
+    def setUp(self):
+        self.tse = Stock.objects.create(symbol="7203", name="トヨタ", exchange="TSE")
+        self.us = Stock.objects.create(symbol="AAPL", name="Apple", exchange="US")
+
+    def test_factors_are_computed_per_exchange(self):
+        # 7/21（海の日）は東証のみ休場、7/4は米国のみ休場
+        create_prices(
+            self.tse,
+            {
+                date(2025, 7, 3): "100",
+                date(2025, 7, 4): "110",
+                date(2025, 7, 18): "110",
+                date(2025, 7, 22): "121",
+            },
+        )
+        create_prices(
+            self.us,
+            {
+                date(2025, 7, 3): "200",
+                date(2025, 7, 7): "220",
+                date(2025, 7, 18): "220",
+                date(2025, 7, 21): "198",
+                date(2025, 7, 22): "198",
+            },
+        )
+
+        refresh_market_factors(full=True)
+
+        factors = {
+            (factor.exchange, factor.date): factor
+            for factor in MarketFactor.objects.filter(sector="")
+        }
+        # 他の市場の休場日をまたいでもリターンが欠けない
+        self.assertAlmostEqual(factors["TSE", date(2025, 7, 4)].market_return, 0.1)
+        self.assertAlmostEqual(factors["TSE", date(2025, 7, 22)].market_return, 0.1)
+        self.assertAlmostEqual(factors["US", date(2025, 7, 7)].market_return, 0.1)
+        self.assertAlmostEqual(factors["US", date(2025, 7, 21)].market_return, -0.1)
+        self.assertNotIn(("TSE", date(2025, 7, 21)), factors)
+        self.assertNotIn(("US", date(2025, 7, 4)), factors)
+        self.assertEqual(factors["US", date(2025, 7, 22)].member_count, 1)
+
+    def test_interactive_ingest_refreshes_factors(self):
+        create_prices(self.us, {date(2025, 7, 17): "200", date(2025, 7, 18): "200"})
+        refresh_market_factors(full=True)
+        record = {"open": 220.0, "high": 220.0, "low": 220.0, "volume": 1000}
+
+        update_stock_prices(
+            self.us,
+            prefetched=(
+                [
+                    {**record, "date": date(2025, 7, 21), "close": 220.0},
+                    {**record, "date": date(2025, 7, 22), "close": 242.0},
+                ],
+                False,
+            ),
+        )
+
+        latest = MarketFactor.objects.filter(exchange="US", sector="").first()
+        self.assertEqual(latest.date, date(2025, 7, 22))
+        self.assertAlmostEqual(latest.market_return, 0.1)
@@ -0,0 +1,32 @@
+"""
+モデル選択（時系列交差検証）のテスト
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+from django.test import SimpleTestCase
+
+from stocks.model_selection import compare_fold_scores, time_series_splits
+
+
+class TimeSeriesSplitTests(SimpleTestCase):
+    def test_gap_separates_training_from_validation(self):
+        splits = time_series_splits(200, 3, gap=20)
+
+        self.assertEqual(len(splits), 3)
+        for train_index, test_index in splits:
+            # 学習の末尾の行の目的変数（20本先）が検証期間に入らない
+            self.assertLessEqual(train_index[-1] + 20, test_index[0] - 1)
+
+    def test_fewer_splits_when_rows_are_short(self):
+        self.assertEqual(len(time_series_splits(100, 5, gap=20)), 2)
+        self.assertEqual(time_series_splits(30, 3, gap=20), [])
+
+
+class CompareFoldScoresTests(SimpleTestCase):
+    def test_partial_candidates_are_compared_on_common_folds(self):
+        scores = compare_fold_scores(
+            {"full": [0.1, 0.9, 0.9], "partial": [0.5], "failed": []}
+        )
+
+        self.assertEqual(set(scores), {"full", "partial"})
+        self.assertEqual(max(scores, key=scores.get), "partial")
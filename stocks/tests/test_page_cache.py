@@ -0,0 +1,167 @@
+"""
+銘柄ごとの画面のキャッシュのテスト
+2回目の表示はキャッシュから返し、株価・予想の書き込み（シグナルを送らない一括処理を含む）で
+無効化されることと、チャートAPIのキャッシュが指定された本数ごとに増えないことを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+import re
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from stocks.accuracy import score_matured_predictions
+from stocks.models import Stock, StockPrediction
+from stocks.page_cache import batched_invalidation, stock_versions
+
+from .test_view_budgets import seed_dataset
+
+
+def strip_csrf(content):
+    return re.sub(rb'name="csrfmiddlewaretoken" value="[^"]+"', b"", content)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.symbol = seed_dataset(2, 80)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.stock = Stock.objects.get(symbol=self.symbol)
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(name, args=[self.symbol]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(captured)
+
+    def test_second_view_is_served_from_cache(self):
+        for name in ["stocks:stock_detail", "stocks:prediction"]:
+            with self.subTest(view=name):
+                first, cold_queries = self.get(name)
+                second, warm_queries = self.get(name)
+                self.assertLess(warm_queries, cold_queries)
+                # CSRFトークン以外は同じ内容
+                self.assertEqual(strip_csrf(first.content), strip_csrf(second.content))
+
+    def test_prediction_write_invalidates(self):
+        self.get("stocks:stock_detail")
+        # 無効化はコミット後に行う
+        with self.captureOnCommitCallbacks(execute=True):
+            StockPrediction.objects.create(
+                stock=self.stock,
+                prediction_date=self.stock.prices.latest("date").date,
+                predicted_price=Decimal("12345.00"),
+                confidence=60.0,
+                method="キャッシュ無効化",
+            )
+        response, _ = self.get("stocks:stock_detail")
+        self.assertContains(response, "キャッシュ無効化")
+
+    def test_scoring_update_invalidates(self):
+        self.get("stocks:prediction")
+        latest = self.stock.prices.latest("date")
+        # bulk_createはシグナルを送らないため、まだ無効化されない
+        StockPrediction.objects.bulk_create(
+            [
+                StockPrediction(
+                    stock=self.stock,
+                    prediction_date=latest.date,
+                    predicted_price=latest.close_price,
+                    base_price=latest.close_price,
+                    confidence=50.0,
+                    method="採点対象",
+                )
+            ]
+        )
+        _, cached_queries = self.get("stocks:prediction")
+
+        # 予想の採点はUPDATE文でまとめて保存する
+        with (
+            contextlib.redirect_stdout(io.StringIO()),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            self.assertEqual(score_matured_predictions(self.stock), 1)
+        response, queries = self.get("stocks:prediction")
+        self.assertGreater(queries, cached_queries)
+        self.assertContains(response, "採点対象")
+
+    def test_batched_invalidation_bumps_once(self):
+        with self.captureOnCommitCallbacks(execute=True), batched_invalidation():
+            StockPrediction.objects.create(
+                stock=self.stock,
+                prediction_date=self.stock.prices.latest("date").date,
+                predicted_price=Decimal("1.00"),
+                confidence=50.0,
+                method="一括",
+            )
+            # 一括処理の中ではまだ無効化しない
+            version = stock_versions([self.stock.id])[self.stock.id]
+            self.stock.save()
+            self.assertEqual(stock_versions([self.stock.id])[self.stock.id], version)
+        self.assertNotEqual(stock_versions([self.stock.id])[self.stock.id], version)
+
+    def test_invalidation_waits_for_commit(self):
+        version = stock_versions([self.stock.id])[self.stock.id]
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                StockPrediction.objects.create(
+                    stock=self.stock,
+                    prediction_date=self.stock.prices.latest("date").date,
+                    predicted_price=Decimal("1.00"),
+                    confidence=50.0,
+                    method="コミット前",
+                )
+                # コミット前に読んだ内容を新しいバージョンのキーに保存しないよう、まだ更新しない
+                self.assertEqual(
+                    stock_versions([self.stock.id])[self.stock.id], version
+                )
+                # トランザクションの中の表示は古いバージョンのキーに保存される
+                self.get("stocks:stock_detail")
+        self.assertNotEqual(stock_versions([self.stock.id])[self.stock.id], version)
+        # コミット後の表示は新しいバージョンで作り直す
+        _, warm_queries = self.get("stocks:stock_detail")
+        response, cached_queries = self.get("stocks:stock_detail")
+        self.assertLess(cached_queries, warm_queries)
+        self.assertContains(response, "コミット前")
+
+
+class ChartDataApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.symbol = seed_dataset(1, 80)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, days):
+        return self.client.get(
+            reverse("stocks:chart_data_api", args=[self.symbol]), {"days": days}
+        )
+
+    def test_invalid_days_are_rejected(self):
+        for days in ["abc", "1.5", ""]:
+            with self.subTest(days=days):
+                self.assertEqual(self.get(days).status_code, 400)
+
+    def test_days_share_a_cached_bucket(self):
+        self.assertEqual(len(self.get("60").json()["prices"]), 60)
+
+        # 同じ区切り（90本）の本数はキャッシュから切り出す
+        with self.assertNumQueries(1):
+            data = self.get("45").json()
+        self.assertEqual(len(data["dates"]), 45)
+        self.assertEqual(data["prices"], self.get("60").json()["prices"][-45:])
+
+    def test_days_are_clamped(self):
+        self.assertEqual(len(self.get("-5").json()["prices"]), 1)
+        self.assertEqual(len(self.get(str(10**9)).json()["prices"]), 80)
@@ -0,0 +1,73 @@
+"""
+類似パターン検索のインデックスのテスト
+足が追加された銘柄だけを差し替え、全銘柄を作り直した場合と同じ結果になることを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+
+import numpy as np
+
+from stocks import pattern_search
+from stocks.models import Stock, StockPrice
+
+
+class PatternIndexTests(TestCase):
+    def setUp(self):
+        pattern_search._index_cache.update(version=None, index=None)
+        self.addCleanup(pattern_search._index_cache.update, version=None, index=None)
+        self.start = date.today() - timedelta(days=200)
+        rng = np.random.default_rng(0)
+        for symbol in ["AAA", "BBB"]:
+            stock = Stock.objects.create(symbol=symbol, name=symbol, exchange="US")
+            closes = 100 * np.cumprod(1 + rng.normal(0, 0.02, 100))
+            for i, close in enumerate(closes):
+                self.create_price(stock, self.start + timedelta(days=i), close)
+
+    def create_price(self, stock, day, close):
+        StockPrice.objects.create(
+            stock=stock,
+            date=day,
+            open_price=Decimal(f"{close:.2f}"),
+            high_price=Decimal(f"{close:.2f}"),
+            low_price=Decimal(f"{close:.2f}"),
+            close_price=Decimal(f"{close:.2f}"),
+            volume=1000,
+        )
+
+    def load(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            index = pattern_search.load_pattern_index()
+        return index, output.getvalue()
+
+    def test_new_bars_update_only_their_stocks(self):
+        before, output = self.load()
+        self.assertIn("Built", output)
+
+        stock = Stock.objects.get(symbol="BBB")
+        self.create_price(stock, self.start + timedelta(days=100), 150.0)
+        new = Stock.objects.create(symbol="CCC", name="CCC", exchange="US")
+        for i in range(40):
+            self.create_price(new, self.start + timedelta(days=i), 100.0 + i % 7)
+
+        updated, output = self.load()
+        self.assertIn("Updated pattern index for 2 stocks", output)
+        # 検索中の可能性がある前のインデックスは変更しない
+        self.assertEqual(before["lengths"].tolist(), [100, 100])
+
+        pattern_search._index_cache.update(version=None, index=None)
+        rebuilt, _ = self.load()
+        self.assertEqual(updated["symbols"], rebuilt["symbols"])
+        self.assertEqual(updated["lengths"].tolist(), [100, 101, 40])
+        np.testing.assert_allclose(updated["series"], rebuilt["series"])
+        np.testing.assert_allclose(updated["fft"], rebuilt["fft"], atol=1e-3)
+        window = pattern_search.DEFAULT_WINDOW
+        np.testing.assert_allclose(
+            updated["rolling"][window], rebuilt["rolling"][window], atol=1e-5
+        )
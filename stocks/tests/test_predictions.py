@@ -0,0 +1,95 @@
+"""
+予想の保存のテスト
+新しい予想で同じ予測日の別の予測期間の（採点前の）予想が消えないことを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+
+import numpy as np
+
+from stocks.models import MarketFactor, Stock, StockPrediction, StockPrice
+from stocks.trading_calendar import add_sessions, previous_session, trading_days
+from stocks.utils import ml_prediction, sessions_between, simple_prediction
+
+EXCHANGE = "US"
+
+
+def create_stock(bars):
+    stock = Stock.objects.create(symbol="PRED", name="Prediction", exchange=EXCHANGE)
+    end = previous_session(EXCHANGE, date.today() - timedelta(days=1))
+    sessions = trading_days(EXCHANGE, end - timedelta(days=bars * 2), end)[-bars:]
+    closes = 1000 * np.cumprod(1 + np.random.default_rng(0).normal(0.001, 0.01, bars))
+    StockPrice.objects.bulk_create(
+        StockPrice(
+            stock=stock,
+            date=day,
+            open_price=Decimal(f"{close:.2f}"),
+            high_price=Decimal(f"{close * 1.01:.2f}"),
+            low_price=Decimal(f"{close * 0.99:.2f}"),
+            close_price=Decimal(f"{close:.2f}"),
+            volume=100_000,
+        )
+        for day, close in zip(sessions.astype(object), closes)
+    )
+    return stock, end
+
+
+def create_prediction(stock, prediction_date, horizon, method):
+    return StockPrediction.objects.create(
+        stock=stock,
+        prediction_date=prediction_date,
+        predicted_price=Decimal("1.00"),
+        confidence=50.0,
+        method=method,
+        horizon=horizon,
+    )
+
+
+class PredictionReplacementTests(TestCase):
+    def test_moving_average_run_keeps_longer_horizon(self):
+        # 60本未満のため機械学習は使わず移動平均で予想する
+        stock, last_date = create_stock(40)
+        days = max(
+            1,
+            sessions_between(EXCHANGE, last_date, date.today() + timedelta(days=1)),
+        )
+        target = add_sessions(EXCHANGE, last_date, days)
+        longer = create_prediction(
+            stock, target, days + 4, "改良移動平均（上昇トレンド）"
+        )
+        same = create_prediction(stock, target, days, "改良移動平均（下降トレンド）")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNotNone(simple_prediction(stock, days_ahead=1))
+
+        self.assertTrue(StockPrediction.objects.filter(pk=longer.pk).exists())
+        self.assertFalse(StockPrediction.objects.filter(pk=same.pk).exists())
+        self.assertEqual(
+            StockPrediction.objects.filter(
+                stock=stock, prediction_date=target, horizon=days
+            ).count(),
+            1,
+        )
+
+    def test_one_day_ml_run_keeps_five_day_prediction(self):
+        stock, last_date = create_stock(200)
+        target = add_sessions(EXCHANGE, last_date, 1)
+        five_day = create_prediction(stock, target, 5, "機械学習（Ridge）")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNotNone(ml_prediction(stock, 1))
+
+        self.assertTrue(StockPrediction.objects.filter(pk=five_day.pk).exists())
+        # 予想は市場ファクターを読むだけで計算しない（計算は株価の取り込み側）
+        self.assertFalse(MarketFactor.objects.exists())
+        self.assertTrue(
+            StockPrediction.objects.filter(
+                stock=stock, prediction_date=target, horizon=1
+            ).exists()
+        )
@@ -0,0 +1,195 @@
+"""
+株価の自動更新スケジューラのテスト
+優先度の順序、データ提供元へのリクエスト数の上限、デモデータを保存しないことを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from asgiref.sync import async_to_sync
+
+from stocks import providers
+from stocks.models import Stock, StockPrice
+from stocks.providers import period_since
+from stocks.scheduler import ProviderBudget, RefreshScheduler, build_refresh_queue
+
+# 2025-06-11（水）12:00 UTC。米国市場で確定済みの最新の取引日は6/10
+NOW = datetime(2025, 6, 11, 12, 0, tzinfo=timezone.utc)
+RECORD = {
+    "date": date(2025, 6, 10),
+    "open": 100.0,
+    "high": 101.0,
+    "low": 99.0,
+    "close": 100.5,
+    "volume": 1000,
+}
+
+
+def create_stock(symbol, latest_date=None, **fields):
+    stock = Stock.objects.create(symbol=symbol, name=symbol, exchange="US", **fields)
+    if latest_date is not None:
+        StockPrice.objects.create(
+            stock=stock,
+            date=latest_date,
+            open_price=Decimal("100"),
+            high_price=Decimal("100"),
+            low_price=Decimal("100"),
+            close_price=Decimal("100"),
+            volume=1000,
+        )
+    return stock
+
+
+def fake_fetch(calls_per_symbol, is_demo=False):
+    """
+    銘柄ごとにcalls_per_symbol回データ提供元を呼び出すafetch_stocks_dataの代わり
+    """
+
+    async def afetch_stocks_data(symbols, allow_demo=True, acquire=None, **kwargs):
+        afetch_stocks_data.periods = kwargs.get("periods")
+        results = {}
+        for symbol in symbols:
+            granted = all(acquire(symbol) for _ in range(calls_per_symbol))
+            results[symbol] = ([RECORD], is_demo) if granted else (None, True)
+        return results
+
+    return afetch_stocks_data
+
+
+class RefreshQueueTests(TestCase):
+    def test_priority_ordering(self):
+        create_stock("LAGGING", date(2025, 6, 2))
+        create_stock("RECENT", date(2025, 6, 9))
+        create_stock("POPULAR", date(2025, 6, 9), view_count=1000, last_viewed_at=NOW)
+        create_stock("CURRENT", date(2025, 6, 10))
+
+        queue = build_refresh_queue(NOW)
+
+        self.assertEqual(
+            [item["symbol"] for item in queue], ["LAGGING", "POPULAR", "RECENT"]
+        )
+        self.assertEqual(queue[0]["lag_sessions"], 6)
+
+
+class RefreshQueueApiTests(TestCase):
+    def get(self, limit):
+        return self.client.get(reverse("stocks:refresh_queue_api"), {"limit": limit})
+
+    def test_limit_is_clamped(self):
+        for symbol in ["AAA", "BBB", "CCC"]:
+            create_stock(symbol)
+
+        self.assertEqual(len(self.get("2").json()["queue"]), 2)
+        self.assertEqual(self.get("-5").json()["queue"], [])
+        self.assertEqual(len(self.get("1000000").json()["queue"]), 3)
+
+    def test_invalid_limit_is_rejected(self):
+        for limit in ["abc", "1.5", ""]:
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get(limit).status_code, 400)
+
+
+class PeriodSinceTests(TestCase):
+    def test_shortest_period_covering_the_start(self):
+        today = date(2025, 6, 11)
+        self.assertEqual(period_since(date(2025, 6, 10), today), "5d")
+        self.assertEqual(period_since(date(2025, 5, 20), today), "1mo")
+        self.assertEqual(period_since(date(2025, 4, 1), today), "3mo")
+        self.assertEqual(period_since(date(2025, 1, 6), today), "6mo")
+        self.assertEqual(period_since(date(2024, 6, 1), today), "1y")
+
+
+class ProviderBudgetTests(TestCase):
+    def test_per_minute_limit(self):
+        budget = ProviderBudget(per_minute=2, per_day=100)
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+    def test_daily_limit(self):
+        budget = ProviderBudget(per_minute=10, per_day=1)
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+        self.assertEqual(budget.remaining_today, 0)
+
+
+@mock.patch("stocks.scheduler.refresh_stock_prices", return_value=(1, False))
+class RefreshSchedulerTests(TestCase):
+    def setUp(self):
+        for symbol in ["AAA", "BBB", "CCC"]:
+            create_stock(symbol)
+
+    def tick(self, scheduler, fetch):
+        with mock.patch("stocks.scheduler.afetch_stocks_data", fetch):
+            return scheduler.tick()
+
+    def test_tokens_are_charged_per_provider_call(self, refresh):
+        scheduler = RefreshScheduler(per_minute=3, per_day=100)
+
+        # 1銘柄あたり2回呼び出すため、3トークンでは1銘柄しか取得できない
+        status = self.tick(scheduler, fake_fetch(calls_per_symbol=2))
+
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(len(status["refreshed"]), 1)
+        # 上限に達して取得できなかった銘柄は失敗として扱わない
+        self.assertEqual(scheduler.backoff, {})
+        self.assertEqual(scheduler.budget.available(), 0)
+
+    def test_market_factors_are_refreshed_after_saving(self, refresh):
+        scheduler = RefreshScheduler(per_minute=10, per_day=100)
+
+        with mock.patch("stocks.market_factors.refresh_market_factors") as factors:
+            self.tick(scheduler, fake_fetch(calls_per_symbol=1))
+            # 保存するデータがなければ計算しない
+            self.tick(RefreshScheduler(), fake_fetch(calls_per_symbol=1, is_demo=True))
+
+        factors.assert_called_once_with()
+
+    def test_fetch_starts_at_the_first_missing_session(self, refresh):
+        create_stock("LAGGING", date(2025, 6, 9))
+        fetch = fake_fetch(calls_per_symbol=1)
+
+        with mock.patch("stocks.scheduler.timezone.now", return_value=NOW):
+            self.tick(RefreshScheduler(per_minute=10, per_day=100), fetch)
+
+        # 株価のない銘柄は既定の1年分を取得する
+        self.assertEqual(fetch.periods, {"LAGGING": "5d"})
+
+    def test_no_new_bars_is_not_a_failure(self, refresh):
+        refresh.return_value = (0, False)
+        scheduler = RefreshScheduler(per_minute=10, per_day=100)
+
+        status = self.tick(scheduler, fake_fetch(calls_per_symbol=1))
+
+        self.assertEqual(status["failed_total"], 0)
+        # 失敗回数は増やさず、少し時間をおいてから取得し直す
+        self.assertEqual({failures for failures, _ in scheduler.backoff.values()}, {0})
+
+    def test_demo_data_is_not_saved(self, refresh):
+        scheduler = RefreshScheduler(per_minute=10, per_day=100)
+
+        status = self.tick(scheduler, fake_fetch(calls_per_symbol=1, is_demo=True))
+
+        refresh.assert_not_called()
+        self.assertEqual(status["failed_total"], 3)
+        self.assertEqual(len(scheduler.backoff), 3)
+
+    def test_fetch_without_demo_fallback(self, refresh):
+        with (
+            contextlib.redirect_stdout(io.StringIO()),
+            mock.patch.object(
+                providers,
+                "afetch_stock_data_alpha_vantage",
+                mock.AsyncMock(return_value=(None, True)),
+            ),
+            mock.patch.object(providers, "fetch_stock_data_yahoo", return_value=None),
+        ):
+            result = async_to_sync(providers.afetch_stock_data)("AAA", allow_demo=False)
+        self.assertEqual(result, (None, True))
@@ -0,0 +1,29 @@
+"""
+スクリーナーの条件のパラメータのテスト
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+from django.test import SimpleTestCase
+
+from stocks.screener import parse_screener_query
+
+
+class ParseScreenerQueryTests(SimpleTestCase):
+    def test_unrelated_params_are_ignored(self):
+        query = parse_screener_query(
+            {
+                "rsi__lt": "30",
+                "_profile": "1",
+                "utm_source": "newsletter",
+                "_": "1718000000",
+                "sort": "-rsi",
+            }
+        )
+
+        self.assertEqual(query["filters"], {"rsi__lt": 30.0})
+        self.assertEqual(query["sort"], "-rsi")
+
+    def test_unknown_field_or_operator_is_rejected(self):
+        for key in ["unknown__lt", "rsi__contains"]:
+            with self.subTest(key=key), self.assertRaises(ValueError):
+                parse_screener_query({key: "1"})
@@ -0,0 +1,65 @@
+"""
+予測区間のシミュレーションのテスト
+分位点の順序、中央値を予想価格に合わせる規約、シミュレーションできない入力での予測区間なしを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+
+from django.test import SimpleTestCase, override_settings
+
+import numpy as np
+
+from stocks.simulation import SIMULATION_METHODS, simulate_bands
+from stocks.utils import simulate_prediction_bands
+
+RETURNS = np.random.default_rng(0).normal(0.0005, 0.02, 250)
+CLOSES = 1000 * np.exp(np.concatenate([[0.0], np.cumsum(RETURNS)]))
+
+
+class SimulateBandsTests(SimpleTestCase):
+    def test_quantiles_are_ordered(self):
+        for method in SIMULATION_METHODS:
+            with self.subTest(method=method):
+                bands = simulate_bands(1000.0, RETURNS, 20, method=method, seed=1)
+                for band in bands:
+                    values = [band[key] for key in ["p5", "p25", "p50", "p75", "p95"]]
+                    self.assertEqual(values, sorted(values))
+                # 先の日ほど区間が広がる
+                self.assertGreater(
+                    bands[-1]["p95"] - bands[-1]["p5"], bands[0]["p95"] - bands[0]["p5"]
+                )
+
+    def test_median_follows_drift_for_all_methods(self):
+        drift = np.log(1100 / 1000) / 20
+        for method in SIMULATION_METHODS:
+            with self.subTest(method=method):
+                bands = simulate_bands(
+                    1000.0, RETURNS, 20, method=method, drift=drift, seed=1
+                )
+                self.assertAlmostEqual(bands[-1]["p50"] / 1100, 1, delta=0.01)
+
+
+class SimulatePredictionBandsTests(SimpleTestCase):
+    def bands(self, closes, predicted_price, days=5):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return simulate_prediction_bands(closes, days, predicted_price, days)
+
+    @override_settings(SIMULATION_PATHS=2000)
+    def test_median_matches_predicted_price(self):
+        bands = self.bands(CLOSES, CLOSES[-1] * 1.05)
+        self.assertEqual(len(bands), 5)
+        self.assertAlmostEqual(bands[-1]["p50"] / (CLOSES[-1] * 1.05), 1, delta=0.02)
+
+    def test_degenerate_inputs_have_no_bands(self):
+        cases = {
+            "zero predicted price": (CLOSES, 0.0),
+            "negative predicted price": (CLOSES, -10.0),
+            "nan predicted price": (CLOSES, float("nan")),
+            "single close": (CLOSES[-1:], 1000.0),
+            "zero current price": (np.append(CLOSES, 0.0), 1000.0),
+        }
+        for name, (closes, predicted_price) in cases.items():
+            with self.subTest(name):
+                self.assertEqual(self.bands(closes, predicted_price), [])
@@ -0,0 +1,88 @@
+"""
+同じ銘柄・処理の同時実行をまとめる処理のテスト
+実行中に呼び出された処理は取得を繰り返さず、同じ結果を受け取ることを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import io
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from stocks.models import SingleFlight, Stock
+from stocks.single_flight import single_flight
+
+
+class SingleFlightTests(TransactionTestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol="FLY", name="Flight", exchange="US")
+
+    def test_concurrent_callers_share_one_fetch(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            # 取得中はトランザクション・ロックを保持しない
+            calls.append(connection.in_atomic_block)
+            started.set()
+            release.wait(5)
+            return len(calls)
+
+        results = []
+
+        def call():
+            try:
+                results.append(single_flight("refresh", self.stock, fetch))
+            finally:
+                connections.close_all()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            first = threading.Thread(target=call)
+            first.start()
+            self.assertTrue(started.wait(5))
+            second = threading.Thread(target=call)
+            second.start()
+            # 2つ目の呼び出しが完了回数を読んでロックを待つまで1つ目の取得を終えない
+            time.sleep(0.2)
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(calls, [False])
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(SingleFlight.objects.get(stock=self.stock).generation, 1)
+
+    def test_later_call_runs_again(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(single_flight("refresh", self.stock, fetch), 1)
+        # 前回の処理が完了した後の呼び出しは結果を共有せずに実行する
+        self.assertEqual(single_flight("refresh", self.stock, fetch), 2)
+
+    def test_failure_releases_the_flight(self):
+        def fail():
+            raise RuntimeError("provider error")
+
+        with self.assertRaises(RuntimeError):
+            single_flight("refresh", self.stock, fail)
+        # 失敗した処理の印は外れ、次の呼び出しは待たずに実行する
+        self.assertEqual(single_flight("refresh", self.stock, lambda: "ok"), "ok")
+
+    def test_stale_flight_is_taken_over(self):
+        # 異常終了したプロセスの実行中の印
+        SingleFlight.objects.create(
+            stock=self.stock,
+            task="refresh",
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(single_flight("refresh", self.stock, lambda: "ok"), "ok")
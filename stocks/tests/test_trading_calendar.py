@@ -0,0 +1,157 @@
+"""
+取引日カレンダーのテスト
+東証・米国市場の休場日、米国市場の短縮取引日、年をまたぐ取引日の計算を確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from stocks.models import Stock, StockPrice
+from stocks.trading_calendar import (
+    add_sessions,
+    is_market_open,
+    is_trading_day,
+    last_closed_session,
+    previous_session,
+    session_close,
+    sessions_between,
+    trading_days,
+)
+from stocks.utils import update_stock_prices
+
+NEW_YORK = session_close("US", date(2025, 6, 2)).tzinfo
+
+
+class HolidayTests(SimpleTestCase):
+    def assert_closed(self, exchange, days):
+        for day in days:
+            with self.subTest(exchange=exchange, day=day):
+                self.assertFalse(is_trading_day(exchange, day))
+
+    def test_japan_holidays(self):
+        self.assert_closed(
+            "TSE",
+            [
+                # 年末年始
+                date(2024, 12, 31),
+                date(2025, 1, 1),
+                date(2025, 1, 2),
+                date(2025, 1, 3),
+                # 成人の日（1月第2月曜日）
+                date(2025, 1, 13),
+                # こどもの日（日曜日）の振替休日は祝日の続く5月6日
+                date(2025, 5, 6),
+                # 敬老の日と秋分の日に挟まれた国民の休日
+                date(2026, 9, 22),
+            ],
+        )
+        self.assertTrue(is_trading_day("TSE", date(2024, 12, 30)))
+        self.assertTrue(is_trading_day("TSE", date(2025, 5, 7)))
+
+    def test_us_holidays(self):
+        self.assert_closed(
+            "US",
+            [
+                date(2025, 1, 9),  # 臨時休場（国葬）
+                date(2025, 4, 18),  # Good Friday
+                date(2025, 6, 19),  # Juneteenth
+                date(2025, 11, 27),  # Thanksgiving Day
+                date(2026, 7, 3),  # 土曜日の独立記念日の振替
+            ],
+        )
+        # 元日が土曜日の場合、前年の大晦日は休場にしない
+        self.assertTrue(is_trading_day("US", date(2021, 12, 31)))
+        self.assertTrue(is_trading_day("NASDAQ", date(2025, 11, 28)))
+
+
+class EarlyCloseTests(SimpleTestCase):
+    def test_half_day_sessions_close_at_one(self):
+        for day in [date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24)]:
+            with self.subTest(day=day):
+                self.assertEqual(session_close("US", day).hour, 13)
+        # 独立記念日が土曜日の年は前日（休場日）の前の木曜日を短縮しない
+        self.assertEqual(session_close("US", date(2026, 7, 2)).hour, 16)
+        self.assertEqual(session_close("US", date(2025, 12, 23)).hour, 16)
+        # 東証は短縮取引なし
+        self.assertEqual(session_close("TSE", date(2025, 12, 30)).hour, 15)
+
+    def test_half_day_session_is_closed_after_one(self):
+        after_close = datetime(2025, 11, 28, 13, 30, tzinfo=NEW_YORK)
+
+        self.assertFalse(is_market_open("US", after_close))
+        self.assertEqual(last_closed_session("US", after_close), date(2025, 11, 28))
+        self.assertEqual(
+            last_closed_session("US", datetime(2025, 11, 28, 12, 0, tzinfo=NEW_YORK)),
+            date(2025, 11, 26),
+        )
+
+
+class YearBoundaryTests(SimpleTestCase):
+    def test_add_sessions_across_new_year(self):
+        self.assertEqual(add_sessions("TSE", date(2024, 12, 30), 1), date(2025, 1, 6))
+        self.assertEqual(add_sessions("TSE", date(2025, 1, 6), -1), date(2024, 12, 30))
+        self.assertEqual(add_sessions("US", date(2024, 12, 31), 1), date(2025, 1, 2))
+        self.assertEqual(add_sessions("US", date(2024, 12, 20), 5), date(2024, 12, 30))
+        # 休場日から数える場合は直前の取引日から
+        self.assertEqual(add_sessions("TSE", date(2025, 1, 2), 1), date(2025, 1, 6))
+        self.assertEqual(previous_session("US", date(2025, 1, 1)), date(2024, 12, 31))
+
+    def test_counts_across_new_year(self):
+        self.assertEqual(
+            sessions_between("TSE", date(2024, 12, 27), date(2025, 1, 7)), 3
+        )
+        self.assertEqual(
+            len(trading_days("US", date(2024, 12, 23), date(2025, 1, 3))), 8
+        )
+
+
+def frozen_datetime(now):
+    """
+    datetime.now()がnow（その市場の時刻に変換）を返すdatetime
+    """
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now.astimezone(tz)
+
+    return FrozenDatetime
+
+
+class UpToDateCheckTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol="AAPL", name="Apple", exchange="US")
+        StockPrice.objects.create(
+            stock=self.stock,
+            date=date(2025, 6, 10),
+            open_price=Decimal("100"),
+            high_price=Decimal("100"),
+            low_price=Decimal("100"),
+            close_price=Decimal("100"),
+            volume=1000,
+        )
+
+    def update_at(self, now):
+        with (
+            mock.patch("stocks.trading_calendar.datetime", frozen_datetime(now)),
+            mock.patch("stocks.utils.time.sleep"),
+            mock.patch(
+                "stocks.utils.fetch_stock_data", return_value=(None, False)
+            ) as fetch,
+        ):
+            update_stock_prices(self.stock)
+        return fetch.called
+
+    def test_skips_fetch_until_the_session_closes(self):
+        # 6/11（水）の取引終了（16:00）前は6/10の足まで揃っていれば最新
+        self.assertFalse(self.update_at(datetime(2025, 6, 11, 15, 59, tzinfo=NEW_YORK)))
+        self.assertTrue(self.update_at(datetime(2025, 6, 11, 16, 0, tzinfo=NEW_YORK)))
+
+    def test_uses_the_market_date_not_the_server_date(self):
+        # 東京の6/12 0:30は米国の6/11 11:30（取引中）のため、まだ取得しない
+        tokyo = session_close("TSE", date(2025, 6, 12)).tzinfo
+        self.assertFalse(self.update_at(datetime(2025, 6, 12, 0, 30, tzinfo=tokyo)))
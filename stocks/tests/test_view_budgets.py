@@ -0,0 +1,257 @@
+"""
+ビューごとのSQLクエリ数・レスポンス時間の予算テスト
+データ量を増やしてもクエリ数が変わらないこと（N+1クエリがないこと）と、
+クエリ数・レスポンス時間が予算内であることを確認する
+Usage: docker compose exec web python manage.py test stocks
+"""
+
+import contextlib
+import difflib
+import io
+import os
+import re
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+import numpy as np
+
+from stocks import pattern_search, urls
+from stocks.feature_store import rebuild_stock_features
+from stocks.models import Stock, StockPrediction, StockPrice
+from stocks.screener import rebuild_latest_indicators
+from stocks.trading_calendar import previous_session, trading_days
+
+# データ量（銘柄数, 日足の本数）。小さい順に計測してクエリ数を比べる
+DATASET_SIZES = [(2, 80), (6, 160), (12, 240)]
+EXCHANGE = "US"
+
+# URL名 -> URLを作る関数・クエリ数の上限・レスポンス時間の上限（ms、最大のデータ量で計測）
+VIEW_BUDGETS = {
+    "index": {"url": lambda symbols: reverse("stocks:index"), "queries": 3},
+    "stock_detail": {
+        "url": lambda symbols: reverse("stocks:stock_detail", args=[symbols[0]]),
+        "queries": 5,
+    },
+    "prediction": {
+        "url": lambda symbols: reverse("stocks:prediction", args=[symbols[0]]),
+        "queries": 5,
+    },
+    "screener": {
+        "url": lambda symbols: reverse("stocks:screener") + "?rsi__lte=100",
+        "queries": 1,
+    },
+    "screener_api": {
+        "url": lambda symbols: reverse("stocks:screener_api") + "?rsi__lte=100",
+        "queries": 1,
+    },
+    "compare_api": {
+        "url": lambda symbols: reverse("stocks:compare_api")
+        + "?window=20&symbols="
+        + ",".join(symbols),
+        "queries": 3,
+    },
+    "refresh_queue_api": {
+        "url": lambda symbols: reverse("stocks:refresh_queue_api"),
+        "queries": 1,
+    },
+    "data_gaps_api": {
+        "url": lambda symbols: reverse("stocks:data_gaps_api", args=[symbols[0]]),
+        "queries": 2,
+    },
+    "chart_data_api": {
+        "url": lambda symbols: reverse("stocks:chart_data_api", args=[symbols[0]])
+        + "?days=365",
+        "queries": 2,
+    },
+    "similar_patterns_api": {
+        "url": lambda symbols: reverse(
+            "stocks:similar_patterns_api", args=[symbols[0]]
+        ),
+        "queries": 6,
+        "latency_ms": 1000,
+    },
+    "metrics": {"url": lambda symbols: reverse("stocks:metrics"), "queries": 0},
+}
+# 既定のレスポンス時間の上限（ms）
+DEFAULT_LATENCY_MS = 500
+# 遅いCI環境向けにレスポンス時間の上限を一律に緩める倍率
+LATENCY_BUDGET_SCALE = float(os.environ.get("VIEW_LATENCY_BUDGET_SCALE", 1))
+# 計測しないビュー（POSTのみ・外部APIを呼び出すもの）
+EXCLUDED_VIEWS = {"update_stock_data", "delete_stock"}
+
+
+def seed_dataset(n_stocks, bars):
+    """
+    合成した株価・予想・特徴量・スクリーナーの指標を投入して銘柄シンボルを返す
+    """
+    StockPrice.objects.all().delete()
+    Stock.objects.all().delete()
+
+    end = previous_session(EXCHANGE, date.today() - timedelta(days=1))
+    sessions = trading_days(EXCHANGE, end - timedelta(days=bars * 2), end)[-bars:]
+    rng = np.random.default_rng(n_stocks)
+    symbols = []
+    for i in range(n_stocks):
+        stock = Stock.objects.create(
+            symbol=f"Q{i:04d}",
+            name=f"Budget {i}",
+            exchange=EXCHANGE,
+            sector=f"Sector {i % 3}",
+        )
+        closes = 1000 * np.cumprod(1 + rng.normal(0, 0.02, len(sessions)))
+        StockPrice.objects.bulk_create(
+            [
+                StockPrice(
+                    stock=stock,
+                    date=day,
+                    open_price=Decimal(f"{close * 0.995:.2f}"),
+                    high_price=Decimal(f"{close * 1.01:.2f}"),
+                    low_price=Decimal(f"{close * 0.99:.2f}"),
+                    close_price=Decimal(f"{close:.2f}"),
+                    volume=int(rng.integers(100_000, 1_000_000)),
+                )
+                for day, close in zip(sessions.astype(object), closes)
+            ]
+        )
+        StockPrediction.objects.create(
+            stock=stock,
+            prediction_date=end + timedelta(days=7),
+            predicted_price=Decimal(f"{closes[-1]:.2f}"),
+            confidence=50.0,
+            method="テスト",
+        )
+        rebuild_stock_features(stock)
+        symbols.append(stock.symbol)
+    rebuild_latest_indicators()
+    return symbols
+
+
+def normalize_sql(sql):
+    """
+    パラメータ（数値・文字列）を?に置き換えたSQL（同じ形のクエリを比べるため）
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", sql)
+
+
+def describe_queries(queries):
+    """
+    同じ形のクエリをまとめて回数の多い順に並べた一覧
+    """
+    counts = {}
+    for sql in queries:
+        counts[sql] = counts.get(sql, 0) + 1
+    return "\n".join(
+        f"  {count:>4} × {sql}"
+        for sql, count in sorted(counts.items(), key=lambda item: -item[1])
+    )
+
+
+class ViewBudgetTests(TestCase):
+    """
+    データ量を増やしながら各ビューのクエリ数・レスポンス時間を計測して予算と比べる
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.measurements = {name: [] for name in VIEW_BUDGETS}
+        for n_stocks, bars in DATASET_SIZES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                symbols = seed_dataset(n_stocks, bars)
+                for name, budget in VIEW_BUDGETS.items():
+                    cls.measurements[name].append(
+                        cls.measure(budget["url"](symbols), n_stocks, bars)
+                    )
+
+    @classmethod
+    def measure(cls, url, n_stocks, bars):
+        client = cls.client_class()
+        # 初回だけの処理（テンプレートの読み込みなど）を除くため1回実行してから計測
+        client.get(url)
+        cache.clear()
+        pattern_search._index_cache.update(version=None, index=None)
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        return {
+            "size": f"{n_stocks} stocks × {bars} bars",
+            "status": response.status_code,
+            "elapsed_ms": elapsed_ms,
+            "queries": [normalize_sql(query["sql"]) for query in captured],
+        }
+
+    def test_all_views_have_budgets(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        missing = names - set(VIEW_BUDGETS) - EXCLUDED_VIEWS
+        self.assertFalse(
+            missing,
+            f"予算が設定されていないビュー: {', '.join(sorted(missing))}"
+            "（VIEW_BUDGETSまたはEXCLUDED_VIEWSに追加してください）",
+        )
+
+    def test_views_respond(self):
+        for name, runs in self.measurements.items():
+            for run in runs:
+                with self.subTest(view=name, size=run["size"]):
+                    self.assertEqual(run["status"], 200)
+
+    def test_query_count_does_not_grow_with_data(self):
+        for name, runs in self.measurements.items():
+            smallest = runs[0]
+            for run in runs[1:]:
+                with self.subTest(view=name, size=run["size"]):
+                    if len(run["queries"]) == len(smallest["queries"]):
+                        continue
+                    diff = "\n".join(
+                        difflib.unified_diff(
+                            smallest["queries"],
+                            run["queries"],
+                            fromfile=smallest["size"],
+                            tofile=run["size"],
+                            lineterm="",
+                        )
+                    )
+                    self.fail(
+                        f"{name}: データ量に応じてクエリ数が増えています "
+                        f"({len(smallest['queries'])} → {len(run['queries'])})\n"
+                        f"{diff}"
+                    )
+
+    def test_query_budgets(self):
+        for name, runs in self.measurements.items():
+            budget = VIEW_BUDGETS[name]["queries"]
+            run = runs[-1]
+            with self.subTest(view=name):
+                self.assertLessEqual(
+                    len(run["queries"]),
+                    budget,
+                    f"{name}: クエリ数が予算（{budget}）を超えています "
+                    f"({len(run['queries'])}, {run['size']})\n"
+                    f"{describe_queries(run['queries'])}",
+                )
+
+    def test_latency_budgets(self):
+        for name, runs in self.measurements.items():
+            budget = (
+                VIEW_BUDGETS[name].get("latency_ms", DEFAULT_LATENCY_MS)
+                * LATENCY_BUDGET_SCALE
+            )
+            run = runs[-1]
+            with self.subTest(view=name):
+                self.assertLessEqual(
+                    run["elapsed_ms"],
+                    budget,
+                    f"{name}: レスポンス時間が予算（{budget:.0f}ms）を超えています "
+                    f"({run['elapsed_ms']:.0f}ms, {run['size']})\n"
+                    f"{describe_queries(run['queries'])}",
+                )
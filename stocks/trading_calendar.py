@@ -0,0 +1,322 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# 市場コード -> 休場日カレンダー（未知の市場は土日のみ休場として扱う）
+EXCHANGE_CALENDARS = {
+    "TSE": "JP",
+    "JPX": "JP",
+    "NYSE": "US",
+    "NASDAQ": "US",
+    "US": "US",
+}
+# 地域ごとの取引時間（タイムゾーン・取引開始・取引終了）
+MARKET_HOURS = {
+    "JP": ("Asia/Tokyo", time(9, 0), time(15, 30)),
+    "US": ("America/New_York", time(9, 30), time(16, 0)),
+}
+# 米国市場の短縮取引日（us_early_closes）の取引終了時刻
+US_EARLY_CLOSE = time(13, 0)
+# 休場日を計算しておく年の範囲
+FIRST_YEAR = 1990
+LAST_YEAR = 2100
+
+# 祝日法の規則で表せない日本の休日（皇室の慶弔行事など）
+JP_SPECIAL_HOLIDAYS = [
+    date(1990, 11, 12),
+    date(1993, 6, 9),
+    date(2019, 4, 30),
+    date(2019, 5, 1),
+    date(2019, 5, 2),
+    date(2019, 10, 22),
+]
+# 米国市場の臨時休場日（同時多発テロ・ハリケーン・大統領の国葬など）
+US_SPECIAL_CLOSURES = [
+    date(1994, 4, 27),
+    date(2001, 9, 11),
+    date(2001, 9, 12),
+    date(2001, 9, 13),
+    date(2001, 9, 14),
+    date(2004, 6, 11),
+    date(2007, 1, 2),
+    date(2012, 10, 29),
+    date(2012, 10, 30),
+    date(2018, 12, 5),
+    date(2025, 1, 9),
+]
+
+
+def exchange_for_symbol(symbol):
+    """
+    ティッカーシンボルから市場を推定（数字のみは東証、それ以外は米国市場）
+    fetch_stock_dataで.Tを付けるかどうかの判定と同じ規則
+    """
+    return "TSE" if symbol.isdigit() else "US"
+
+
+def _nth_weekday(year, month, weekday, n):
+    """
+    指定月の第n週の曜日（weekday: 月曜=0、n=-1で最終週）
+    """
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """
+    グレゴリオ暦の復活祭の日付（Anonymous Gregorian algorithm）
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    ell = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * ell) // 451
+    month, day = divmod(h + ell - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def japan_holidays(year):
+    """
+    東証の休場日（国民の祝日・振替休日・国民の休日・年末年始）
+    """
+    holidays = {date(year, 1, 1), date(year, 2, 11), date(year, 4, 29)}
+    holidays |= {date(year, 5, 3), date(year, 5, 5), date(year, 11, 3)}
+    holidays.add(date(year, 11, 23))
+
+    # 成人の日・海の日・敬老の日・体育の日（スポーツの日）はハッピーマンデー制度で移動
+    holidays.add(_nth_weekday(year, 1, 0, 2) if year >= 2000 else date(year, 1, 15))
+    if year == 2020:
+        holidays |= {date(2020, 7, 23), date(2020, 7, 24), date(2020, 8, 10)}
+    elif year == 2021:
+        holidays |= {date(2021, 7, 22), date(2021, 7, 23), date(2021, 8, 8)}
+    else:
+        if year >= 2003:
+            holidays.add(_nth_weekday(year, 7, 0, 3))
+        elif year >= 1996:
+            holidays.add(date(year, 7, 20))
+        if year >= 2016:
+            holidays.add(date(year, 8, 11))
+        if year >= 2000:
+            holidays.add(_nth_weekday(year, 10, 0, 2))
+        else:
+            holidays.add(date(year, 10, 10))
+    holidays.add(_nth_weekday(year, 9, 0, 3) if year >= 2003 else date(year, 9, 15))
+
+    # 天皇誕生日
+    if year >= 2020:
+        holidays.add(date(year, 2, 23))
+    elif year <= 2018:
+        holidays.add(date(year, 12, 23))
+
+    # みどりの日（2007年からは5月4日、それ以前は日曜日以外なら国民の休日）
+    if year >= 2007 or date(year, 5, 4).weekday() != 6:
+        holidays.add(date(year, 5, 4))
+
+    # 春分の日・秋分の日（1980〜2099年の近似式）
+    offset = 0.242194 * (year - 1980) - (year - 1980) // 4
+    holidays.add(date(year, 3, int(20.8431 + offset)))
+    holidays.add(date(year, 9, int(23.2488 + offset)))
+
+    holidays |= {d for d in JP_SPECIAL_HOLIDAYS if d.year == year}
+
+    # 振替休日: 祝日が日曜日の場合は次の祝日でない日（2006年までは翌月曜日のみ）
+    for holiday in sorted(holidays):
+        if holiday.weekday() == 6:
+            substitute = holiday + timedelta(days=1)
+            while year >= 2007 and substitute in holidays:
+                substitute += timedelta(days=1)
+            holidays.add(substitute)
+
+    # 国民の休日: 前日と翌日が祝日の平日
+    for holiday in sorted(holidays):
+        between = holiday + timedelta(days=2)
+        if between in holidays and holiday + timedelta(days=1) not in holidays:
+            if (holiday + timedelta(days=1)).weekday() != 6:
+                holidays.add(holiday + timedelta(days=1))
+
+    # 年末年始の休場日（12月31日・1月2日・1月3日）
+    holidays |= {date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)}
+    return holidays
+
+
+def _observed(day):
+    """
+    土曜日の祝日は前の金曜日、日曜日の祝日は翌月曜日に振り替え
+    """
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def us_market_holidays(year):
+    """
+    NYSE・NASDAQの休場日
+    """
+    holidays = {
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving Day
+        _observed(date(year, 12, 25)),  # Christmas Day
+    }
+    # 元日が土曜日の場合は前年の大晦日を休場にしない
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 1998:
+        holidays.add(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+
+    holidays |= {d for d in US_SPECIAL_CLOSURES if d.year == year}
+    return holidays
+
+
+def us_early_closes(year):
+    """
+    NYSE・NASDAQの短縮取引日（13:00 ETに取引終了）
+    感謝祭の翌日と、独立記念日・クリスマスが火〜金曜日の場合の前日
+    """
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    for holiday in (date(year, 7, 4), date(year, 12, 25)):
+        if 1 <= holiday.weekday() <= 4:
+            days.add(holiday - timedelta(days=1))
+    return days - us_market_holidays(year)
+
+
+@lru_cache(maxsize=None)
+def _early_closes(region):
+    """
+    地域ごとの短縮取引日の集合（東証は短縮取引なし）
+    """
+    if region != "US":
+        return frozenset()
+    return frozenset(
+        day
+        for year in range(FIRST_YEAR, LAST_YEAR + 1)
+        for day in us_early_closes(year)
+    )
+
+
+@lru_cache(maxsize=None)
+def get_calendar(exchange):
+    """
+    市場ごとの営業日カレンダー（numpyのbusdaycalendar）
+    """
+    region = EXCHANGE_CALENDARS.get((exchange or "").upper())
+    if region is None:
+        return np.busdaycalendar()
+
+    rule = japan_holidays if region == "JP" else us_market_holidays
+    holidays = sorted(
+        day for year in range(FIRST_YEAR, LAST_YEAR + 1) for day in rule(year)
+    )
+    return np.busdaycalendar(holidays=np.array(holidays, dtype="datetime64[D]"))
+
+
+def is_trading_day(exchange, day):
+    """
+    指定日が取引日かどうか（配列を渡すとまとめて判定）
+    """
+    return np.is_busday(
+        np.asarray(day, dtype="datetime64[D]"), busdaycal=get_calendar(exchange)
+    )
+
+
+def trading_days(exchange, start_date, end_date):
+    """
+    start_dateからend_dateまで（両端を含む）の取引日の配列
+    """
+    start = np.datetime64(start_date, "D")
+    end = np.datetime64(end_date, "D") + 1
+    if end <= start:
+        return np.array([], dtype="datetime64[D]")
+    days = np.arange(start, end, dtype="datetime64[D]")
+    return days[np.is_busday(days, busdaycal=get_calendar(exchange))]
+
+
+def sessions_between(exchange, start_date, end_date):
+    """
+    start_dateの翌日からend_dateまでに含まれる取引日数
+    """
+    return int(
+        np.busday_count(
+            start_date + timedelta(days=1),
+            end_date + timedelta(days=1),
+            busdaycal=get_calendar(exchange),
+        )
+    )
+
+
+def add_sessions(exchange, start_date, sessions):
+    """
+    start_dateからsessions取引日後の日付（start_dateが休場日の場合は直前の取引日から数える）
+    """
+    return np.busday_offset(
+        start_date, sessions, roll="backward", busdaycal=get_calendar(exchange)
+    ).astype(object)
+
+
+def previous_session(exchange, day):
+    """
+    指定日以前で最も新しい取引日
+    """
+    return add_sessions(exchange, day, 0)
+
+
+def market_hours(exchange, day=None):
+    """
+    市場の（タイムゾーン, 取引開始, 取引終了）。未知の市場はUTCの終日として扱う
+    dayを指定すると、短縮取引日はその日の取引終了時刻を返す
+    """
+    region = EXCHANGE_CALENDARS.get((exchange or "").upper())
+    if region is None:
+        return ZoneInfo("UTC"), time(0, 0), time(23, 59, 59)
+    zone, open_time, close_time = MARKET_HOURS[region]
+    if day is not None and day in _early_closes(region):
+        close_time = US_EARLY_CLOSE
+    return ZoneInfo(zone), open_time, close_time
+
+
+def is_market_open(exchange, now=None):
+    """
+    指定時刻（timezone-aware）に市場が取引時間中かどうか
+    """
+    zone = market_hours(exchange)[0]
+    local = (now or datetime.now(zone)).astimezone(zone)
+    _, open_time, close_time = market_hours(exchange, local.date())
+    return bool(is_trading_day(exchange, local.date())) and (
+        open_time <= local.time() < close_time
+    )
+
+
+def last_closed_session(exchange, now=None):
+    """
+    指定時刻までに取引が終了している最新の取引日（その日の日足が確定している最新の日）
+    """
+    zone = market_hours(exchange)[0]
+    local = (now or datetime.now(zone)).astimezone(zone)
+    if local.time() >= market_hours(exchange, local.date())[2]:
+        return previous_session(exchange, local.date())
+    return previous_session(exchange, local.date() - timedelta(days=1))
+
+
+def session_close(exchange, day):
+    """
+    取引日の取引終了時刻（timezone-aware。短縮取引日は短縮後の時刻）
+    """
+    zone, _, close_time = market_hours(exchange, day)
+    return datetime.combine(day, close_time, tzinfo=zone)
@@ -8,9 +8,20 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("stock/<str:symbol>/", views.stock_detail, name="stock_detail"),
     path("prediction/<str:symbol>/", views.prediction, name="prediction"),
+    path("screener/", views.screener, name="screener"),
+    path("api/screener/", views.screener_api, name="screener_api"),
+    path("api/compare/", views.compare_api, name="compare_api"),
+    path("api/refresh-queue/", views.refresh_queue_api, name="refresh_queue_api"),
+    path("api/data-gaps/<str:symbol>/", views.data_gaps_api, name="data_gaps_api"),
     path("api/chart-data/<str:symbol>/", views.chart_data_api, name="chart_data_api"),
+    path(
+        "api/similar-patterns/<str:symbol>/",
+        views.similar_patterns_api,
+        name="similar_patterns_api",
+    ),
     path(
         "update-stock/<str:symbol>/", views.update_stock_data, name="update_stock_data"
     ),
     path("delete-stock/<str:symbol>/", views.delete_stock, name="delete_stock"),
+    path("metrics", views.metrics, name="metrics"),
 ]
@@ -1,352 +1,146 @@
-import random
 import time
 import warnings
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from django.conf import settings
+from django.db.models import Q
+
 import numpy as np
 import pandas as pd
-import requests
-import yfinance as yf
-
-# 機械学習関連
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
 
+from .instrumentation import annotate, stage, timed
+from .model_selection import select_model
 from .models import StockPrediction, StockPrice
+from .page_cache import batched_invalidation, invalidate_stocks
+from .providers import fetch_stock_data
+from .trading_calendar import add_sessions, last_closed_session, sessions_between
 
 warnings.filterwarnings("ignore")
 
-# Alpha Vantage用（フリーAPI）
-ALPHA_VANTAGE_API_KEY = "demo"  # デモ用キー、本番では専用キーを取得
-
-
-def fetch_stock_data_alpha_vantage(symbol, period="1y"):
+# 機械学習で使用する特徴量（create_featuresで作成される列）
+FEATURE_COLUMNS = [
+    "ma_5",
+    "ma_10",
+    "ma_20",
+    "rsi",
+    "macd",
+    "volatility",
+    "price_change_1d",
+    "price_change_5d",
+    "volume_ratio",
+    "high_low_ratio",
+    "bb_position",
+]
+
+# 予想の手法（StockPrediction.methodの「（」より前。括弧内はモデル名・トレンド）
+ML_METHOD_PREFIX = "機械学習"
+MA_METHOD_PREFIX = "改良移動平均"
+
+
+def method_family(method):
     """
-    Alpha Vantage APIから株価データを取得（代替手段）
+    予想の手法名からモデル名・トレンドを除いた手法（例: "機械学習（Ridge）" -> "機械学習"）
     """
-    try:
-        # 日本株の場合のシンボル変換
-        if symbol.isdigit():
-            # 日本株は対応していないので、デモデータにフォールバック
-            print(
-                f"Alpha Vantage does not support Japanese stocks ({symbol}), using demo data"
-            )
-            return generate_demo_stock_data(symbol, period), True
-
-        # 米国株のみ対応
-        av_symbol = symbol.replace(".T", "")  # .Tを削除
-
-        # Alpha Vantage APIエンドポイント（デモキー使用）
-        url = "https://www.alphavantage.co/query"
-        params = {
-            "function": "TIME_SERIES_DAILY",
-            "symbol": av_symbol,
-            "apikey": ALPHA_VANTAGE_API_KEY,
-            "outputsize": "compact",  # 最新100日分
-        }
-
-        print(f"Trying Alpha Vantage API for {av_symbol}...")
-        response = requests.get(url, params=params, timeout=10)
-
-        if response.status_code == 200:
-            data_json = response.json()
-
-            if "Time Series (Daily)" in data_json:
-                time_series = data_json["Time Series (Daily)"]
-
-                data = []
-                for date_str, values in list(time_series.items())[:30]:  # 最新30日
-                    try:
-                        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-                        data.append(
-                            {
-                                "date": date_obj,
-                                "open": float(values["1. open"]),
-                                "high": float(values["2. high"]),
-                                "low": float(values["3. low"]),
-                                "close": float(values["4. close"]),
-                                "volume": int(values["5. volume"]),
-                            }
-                        )
-                    except (ValueError, KeyError) as e:
-                        print(
-                            f"Error processing Alpha Vantage data for {date_str}: {e}"
-                        )
-                        continue
-
-                # 日付順にソート
-                data.sort(key=lambda x: x["date"])
-
-                if data:
-                    print(
-                        f"✅ Alpha Vantage: Retrieved {len(data)} records for {av_symbol}"
-                    )
-                    return data, False
+    return method.split("（")[0]
 
-        print(f"Alpha Vantage API failed for {av_symbol}")
-        return None, True
 
-    except Exception as e:
-        print(f"Alpha Vantage error for {symbol}: {e}")
-        return None, True
-
-
-def fetch_stock_data(symbol, period="1y", max_retries=3, use_demo=False):
-    """
-    複数のAPIから株価データを取得（改善版）
-    """
-    # 入力の検証
-    if not symbol or "," in symbol:
-        print(f"Invalid symbol: {symbol}")
-        return None, True  # (data, is_demo)
-
-    # デモデータを強制的に使用する場合
-    if use_demo:
-        print(f"Using demo data as requested for {symbol}")
-        return generate_demo_stock_data(symbol, period), True
-
-    print(f"🔍 Fetching REAL data for symbol: {symbol}")
-
-    # 1. Alpha Vantage APIを最初に試す（より安定）
-    print("1️⃣ Trying Alpha Vantage API...")
-    data, is_demo = fetch_stock_data_alpha_vantage(symbol, period)
-    if data and not is_demo:
-        return data, False
-
-    # 2. Yahoo Finance APIをフォールバックとして使用
-    print("2️⃣ Trying Yahoo Finance API...")
-
-    # 日本株の場合は.Tを追加（数字のみの場合）
-    if symbol.isdigit():
-        yahoo_symbol = f"{symbol}.T"
-    elif not symbol.endswith(".T") and len(symbol) == 4 and symbol.isdigit():
-        yahoo_symbol = f"{symbol}.T"
-    else:
-        yahoo_symbol = symbol
-
-    print(f"Yahoo symbol: {yahoo_symbol}")
-
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                wait_time = min(15, 5**attempt)  # さらに長い待機時間
-                print(f"Waiting {wait_time} seconds before retry {attempt + 1}...")
-                time.sleep(wait_time)
-
-            # yfinanceの設定を最適化
-            stock = yf.Ticker(yahoo_symbol)
-            stock._session = requests.Session()
-            stock._session.headers.update(
-                {
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                    "Accept-Language": "en-US,en;q=0.5",
-                    "Accept-Encoding": "gzip, deflate, br",
-                    "DNT": "1",
-                    "Connection": "keep-alive",
-                    "Upgrade-Insecure-Requests": "1",
-                    "Sec-Fetch-Dest": "document",
-                    "Sec-Fetch-Mode": "navigate",
-                    "Sec-Fetch-Site": "none",
-                }
-            )
-
-            # より短い期間で試す（レート制限回避）
-            if period == "1y" and attempt > 0:
-                test_period = "3mo"
-            elif period in ["1y", "3mo"] and attempt > 1:
-                test_period = "1mo"
-            else:
-                test_period = period
-
-            print(f"Attempting Yahoo Finance with period: {test_period}")
-
-            # historyメソッドの呼び出し（タイムアウト設定）
-            hist = stock.history(
-                period=test_period,
-                timeout=10,
-                prepost=False,
-                auto_adjust=True,
-                back_adjust=False,
-                repair=True,
-            )
-
-            print(f"Retrieved {len(hist)} records for {yahoo_symbol}")
-
-            if hist.empty:
-                print(f"No data found for {yahoo_symbol} with period {test_period}")
-                if attempt < max_retries - 1:
-                    continue  # リトライ
-                break  # 最後の試行でもデータが空の場合、デモデータ生成へ
-
-            # データフレームを辞書のリストに変換
-            data = []
-            for date, row in hist.iterrows():
-                try:
-                    # NaNや無効な値をスキップ
-                    if pd.isna(row["Close"]) or row["Close"] <= 0:
-                        continue
-
-                    data.append(
-                        {
-                            "date": date.date(),
-                            "open": (
-                                float(row["Open"])
-                                if not pd.isna(row["Open"])
-                                else float(row["Close"])
-                            ),
-                            "high": (
-                                float(row["High"])
-                                if not pd.isna(row["High"])
-                                else float(row["Close"])
-                            ),
-                            "low": (
-                                float(row["Low"])
-                                if not pd.isna(row["Low"])
-                                else float(row["Close"])
-                            ),
-                            "close": float(row["Close"]),
-                            "volume": (
-                                int(row["Volume"]) if not pd.isna(row["Volume"]) else 0
-                            ),
-                        }
-                    )
-                except (ValueError, TypeError) as e:
-                    print(f"Error processing row for {date}: {e}")
-                    continue
-
-            print(f"✅ Successfully processed {len(data)} REAL records for {symbol}")
-            return data, False  # (data, is_demo)
-
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:  # Too Many Requests
-                print(f"Rate limit exceeded (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    continue  # リトライ
-                else:
-                    print(f"Failed after {max_retries} attempts due to rate limiting")
-                    break  # ループを抜けてデモデータ生成へ
-            else:
-                print(f"HTTP Error {e.response.status_code}: {e}")
-                break  # ループを抜けてデモデータ生成へ
-        except Exception as e:
-            print(f"Error fetching data for {symbol} (attempt {attempt + 1}): {e}")
-            if attempt == max_retries - 1:  # 最後の試行
-                break  # ループを抜けてデモデータ生成へ
-            continue  # リトライ
-
-    # Yahoo Finance APIが利用できない場合、デモデータを生成
-    print(f"⚠️  Yahoo Finance API failed, generating DEMO data for {symbol}")
-    return generate_demo_stock_data(symbol, period), True  # (data, is_demo)
-
-
-def generate_demo_stock_data(symbol, period="1y"):
-    """
-    デモ用の株価データを生成
-    """
-    # 期間の設定
-    if period == "1d":
-        days = 1
-    elif period == "5d":
-        days = 5
-    elif period == "1mo":
-        days = 30
-    elif period == "3mo":
-        days = 90
-    elif period == "6mo":
-        days = 180
-    else:  # 1y or other
-        days = 365
-
-    # 基準価格の設定（銘柄別）
-    base_prices = {
-        "7203": 2800,  # トヨタ自動車
-        "9984": 6000,  # ソフトバンクグループ
-        "6758": 1200,  # ソニーグループ
-        "7974": 9000,  # 任天堂
-        "4063": 12000,  # 信越化学工業
-    }
-
-    base_price = base_prices.get(symbol, 3000)  # デフォルト価格
-
-    data = []
-    current_price = base_price
-
-    for i in range(days):
-        date = datetime.now().date() - timedelta(days=days - i - 1)
-
-        # ランダムな価格変動（±3%以内）
-        daily_change = random.uniform(-0.03, 0.03)
-        current_price = current_price * (1 + daily_change)
-
-        # 日中の変動を模擬
-        day_high = current_price * random.uniform(1.0, 1.02)
-        day_low = current_price * random.uniform(0.98, 1.0)
-        open_price = current_price * random.uniform(0.99, 1.01)
-
-        # 出来高（百万株単位）
-        volume = random.randint(1000000, 10000000)
-
-        data.append(
-            {
-                "date": date,
-                "open": round(open_price, 2),
-                "high": round(day_high, 2),
-                "low": round(day_low, 2),
-                "close": round(current_price, 2),
-                "volume": volume,
-            }
-        )
-
-    print(f"Generated {len(data)} demo records for {symbol}")
-    return data
-
-
-def update_stock_prices(stock_obj, use_demo=False):
+@timed("update_stock_prices")
+def update_stock_prices(
+    stock_obj, use_demo=False, prefetched=None, refresh_factors=True
+):
     """
     特定の銘柄の株価データを更新
+    prefetchedに取得済みの(data, is_demo)を渡すと取得せずに保存だけ行う
+    refresh_factors: 足を保存したら市場ファクターも更新する（複数銘柄の取り込み後にまとめて更新する場合はFalse）
     """
+    annotate(symbol=stock_obj.symbol)
     print(f"Updating stock prices for {stock_obj.symbol}")
 
-    # API呼び出し前に少し待機（レート制限対策）
-    time.sleep(1)
-
-    data, is_demo = fetch_stock_data(stock_obj.symbol, use_demo=use_demo)
+    # 最新の足が直近の取引日まで揃っていれば取得しない（休場日・取引時間中の無駄なAPI呼び出しを避ける）
+    if not use_demo:
+        latest_date = (
+            StockPrice.objects.filter(stock=stock_obj)
+            .order_by("-date")
+            .values_list("date", flat=True)
+            .first()
+        )
+        # 取引中・取引終了前の当日分はまだ確定していないため、取引終了済みの最新の取引日と比べる
+        last_session = last_closed_session(stock_obj.exchange)
+        if latest_date is not None and latest_date >= last_session:
+            print(f"⏭️ {stock_obj.symbol} is up to date (last session {last_session})")
+            annotate(skipped=True)
+            return 0, False
+
+    if prefetched is not None:
+        data, is_demo = prefetched
+    else:
+        # API呼び出し前に少し待機（レート制限対策）
+        time.sleep(1)
+        data, is_demo = fetch_stock_data(stock_obj.symbol, use_demo=use_demo)
     if not data:
         print(f"No data retrieved for {stock_obj.symbol}")
         return 0, True
 
     updated_count = 0
-    for record in data:
-        try:
-            price_obj, created = StockPrice.objects.get_or_create(
-                stock=stock_obj,
-                date=record["date"],
-                defaults={
-                    "open_price": Decimal(str(record["open"])),
-                    "high_price": Decimal(str(record["high"])),
-                    "low_price": Decimal(str(record["low"])),
-                    "close_price": Decimal(str(record["close"])),
-                    "volume": record["volume"],
-                },
-            )
-            if created:
-                updated_count += 1
-        except Exception as e:
-            print(
-                f"Error saving price data for {stock_obj.symbol} on {record['date']}: {e}"
-            )
-            continue
+    first_new_date = None
+    # 行ごとの保存によるキャッシュの無効化は取り込みの最後に1回にまとめる
+    with batched_invalidation(), stage("ingest") as ingest:
+        for record in data:
+            try:
+                price_obj, created = StockPrice.objects.get_or_create(
+                    stock=stock_obj,
+                    date=record["date"],
+                    defaults={
+                        "open_price": Decimal(str(record["open"])),
+                        "high_price": Decimal(str(record["high"])),
+                        "low_price": Decimal(str(record["low"])),
+                        "close_price": Decimal(str(record["close"])),
+                        "volume": record["volume"],
+                    },
+                )
+                ingest.count("rows")
+                if created:
+                    updated_count += 1
+                    if first_new_date is None or record["date"] < first_new_date:
+                        first_new_date = record["date"]
+            except Exception as e:
+                print(
+                    f"Error saving price data for {stock_obj.symbol} on {record['date']}: {e}"
+                )
+                continue
 
     data_type = "DEMO" if is_demo else "REAL"
     print(f"Updated {updated_count} {data_type} price records for {stock_obj.symbol}")
+
+    if first_new_date is not None:
+        with stage("process_new_prices"):
+            process_new_prices(stock_obj, first_new_date)
+        if refresh_factors and settings.ML_USE_MARKET_FACTORS:
+            # 予想は計算済みのファクターを読むだけのため、画面からの取り込みでも新しい足の分を計算しておく
+            from .market_factors import refresh_market_factors
+
+            with stage("market_factors"):
+                refresh_market_factors()
+
+    annotate(inserted=updated_count, demo=is_demo)
     return updated_count, is_demo
 
 
+def process_new_prices(stock_obj, first_new_date):
+    """
+    新しい足の影響を受ける行だけ特徴量を再計算し、予測日を迎えた予想を採点
+    """
+    from .accuracy import score_matured_predictions
+    from .feature_store import update_stock_features
+    from .online_learning import update_online_models
+
+    update_stock_features(stock_obj, start_date=first_new_date)
+    # オンライン学習を使っている銘柄は新しい行だけでモデルを更新
+    update_online_models(stock_obj)
+    score_matured_predictions(stock_obj)
+
+
 def calculate_moving_average(prices, window=20):
     """
     移動平均を計算
@@ -357,100 +151,249 @@ def calculate_moving_average(prices, window=20):
     return sum(prices[-window:]) / window
 
 
-def ml_prediction(stock_obj, days_ahead=7):
+def simulate_prediction_bands(closes, days, predicted_price, horizon):
     """
-    機械学習を使った高度な株価予想システム
+    直近の終値から価格パスをシミュレーションし、1日目からdays日目までの予測区間を計算
+    パスの中央値（p50）はhorizon日目に予想価格となるように合わせる
+    予想価格・終値が正でないなどシミュレーションできない場合は空のリスト（予測区間なし）を返す
     """
+    from .simulation import log_returns, simulate_bands
+
+    closes = np.asarray(closes, dtype=np.float64)
+    current_price = closes[-1]
+    predicted_price = float(predicted_price)
+    if not (np.isfinite(predicted_price) and predicted_price > 0):
+        print(f"⚠️ No prediction bands for predicted price {predicted_price}")
+        return []
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = log_returns(closes[-(settings.SIMULATION_CALIBRATION_BARS + 1) :])
+        drift = np.log(predicted_price / current_price) / horizon
     try:
-        print(f"🤖 Starting ML prediction for {stock_obj.symbol}")
+        price_bands = simulate_bands(
+            current_price,
+            returns,
+            days,
+            n_paths=settings.SIMULATION_PATHS,
+            method=settings.SIMULATION_METHOD,
+            drift=drift,
+        )
+    except ValueError as e:
+        print(f"⚠️ No prediction bands: {e}")
+        return []
 
-        # 十分なデータを取得（最低60日）
-        price_data = StockPrice.objects.filter(stock=stock_obj).order_by("date")
+    # NaNの分位点をDecimal('NaN')として保存しない
+    if not all(np.isfinite(value) for band in price_bands for value in band.values()):
+        print("⚠️ No prediction bands: simulation produced non-finite prices")
+        return []
+    return price_bands
 
-        if len(price_data) < 60:
-            print(f"❌ Insufficient data: {len(price_data)} records (need at least 60)")
-            return None
 
-        # データをDataFrameに変換
-        df = pd.DataFrame(
-            [
-                {
-                    "date": p.date,
-                    "open": float(p.open_price),
-                    "high": float(p.high_price),
-                    "low": float(p.low_price),
-                    "close": float(p.close_price),
-                    "volume": p.volume,
-                }
-                for p in price_data
-            ]
-        )
+def band_limit(price_bands, horizon, key):
+    """
+    horizon日目の予測区間の分位点（"p5"など）。予測区間がない場合はNone
+    """
+    if len(price_bands) < horizon:
+        return None
+    return price_bands[horizon - 1][key]
 
-        df = df.sort_values("date").reset_index(drop=True)
 
-        # 特徴量エンジニアリング
-        df = create_features(df)
+def price_decimal(value):
+    """
+    価格を小数2桁のDecimalに変換（Noneはそのまま）
+    """
+    return None if value is None else Decimal(str(round(value, 2)))
 
-        # NaN値を除去
-        df = df.dropna()
 
-        if len(df) < 30:
-            print(f"❌ Insufficient data after feature engineering: {len(df)} records")
-            return None
+def serialize_price_bands(price_bands):
+    """
+    予測区間をJSONFieldに保存できる形式（日付は文字列、価格は小数2桁）に変換
+    """
+    serialized = []
+    for band in price_bands:
+        row = {"horizon": band["horizon"]}
+        if "prediction_date" in band:
+            row["prediction_date"] = band["prediction_date"].isoformat()
+        for key in band:
+            if key.startswith("p") and key != "prediction_date":
+                row[key] = round(band[key], 2)
+        serialized.append(row)
+    return serialized
+
+
+@timed("ml_prediction")
+def ml_prediction(
+    stock_obj,
+    days_ahead=7,
+    lookback=None,
+    horizons=None,
+    profile="fast",
+    mode=None,
+):
+    """
+    機械学習を使った高度な株価予想システム
+    lookback: 学習に使う直近の足の本数（省略時はML_TRAINING_LOOKBACK_BARS）
+    horizons: 追加で予想する営業日数のリスト（省略時はML_PREDICTION_HORIZONS）
+    profile: モデル選択のプロファイル（"fast"または"thorough"）
+    mode: "batch"（毎回再学習）または"online"（逐次更新済みモデル、省略時は設定値）
+    """
+    # 特徴量ストア・オンライン学習はutilsの関数を使うため関数内でインポート
+    from .feature_store import load_feature_frame, update_stock_features
+    from .market_factors import MARKET_FEATURE_COLUMNS, join_market_factors
+    from .online_learning import online_predict
 
-        # 特徴量とターゲットを準備
-        feature_cols = [
-            "ma_5",
-            "ma_10",
-            "ma_20",
-            "rsi",
-            "macd",
-            "volatility",
-            "price_change_1d",
-            "price_change_5d",
-            "volume_ratio",
-            "high_low_ratio",
-            "bb_position",
-        ]
-
-        X = df[feature_cols]
-        y = df["close"]
-
-        # 機械学習モデルで予想
-        prediction_result = train_and_predict(X, y, stock_obj.symbol)
+    mode = mode or settings.ML_PREDICTION_MODE
+    annotate(symbol=stock_obj.symbol, mode=mode, profile=profile)
 
-        if not prediction_result:
-            return None
+    try:
+        started = time.perf_counter()
+        print(f"🤖 Starting ML prediction for {stock_obj.symbol} ({mode})")
 
-        # 信頼度の計算（改良版）
-        confidence = calculate_ml_confidence(prediction_result, df)
+        with stage("load_features"):
+            # 十分なデータがあるか確認（最低60日）
+            price_count = StockPrice.objects.filter(stock=stock_obj).count()
 
-        # 予想データを保存（同日の既存予想は削除してから新規作成）
-        prediction_date = datetime.now().date() + timedelta(days=days_ahead)
+            if price_count < 60:
+                print(f"❌ Insufficient data: {price_count} records (need at least 60)")
+                return None
 
-        # 同日の既存予想を削除
-        StockPrediction.objects.filter(
-            stock=stock_obj, prediction_date=prediction_date
-        ).delete()
+            # 特徴量ストアを最新化してから読み込む（新しい足の分のみ計算）
+            update_stock_features(stock_obj)
+            if lookback is None:
+                lookback = settings.ML_TRAINING_LOOKBACK_BARS
+            df = load_feature_frame(stock_obj, lookback=lookback)
+            annotate(rows=len(df))
 
-        # 新しい予想を作成
-        StockPrediction.objects.create(
-            stock=stock_obj,
-            prediction_date=prediction_date,
-            predicted_price=Decimal(
-                str(round(prediction_result["predicted_price"], 2))
+        if len(df) < 30:
+            print(f"❌ Insufficient data after feature engineering: {len(df)} records")
+            return None
+
+        # 全銘柄共通の市場ファクターを日付で結合（計算は株価の取り込み側で行い、ここでは読むだけ）
+        feature_columns = FEATURE_COLUMNS
+        if settings.ML_USE_MARKET_FACTORS:
+            with stage("market_factors"):
+                df = join_market_factors(stock_obj, df)
+            feature_columns = FEATURE_COLUMNS + MARKET_FEATURE_COLUMNS
+
+        # 予想する期間（営業日数）を決定
+        # days_ahead日後までの営業日数を先頭にして、追加の期間もまとめて予想する
+        last_date = df["date"].iloc[-1].date()
+        current_price = float(df["close"].iloc[-1])
+        main_horizon = max(
+            1,
+            sessions_between(
+                stock_obj.exchange,
+                last_date,
+                datetime.now().date() + timedelta(days_ahead),
             ),
-            confidence=confidence,
-            method=f"機械学習（{prediction_result['best_model']}）",
         )
+        if horizons is None:
+            horizons = settings.ML_PREDICTION_HORIZONS
+        horizons = [main_horizon] + sorted(set(horizons) - {main_horizon})
+
+        with stage("train"):
+            if mode == "online":
+                prediction_result = online_predict(stock_obj, df, horizons)
+            else:
+                prediction_result = batch_predict(
+                    stock_obj, df, horizons, profile, feature_columns=feature_columns
+                )
 
+        if not prediction_result:
+            return None
+
+        with stage("simulate"):
+            # 直近のリターンで価格パスをシミュレーションし、日ごとの予測区間を計算
+            # 中央値は主期間の予想価格に合わせる
+            price_bands = simulate_prediction_bands(
+                df["close"].to_numpy(),
+                max(horizons),
+                prediction_result["predicted_prices"][main_horizon],
+                main_horizon,
+            )
+            for band in price_bands:
+                band["prediction_date"] = add_sessions(
+                    stock_obj.exchange, last_date, band["horizon"]
+                )
+
+        with stage("confidence"):
+            # 期間ごとに信頼度を計算して予想データを作成
+            horizon_predictions = []
+            for horizon in horizons:
+                predicted_price = prediction_result["predicted_prices"][horizon]
+                # 信頼度の計算（改良版）
+                confidence = calculate_ml_confidence(
+                    {**prediction_result, "predicted_price": predicted_price}, df
+                )
+                horizon_predictions.append(
+                    {
+                        "horizon": horizon,
+                        "prediction_date": add_sessions(
+                            stock_obj.exchange, last_date, horizon
+                        ),
+                        "predicted_price": predicted_price,
+                        "confidence": confidence,
+                        "lower_price": band_limit(price_bands, horizon, "p5"),
+                        "upper_price": band_limit(price_bands, horizon, "p95"),
+                    }
+                )
+
+        with stage("save"):
+            # 予想データを保存（同じ予測日・予測期間・手法の既存予想は削除してから新規作成）
+            # 予測期間が違う予想は採点前のため残す（予測期間ごとの精度の集計に使う）
+            same_targets = Q()
+            for p in horizon_predictions:
+                same_targets |= Q(
+                    prediction_date=p["prediction_date"], horizon=p["horizon"]
+                )
+            StockPrediction.objects.filter(
+                same_targets,
+                stock=stock_obj,
+                method__startswith=method_family(prediction_result["method"]),
+            ).delete()
+
+            StockPrediction.objects.bulk_create(
+                [
+                    StockPrediction(
+                        stock=stock_obj,
+                        prediction_date=p["prediction_date"],
+                        predicted_price=Decimal(str(round(p["predicted_price"], 2))),
+                        confidence=p["confidence"],
+                        method=prediction_result["method"],
+                        base_price=Decimal(str(round(current_price, 2))),
+                        horizon=p["horizon"],
+                        lower_price=price_decimal(p["lower_price"]),
+                        upper_price=price_decimal(p["upper_price"]),
+                        # 日ごとの予測区間は主期間（days_ahead）の予想にまとめて保存
+                        price_bands=(
+                            serialize_price_bands(price_bands[:main_horizon]) or None
+                            if p["horizon"] == main_horizon
+                            else None
+                        ),
+                    )
+                    for p in horizon_predictions
+                ]
+            )
+            # bulk_createはシグナルを送らないため、一覧・詳細画面のキャッシュを明示的に無効化
+            invalidate_stocks([stock_obj.id])
+
+        main = horizon_predictions[0]
         return {
-            "predicted_price": prediction_result["predicted_price"],
-            "confidence": confidence,
+            "predicted_price": main["predicted_price"],
+            "confidence": main["confidence"],
             "trend": prediction_result["trend"],
             "model_accuracy": prediction_result["accuracy"],
             "feature_importance": prediction_result["feature_importance"],
             "best_model": prediction_result["best_model"],
+            "prediction_date": main["prediction_date"],
+            "horizon_predictions": sorted(
+                horizon_predictions, key=lambda p: p["horizon"]
+            ),
+            "lower_price": main["lower_price"],
+            "upper_price": main["upper_price"],
+            "price_bands": price_bands[:main_horizon],
+            "mode": mode,
+            "elapsed": time.perf_counter() - started,
         }
 
     except Exception as e:
@@ -461,6 +404,37 @@ def ml_prediction(stock_obj, days_ahead=7):
         return None
 
 
+def batch_predict(stock_obj, df, horizons, profile="fast", feature_columns=None):
+    """
+    各期間先の終値を目的変数とし、共通の特徴量行列で同時に学習して予想
+    """
+    # 目的変数が確定している（最長期間より前の）行だけを学習に使う
+    X = df[feature_columns or FEATURE_COLUMNS]
+    y = pd.DataFrame({h: df["close"].shift(-h) for h in horizons})
+    train_rows = len(df) - max(horizons)
+
+    if train_rows < 30:
+        print(f"❌ Insufficient data for {max(horizons)}-session horizon")
+        return None
+
+    # 機械学習モデルで予想
+    prediction_result = train_and_predict(
+        X.iloc[:train_rows],
+        y.iloc[:train_rows],
+        stock_obj.symbol,
+        latest_X=X.tail(1),
+        current_price=float(df["close"].iloc[-1]),
+        profile=profile,
+        gap=max(horizons),
+    )
+    if prediction_result:
+        prediction_result["method"] = (
+            f"{ML_METHOD_PREFIX}（{prediction_result['best_model']}）"
+        )
+    return prediction_result
+
+
+@timed("create_features")
 def create_features(df):
     """
     高度な特徴量を作成
@@ -521,85 +495,62 @@ def calculate_macd(prices, fast=12, slow=26, signal=9):
     return macd
 
 
-def train_and_predict(X, y, symbol):
+@timed("train_and_predict")
+def train_and_predict(
+    X, y, symbol, latest_X=None, current_price=None, profile="fast", gap=0
+):
     """
-    複数の機械学習モデルを訓練して最適なものを選択
+    複数の機械学習モデルを時系列交差検証で評価して最適なものを選択
+    yがDataFrameの場合は全列を同時に学習し（マルチアウトプット）、
+    列ごとの予想をpredicted_prices、先頭列の予想をpredicted_priceとして返す
+    latest_X: 予想に使う特徴量（省略時はXの最終行）
+    current_price: 現在価格（省略時はyの最終値）
+    profile: モデル選択のプロファイル（"fast"は画面向け、"thorough"は夜間バッチ向け）
+    gap: 目的変数の先読み期間（交差検証で学習と検証の間を空ける行数）
     """
+    if latest_X is None:
+        latest_X = X.tail(1)
+    annotate(symbol=symbol, profile=profile, rows=len(X), features=X.shape[1])
     try:
-        # データを訓練・テスト用に分割
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.3, random_state=42, shuffle=False
-        )
-
-        # 特徴量の標準化
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
+        with stage("select_model"):
+            selection = select_model(X, y, profile=profile, gap=gap)
+        best_model = selection["model"]
+        best_model_name = selection["name"]
+        annotate(best_model=best_model_name)
 
-        models = {
-            "RandomForest": RandomForestRegressor(
-                n_estimators=100, random_state=42, max_depth=10
-            ),
-            "LinearRegression": LinearRegression(),
-        }
+        # 最新データで予測
+        with stage("predict"):
+            latest_pred = np.atleast_1d(best_model.predict(latest_X)[0])
 
-        best_model = None
-        best_score = -np.inf
-        best_model_name = ""
-        predictions = {}
+        # 特徴量重要度（RandomForestの場合）
         feature_importance = {}
+        if hasattr(best_model, "feature_importances_"):
+            feature_importance = dict(zip(X.columns, best_model.feature_importances_))
 
-        # 各モデルを評価
-        for name, model in models.items():
-            try:
-                if name == "LinearRegression":
-                    model.fit(X_train_scaled, y_train)
-                    pred = model.predict(X_test_scaled)
-                    # 最新データで予測
-                    latest_pred = model.predict(scaler.transform(X.tail(1)))[0]
-                else:
-                    model.fit(X_train, y_train)
-                    pred = model.predict(X_test)
-                    # 最新データで予測
-                    latest_pred = model.predict(X.tail(1))[0]
-
-                score = r2_score(y_test, pred)
-                predictions[name] = latest_pred
-
-                # 特徴量重要度（RandomForestの場合）
-                if hasattr(model, "feature_importances_"):
-                    feature_importance[name] = dict(
-                        zip(X.columns, model.feature_importances_)
-                    )
-
-                print(f"📊 {name} R² Score: {score:.4f}")
-
-                if score > best_score:
-                    best_score = score
-                    best_model = model
-                    best_model_name = name
-
-            except Exception as e:
-                print(f"❌ Model {name} failed: {e}")
-                continue
-
-        if best_model is None:
-            return None
+        print(
+            f"🏆 Selected {best_model_name} ({selection['profile']}, "
+            f"{selection['elapsed']:.2f}s)"
+        )
 
         # 最終予測値
-        current_price = float(y.iloc[-1])
-        predicted_price = predictions[best_model_name]
+        if current_price is None:
+            current_price = float(np.ravel(y)[-1])
+        targets = list(y.columns) if isinstance(y, pd.DataFrame) else [y.name]
+        predicted_prices = dict(zip(targets, latest_pred.tolist()))
+        predicted_price = predicted_prices[targets[0]]
         trend = "上昇" if predicted_price > current_price else "下降"
 
         return {
             "predicted_price": predicted_price,
+            "predicted_prices": predicted_prices,
             "current_price": current_price,
             "trend": trend,
-            "accuracy": max(0, best_score),
+            "accuracy": max(0, selection["score"]),
             "best_model": best_model_name,
-            "feature_importance": feature_importance.get(best_model_name, {}),
-            "all_predictions": predictions,
+            "feature_importance": feature_importance,
+            "all_scores": selection["scores"],
             "symbol": symbol,
+            "model": best_model,
         }
 
     except Exception as e:
@@ -713,14 +664,14 @@ def calculate_ml_confidence(prediction_result, df):
         return 58.0  # デフォルト値
 
 
-def simple_prediction(stock_obj, days_ahead=7):
+def simple_prediction(stock_obj, days_ahead=7, profile="fast", mode=None):
     """
     機械学習を最初に試行し、失敗時は従来手法にフォールバック
     """
     print(f"🎯 Starting prediction for {stock_obj.symbol}")
 
     # まず機械学習による予想を試行
-    ml_result = ml_prediction(stock_obj, days_ahead)
+    ml_result = ml_prediction(stock_obj, days_ahead, profile=profile, mode=mode)
     if ml_result:
         print(
             f"✅ ML prediction successful with {ml_result['confidence']:.1f}% confidence"
@@ -732,15 +683,18 @@ def simple_prediction(stock_obj, days_ahead=7):
     # 従来手法にフォールバック
     try:
         # 最新の価格データを取得
-        recent_prices = StockPrice.objects.filter(stock=stock_obj).order_by("-date")[
-            :30
-        ]
+        recent_prices = list(
+            StockPrice.objects.filter(stock=stock_obj)
+            .order_by("-date")
+            .values_list("date", "close_price")[:30]
+        )
+        recent_closes = [close for _, close in recent_prices]
 
-        if len(recent_prices) < 20:
+        if len(recent_closes) < 20:
             return None
 
-        # 終値のリストを作成
-        close_prices = [float(price.close_price) for price in reversed(recent_prices)]
+        # 終値のリストを作成（古い順）
+        close_prices = np.array(recent_closes[::-1], dtype=np.float64).tolist()
 
         # 短期・長期移動平均を計算
         ma_5 = calculate_moving_average(close_prices, 5)
@@ -793,7 +747,7 @@ def simple_prediction(stock_obj, days_ahead=7):
             volatility_factor = 0.75
 
         # データ品質による係数
-        data_count = len(recent_prices)
+        data_count = len(recent_closes)
         if data_count >= 30:
             data_factor = 1.06
         elif data_count >= 25:
@@ -820,12 +774,33 @@ def simple_prediction(stock_obj, days_ahead=7):
         confidence = max(48.0, min(confidence, 72.0))
         confidence = round(confidence, 2)
 
-        # 予想データを保存（同日の既存予想は削除してから新規作成）
-        prediction_date = datetime.now().date() + timedelta(days=days_ahead)
+        # 予測日はdays_ahead日後までの取引日数を最新の足から数えた取引日
+        last_date = recent_prices[0][0]
+        days = max(
+            1,
+            sessions_between(
+                stock_obj.exchange,
+                last_date,
+                datetime.now().date() + timedelta(days=days_ahead),
+            ),
+        )
+        prediction_date = add_sessions(stock_obj.exchange, last_date, days)
+
+        # 直近の終値で価格パスをシミュレーションして予測区間を計算
+        price_bands = simulate_prediction_bands(
+            close_prices, days, predicted_price, days
+        )
+        for band in price_bands:
+            band["prediction_date"] = add_sessions(
+                stock_obj.exchange, last_date, band["horizon"]
+            )
 
-        # 同日の既存予想を削除
+        # 予想データを保存（同じ予測日・予測期間・手法の既存予想は削除してから新規作成）
         StockPrediction.objects.filter(
-            stock=stock_obj, prediction_date=prediction_date
+            stock=stock_obj,
+            prediction_date=prediction_date,
+            horizon=days,
+            method__startswith=MA_METHOD_PREFIX,
         ).delete()
 
         # 新しい予想を作成
@@ -834,7 +809,12 @@ def simple_prediction(stock_obj, days_ahead=7):
             prediction_date=prediction_date,
             predicted_price=Decimal(str(round(predicted_price, 2))),
             confidence=confidence,
-            method=f"改良移動平均（{trend}トレンド）",
+            method=f"{MA_METHOD_PREFIX}（{trend}トレンド）",
+            base_price=Decimal(str(round(last_price, 2))),
+            horizon=days,
+            lower_price=price_decimal(band_limit(price_bands, days, "p5")),
+            upper_price=price_decimal(band_limit(price_bands, days, "p95")),
+            price_bands=serialize_price_bands(price_bands) or None,
         )
 
         print("📈 従来手法信頼度システム:")
@@ -854,6 +834,10 @@ def simple_prediction(stock_obj, days_ahead=7):
             "ma_20": ma_20,
             "volatility": price_volatility,
             "trend_strength": trend_strength,
+            "lower_price": band_limit(price_bands, days, "p5"),
+            "upper_price": band_limit(price_bands, days, "p95"),
+            "price_bands": price_bands,
+            "prediction_date": prediction_date,
             "method": "traditional",
         }
 
@@ -884,19 +868,3 @@ def calculate_volatility(prices):
     volatility = variance**0.5
 
     return volatility
-
-
-def get_chart_data(stock_obj, days=30):
-    """
-    チャート表示用のデータを取得
-    """
-    prices = StockPrice.objects.filter(stock=stock_obj).order_by("-date")[:days]
-
-    data = {"dates": [], "prices": [], "volumes": []}
-
-    for price in reversed(prices):
-        data["dates"].append(price.date.strftime("%m/%d"))  # 月日のみ表示（MM/DD形式）
-        data["prices"].append(float(price.close_price))
-        data["volumes"].append(price.volume)
-
-    return data
@@ -1,15 +1,26 @@
 import json
 
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.views.decorators.http import require_http_methods
 
+from asgiref.sync import sync_to_async
+
+from .charts import aget_chart_data, chart_days_bucket, get_chart_data, slice_chart_data
+from .db_router import read_from_replica
 from .forms import StockForm
-from .models import Stock, StockPrediction, StockPrice
-from .utils import get_chart_data, simple_prediction, update_stock_prices
+from .metrics import render_metrics
+from .models import PredictionAccuracy, Stock, StockPrediction, StockPrice
+from .page_cache import acached_for_stock, cached_for_stock, cached_many_for_stocks
+from .scheduler import build_refresh_queue, queue_status, record_stock_view
+from .screener import SCREENER_FIELDS, arun_screener, parse_screener_query, run_screener
+from .single_flight import predict_stock, refresh_stock_prices
 
 
+@read_from_replica
 def index(request):
     """
     ホームページ - 登録済み銘柄の一覧表示
@@ -27,7 +38,7 @@ def index(request):
                 use_demo = form.cleaned_data.get("use_demo_data", False)
 
                 # 株価データを取得・更新
-                update_count, is_demo = update_stock_prices(stock, use_demo=use_demo)
+                update_count, is_demo = refresh_stock_prices(stock, use_demo=use_demo)
 
                 if update_count:
                     data_type = "デモデータ" if is_demo else "実際のデータ"
@@ -67,64 +78,107 @@ def index(request):
                         field_label = form.fields[field].label or field
                         messages.error(request, f"{field_label}: {error}")
 
-    # 各銘柄の最新価格を取得
-    stock_data = []
-    for stock in stocks:
-        latest_price = StockPrice.objects.filter(stock=stock).order_by("-date").first()
-        latest_prediction = (
-            StockPrediction.objects.filter(stock=stock).order_by("-created_at").first()
-        )
-
-        stock_data.append(
-            {
-                "stock": stock,
-                "latest_price": latest_price,
-                "latest_prediction": latest_prediction,
-            }
-        )
+    # 各銘柄の最新価格・最新の予想（銘柄ごとにキャッシュし、ない銘柄の分だけまとめて取得）
+    stocks = list(stocks)
+    rows = cached_many_for_stocks(
+        [stock.id for stock in stocks], "index_row", _latest_index_rows
+    )
+    stock_data = [
+        {"stock": stock, "version": rows[stock.id][1], **rows[stock.id][0]}
+        for stock in stocks
+    ]
 
     return render(
-        request, "stocks/index.html", {"stock_data": stock_data, "form": form}
+        request,
+        "stocks/index.html",
+        {
+            "stock_data": stock_data,
+            "form": form,
+            "cache_timeout": settings.PAGE_CACHE_TIMEOUT,
+        },
     )
 
 
+def _latest_index_rows(stock_ids):
+    """
+    一覧の行（最新価格・最新の予想）を銘柄数によらず2回のクエリで取得
+    """
+    latest_prices = StockPrice.objects.filter(
+        stock_id__in=stock_ids,
+        pk=Subquery(
+            StockPrice.objects.filter(stock=OuterRef("stock"))
+            .order_by("-date")
+            .values("id")[:1]
+        ),
+    )
+    latest_predictions = StockPrediction.objects.filter(
+        stock_id__in=stock_ids,
+        pk=Subquery(
+            StockPrediction.objects.filter(stock=OuterRef("stock"))
+            .order_by("-created_at")
+            .values("id")[:1]
+        ),
+    )
+    prices = {price.stock_id: price for price in latest_prices}
+    predictions = {prediction.stock_id: prediction for prediction in latest_predictions}
+    return {
+        stock_id: {
+            "latest_price": prices.get(stock_id),
+            "latest_prediction": predictions.get(stock_id),
+        }
+        for stock_id in stock_ids
+    }
+
+
+@read_from_replica
 def stock_detail(request, symbol):
     """
     個別銘柄の詳細表示
     """
     stock = get_object_or_404(Stock, symbol=symbol)
+    record_stock_view(stock)
 
-    # 最新の株価データ（30日分）
-    prices = StockPrice.objects.filter(stock=stock).order_by("-date")[:30]
-
-    # チャート用データを取得
-    chart_data = get_chart_data(stock, days=30)
-
-    # 最新の予想データ（作成日時順）
-    predictions = StockPrediction.objects.filter(stock=stock).order_by("-created_at")[
-        :5
-    ]
-
+    # 株価・チャート・予想は銘柄ごとにキャッシュ（株価・予想の書き込みで無効化）
+    context, version = cached_for_stock(
+        stock.id, "stock_detail", lambda: _stock_detail_context(stock)
+    )
     context = {
+        **context,
         "stock": stock,
-        "prices": prices,
-        "chart_data": json.dumps(chart_data),
-        "predictions": predictions,
+        "cache_version": version,
+        "cache_timeout": settings.PAGE_CACHE_TIMEOUT,
     }
 
     return render(request, "stocks/stock_detail.html", context)
 
 
+def _stock_detail_context(stock):
+    # チャート用データはチャートデータAPIとキャッシュを共有
+    chart_data, _ = cached_for_stock(
+        stock.id, "chart_data:30", lambda: get_chart_data(stock, days=30)
+    )
+    return {
+        # 最新の株価データ（30日分）
+        "prices": list(StockPrice.objects.filter(stock=stock).order_by("-date")[:30]),
+        "chart_data": json.dumps(chart_data),
+        # 最新の予想データ（作成日時順）
+        "predictions": list(
+            StockPrediction.objects.filter(stock=stock).order_by("-created_at")[:5]
+        ),
+    }
+
+
 def prediction(request, symbol):
     """
     株価予想の表示・実行
     """
     stock = get_object_or_404(Stock, symbol=symbol)
+    record_stock_view(stock)
 
     prediction_result = None
     if request.method == "POST":
         # 予想を実行
-        prediction_result = simple_prediction(stock)
+        prediction_result = predict_stock(stock)
         if prediction_result:
             messages.success(request, "株価予想を実行しました。")
         else:
@@ -133,35 +187,228 @@ def prediction(request, symbol):
                 "株価予想の実行に失敗しました。十分なデータがない可能性があります。",
             )
 
-    # 過去の予想データ（作成日時の新しい順）
-    past_predictions = StockPrediction.objects.filter(stock=stock).order_by(
-        "-created_at"
-    )[:10]
-
-    # 最新の株価データ
-    recent_prices = StockPrice.objects.filter(stock=stock).order_by("-date")[:10]
-
+    # 予想の実行で書き込んだ場合はキャッシュが無効化され、プライマリから読み直す
+    context, version = cached_for_stock(
+        stock.id, "prediction", lambda: _prediction_context(stock)
+    )
     context = {
+        **context,
         "stock": stock,
         "prediction_result": prediction_result,
-        "past_predictions": past_predictions,
-        "recent_prices": recent_prices,
+        "cache_version": version,
+        "cache_timeout": settings.PAGE_CACHE_TIMEOUT,
     }
 
     return render(request, "stocks/prediction.html", context)
 
 
+def _prediction_context(stock):
+    return {
+        # 過去の予想データ（作成日時の新しい順）
+        "past_predictions": list(
+            StockPrediction.objects.filter(stock=stock).order_by("-created_at")[:10]
+        ),
+        # 最新の株価データ
+        "recent_prices": list(
+            StockPrice.objects.filter(stock=stock).order_by("-date")[:10]
+        ),
+        # 手法別の実績精度（採点ジョブで集計済みの値）
+        "accuracies": list(
+            PredictionAccuracy.objects.filter(stock=stock).order_by("method", "horizon")
+        ),
+    }
+
+
 @require_http_methods(["GET"])
-def chart_data_api(request, symbol):
+@read_from_replica
+async def chart_data_api(request, symbol):
     """
     チャート用データのAPI
+    読み取り専用のJSON APIは非同期ビューとし、ASGIで動かす場合はDBの待ち時間にスレッドを占有しない
     """
-    stock = get_object_or_404(Stock, symbol=symbol)
-    days = int(request.GET.get("days", 30))
+    stock = await aget_object_or_404(Stock, symbol=symbol)
+    try:
+        days = int(request.GET.get("days", 30))
+    except ValueError:
+        return JsonResponse({"error": "daysは整数で指定してください"}, status=400)
+    # 本数ごとにキャッシュが増えないよう、区切りの本数で取得して切り出す
+    days, bucket = chart_days_bucket(days)
+
+    chart_data, _ = await acached_for_stock(
+        stock.id, f"chart_data:{bucket}", lambda: aget_chart_data(stock, days=bucket)
+    )
+
+    return JsonResponse(slice_chart_data(chart_data, days))
+
+
+@require_http_methods(["GET"])
+def screener(request):
+    """
+    指標スクリーナー - 条件に合う銘柄の一覧表示
+    """
+    results = None
+    error = None
+    if request.GET:
+        try:
+            query = parse_screener_query(request.GET)
+            results = run_screener(**query)
+        except ValueError as e:
+            error = str(e)
+
+    fields = [
+        {
+            "name": name,
+            "label": label,
+            "min": request.GET.get(f"{name}__gte", ""),
+            "max": request.GET.get(f"{name}__lte", ""),
+        }
+        for name, label in SCREENER_FIELDS.items()
+    ]
+    context = {
+        "fields": fields,
+        "results": results,
+        "error": error,
+        "sort": request.GET.get("sort", "symbol"),
+    }
+    return render(request, "stocks/screener.html", context)
+
+
+@require_http_methods(["GET"])
+async def screener_api(request):
+    """
+    指標スクリーナーのAPI（例: ?rsi__lt=30&ma20_gap__gt=0&volume_ratio__gt=2）
+    """
+    try:
+        query = parse_screener_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    chart_data = get_chart_data(stock, days=days)
+    results = await arun_screener(**query)
+    return JsonResponse({"count": len(results), "results": results})
 
-    return JsonResponse(chart_data)
+
+@require_http_methods(["GET"])
+async def compare_api(request):
+    """
+    複数銘柄の比較API（例: ?symbols=7203,6758,9984&days=365&benchmark=7203）
+    """
+    # pandas・numpyを使う分析モジュールは、起動を軽くするため初回の呼び出し時に読み込む
+    from .comparison import MAX_BETA_WINDOW, MAX_DAYS, MIN_BETA_WINDOW, compare_stocks
+
+    # 重複を除いて指定順に並べる
+    symbols = list(
+        dict.fromkeys(
+            s.strip() for s in request.GET.get("symbols", "").split(",") if s.strip()
+        )
+    )
+    benchmark = request.GET.get("benchmark") or None
+    try:
+        days = int(request.GET.get("days", 365))
+        window = int(request.GET.get("window", 60))
+    except ValueError:
+        return JsonResponse({"error": "パラメータは整数で指定してください"}, status=400)
+    # 期間は1日〜10年、ベータの計算期間は5〜250取引日に丸める
+    days = max(1, min(days, MAX_DAYS))
+    window = max(MIN_BETA_WINDOW, min(window, MAX_BETA_WINDOW))
+
+    if len(symbols) < 2:
+        return JsonResponse({"error": "2銘柄以上を指定してください"}, status=400)
+    found = {
+        symbol
+        async for symbol in Stock.objects.filter(symbol__in=symbols).values_list(
+            "symbol", flat=True
+        )
+    }
+    unknown = [symbol for symbol in symbols if symbol not in found]
+    if unknown:
+        return JsonResponse(
+            {
+                "error": f"登録されていない銘柄があります: {', '.join(unknown)}",
+                "unknown_symbols": unknown,
+            },
+            status=404,
+        )
+
+    try:
+        # pandasによる計算は同期処理のためスレッドで実行
+        result = await sync_to_async(compare_stocks)(
+            symbols, days=days, benchmark=benchmark, beta_window=window
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if result is None:
+        return JsonResponse(
+            {"error": "比較に必要な株価データが不足しています"}, status=404
+        )
+
+    return JsonResponse(result)
+
+
+@require_http_methods(["GET"])
+async def data_gaps_api(request, symbol):
+    """
+    株価データの欠損している取引日の統計API
+    """
+    from .gaps import scan_gaps
+
+    stock = await aget_object_or_404(Stock, symbol=symbol)
+    reports = await sync_to_async(scan_gaps)([stock])
+    if not reports:
+        return JsonResponse({"error": "株価データがありません"}, status=404)
+
+    return JsonResponse(reports[0])
+
+
+@require_http_methods(["GET"])
+async def refresh_queue_api(request):
+    """
+    自動更新スケジューラのキューの深さ・遅れと、優先度の高い銘柄の一覧API
+    """
+    try:
+        limit = int(request.GET.get("limit", 50))
+    except ValueError:
+        return JsonResponse({"error": "limitは整数で指定してください"}, status=400)
+    # 一覧に含める銘柄数は0〜500件に丸める（0はキューの統計のみ）
+    limit = max(0, min(limit, 500))
+
+    queue = await sync_to_async(build_refresh_queue)()
+    data = queue_status(queue)
+    data["queue"] = [
+        {key: value for key, value in item.items() if key != "stock"}
+        for item in queue[:limit]
+    ]
+    return JsonResponse(data)
+
+
+@require_http_methods(["GET"])
+async def similar_patterns_api(request, symbol):
+    """
+    直近の値動きに似た過去のチャートを全銘柄から検索するAPI
+    """
+    from .pattern_search import search_similar_patterns
+
+    stock = await aget_object_or_404(Stock, symbol=symbol)
+    try:
+        window = int(request.GET.get("window", 30))
+        top_k = int(request.GET.get("top", 10))
+        forward = int(request.GET.get("forward", 10))
+    except ValueError:
+        return JsonResponse({"error": "パラメータは整数で指定してください"}, status=400)
+
+    if not (5 <= window <= 250 and 1 <= top_k <= 50 and 1 <= forward <= 60):
+        return JsonResponse(
+            {"error": "window・top・forwardの範囲が正しくありません"}, status=400
+        )
+
+    result = await sync_to_async(search_similar_patterns)(
+        stock, window=window, top_k=top_k, forward=forward
+    )
+    if result is None:
+        return JsonResponse(
+            {"error": "検索に必要な株価データが不足しています"}, status=404
+        )
+
+    return JsonResponse(result)
 
 
 @require_http_methods(["POST"])
@@ -172,7 +419,7 @@ def update_stock_data(request, symbol):
     stock = get_object_or_404(Stock, symbol=symbol)
 
     try:
-        update_count, is_demo = update_stock_prices(stock)
+        update_count, is_demo = refresh_stock_prices(stock)
 
         if update_count:
             data_type = "デモデータ" if is_demo else "実際のデータ"
@@ -209,3 +456,13 @@ def delete_stock(request, symbol):
         messages.error(request, f"銘柄削除中にエラーが発生しました: {str(e)}")
 
     return redirect("stocks:index")
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Prometheus形式のメトリクス（全ワーカープロセスの合計）
+    """
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
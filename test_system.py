@@ -14,8 +14,9 @@ import django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_forecast_project.settings")
 django.setup()
 
+from stocks.charts import get_chart_data
 from stocks.models import Stock
-from stocks.utils import get_chart_data, simple_prediction
+from stocks.utils import simple_prediction
 
 
 class SystemTester: